@@ -0,0 +1,62 @@
+"""
+    Benchmark clstools.cache_invalidator as the cache it invalidates grows. Invalidating by argument looks keys up in
+    the cache's argument index, so its cost should stay flat, unlike the original scan over every key of the cache.
+
+    usage: python -m benchmarks.bench_clstools [invalidations]
+"""
+
+import sys
+import time
+
+import spidertools.common.clstools as clstools
+
+
+def legacy_check(to_check, args, cache):
+    """
+        The original invalidation scan, over every element of every key, kept as the baseline to compare against
+    """
+    to_remove = set()
+    for i in to_check:
+        pair = clstools._make_unique(i, args[i])
+        for key in cache.keys():
+            key_args, key_kwargs = clstools._split_key(key)
+            if pair in set(enumerate(key_args)) | set(key_kwargs.items()):
+                to_remove.add(key)
+    return to_remove
+
+
+def build(size):
+    @clstools.invalidating_cache
+    def get_stat(guild_id, user_id):
+        return guild_id * user_id
+
+    @clstools.cache_invalidator(func=get_stat, args=1, generic=False)
+    def set_stat(guild_id, user_id):
+        pass
+
+    for x in range(size):
+        get_stat(x % 100, x)
+    return get_stat, set_stat
+
+
+def timed(count, func):
+    start = time.perf_counter()
+    for x in range(count):
+        func(x)
+    return (time.perf_counter() - start) / count * 1_000_000
+
+
+def main(count=200):
+    print(f"{'cache size':>10}  {'indexed':>12}  {'legacy scan':>12}")
+    for size in (100, 1_000, 10_000, 100_000):
+        get_stat, set_stat = build(size)
+        cache = clstools._caches[clstools.unwrap(get_stat)].shared
+        # Invalidate one cached call at a time, re-caching it so the size stays the same
+        indexed = timed(count, lambda x: (set_stat(x % 100, x % size), get_stat(x % 100, x % size)))
+        legacy = timed(min(count, 20), lambda x: legacy_check((1,), (x % 100, x % size), cache))
+        assert len(cache) == size
+        print(f"{size:>10}  {indexed:>9.1f} us  {legacy:>9.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,68 @@
+"""
+    Benchmark TreeGen's filtered parse mode on a large archive-style page. Compares peak memory, allocated blocks
+    and time of building the full tree against only building the subtree a caller wants. Then times
+    utils.parse_many over several such pages, in this process and across a process pool.
+
+    usage: python -m benchmarks.bench_parsers [entries] [workers]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import spidertools.common.parsers as parsers
+import spidertools.common.utils as utils
+
+
+def make_page(entries):
+    rows = "".join(
+        f"<div class=\"entry\"><a href=\"/comic/{x}\"><span class=\"title\">Comic number {x}</span></a>"
+        f"<p class=\"blurb\">Some words about comic {x}, and a few more to pad it out.</p></div>"
+        for x in range(entries)
+    )
+    options = "".join(f"<option value=\"{x}\">Comic {x}</option>" for x in range(entries))
+    return f"<html><head><title>Archive</title></head><body>{rows}" \
+           f"<select name=\"comic\">{options}</select></body></html>"
+
+
+def parse(page, keep):
+    gen = parsers.TreeGen(keep, ancestors=True)
+    gen.feed(page)
+    return gen.close()
+
+
+def measure(page, keep):
+    start = time.perf_counter()
+    parse(page, keep)
+    elapsed = time.perf_counter() - start
+    # Memory is measured on a separate run, as tracing slows parsing down a lot
+    tracemalloc.start()
+    heads = parse(page, keep)
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sum(x.count for x in snapshot.statistics("filename"))
+    del heads
+    return elapsed, peak, blocks
+
+
+def main(entries=5_000, workers=None):
+    page = make_page(entries)
+    print(f"Parsing a {len(page) / 1024:.0f} KiB page with {entries} entries")
+    print(f"  {'mode':<24} {'time':>9}  {'peak memory':>12}  {'live blocks':>12}")
+    for name, keep in (("full tree", None), ("select[name=comic]", "select[name=comic]")):
+        elapsed, peak, blocks = measure(page, keep)
+        print(f"  {name:<24} {elapsed * 1000:6.1f} ms  {peak / 1024:8.0f} KiB  {blocks:12,}")
+
+    workers = workers or os.cpu_count() or 1
+    pages = [make_page(entries // 4)] * 8
+    print(f"parse_many over {len(pages)} pages of {entries // 4} entries")
+    for count in sorted({1, workers}):
+        start = time.perf_counter()
+        utils.parse_many(pages, workers=count)
+        print(f"  {count} worker(s)  {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(x) for x in sys.argv[1:3]))
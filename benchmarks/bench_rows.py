@@ -0,0 +1,60 @@
+"""
+    Benchmark loading large result sets into Row objects. Compares the old per-slot setattr loop against the
+    generated constructors and Row.from_rows bulk path.
+
+    usage: python -m benchmarks.bench_rows [count]
+"""
+
+import sys
+import timeit
+
+import spidertools.common.data as data
+
+
+class Stat(data.Row):
+
+    __slots__ = ("guild_id", "user_id", "messages", "words", "last_seen", "name", "flags", "score")
+
+    TABLE_NAME = "stats"
+
+
+def legacy_init(self, row, conv_bool=False):
+    """
+        The original Row initializer, kept as the baseline to compare against
+    """
+    for index in range(len(self.__slots__)):
+        slot = self.__slots__[index]
+        value = row[index]
+        if conv_bool and (value == 0 or value == 1):
+            value = bool(value)
+        setattr(self, slot, value)
+
+
+def legacy_load(rows):
+    out = []
+    for row in rows:
+        item = object.__new__(Stat)
+        legacy_init(item, row)
+        out.append(item)
+    return out
+
+
+def make_rows(count):
+    return [(1234, x, x * 3, x * 17, "2020-01-01 00:00:00", f"user{x}", x % 2, x / 7) for x in range(count)]
+
+
+def main(count=100_000, repeat=5):
+    rows = make_rows(count)
+    cases = (
+        ("legacy setattr loop", lambda: legacy_load(rows)),
+        ("generated __init__", lambda: [Stat(x) for x in rows]),
+        ("Row.from_rows", lambda: Stat.from_rows(rows)),
+    )
+    print(f"Loading {count} rows, best of {repeat}")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"  {name:<22} {best * 1000:8.1f} ms  {count / best:12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,111 @@
+"""
+    Benchmark GenericDatabase workloads against an embedded SQLite database, so regressions in the database layer
+    show up without a database server. Covers schema verification, single and batched saves, and cached and
+    uncached reads.
+
+    usage: python -m benchmarks.bench_sqlite [count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import spidertools.common as common
+import spidertools.common.accessors as accessors
+
+
+SCHEMA = {
+    "sql_flavor": "sqlite",
+    "tables": {
+        "stats": {
+            "columns": [
+                {"name": "guild_id", "type": "bigint", "not_null": True},
+                {"name": "user_id", "type": "bigint", "not_null": True},
+                {"name": "messages", "type": "integer", "default": 0},
+                {"name": "words", "type": "integer", "default": 0},
+                {"name": "last_seen", "type": "text"},
+                {"name": "name", "type": "varchar(64)"},
+            ],
+            "primary": ["guild_id", "user_id"],
+        },
+        "guilds": {
+            "columns": [
+                {"name": "id", "type": "bigint", "not_null": True},
+                {"name": "prefix", "type": "varchar(8)", "default": "!"},
+            ],
+            "primary": ["id"],
+            "defaults": [[0, "!"]],
+        },
+    },
+    "triggers": {
+        "guild_seen": {
+            "cause": "AFTER INSERT",
+            "table": "stats",
+            "for_each": "ROW",
+            "text": "INSERT OR IGNORE INTO guilds (id) VALUES (NEW.guild_id);",
+        },
+    },
+}
+
+
+class Stat(common.Row):
+
+    __slots__ = ("guild_id", "user_id", "messages", "words", "last_seen", "name")
+
+    TABLE_NAME = "stats"
+
+
+def make_stats(count, offset=0):
+    return [Stat([x % 10, x + offset, x, x * 7, "2020-01-01 00:00:00", f"user{x}"]) for x in range(count)]
+
+
+def timed(name, count, func):
+    start = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start
+    print(f"  {name:<32} {duration * 1000:9.1f} ms  {count / duration:12,.0f} ops/sec")
+
+
+def main(count=10_000):
+    with tempfile.TemporaryDirectory() as directory:
+        database = common.GenericDatabase(os.path.join(directory, "bench.db"), 0, "", "", "bench", SCHEMA)
+        stats = accessors.QueryStats()
+
+        print(f"SQLite {database.raw_exec('SELECT sqlite_version()')[0][0]}, {count} rows")
+        timed("verify_schema (create)", 1, database.verify_schema)
+        timed("verify_schema (no changes)", 1, database.verify_schema)
+
+        single = make_stats(count // 10)
+        timed("save_item", len(single), lambda: [database.save_item(x) for x in single])
+
+        def in_transaction():
+            with database.transaction():
+                for item in make_stats(count // 10, count):
+                    database.save_item(item)
+        timed("save_item in transaction", count // 10, in_transaction)
+
+        batch = make_stats(count, 2 * count)
+        timed("save_items", count, lambda: database.save_items(batch))
+
+        database.add_listener(stats)
+        guilds = range(10)
+        timed("get_items (uncached)", 10, lambda: [database.get_items(Stat, cache=False, guild_id=x) for x in guilds])
+        timed("get_items (cold cache)", 10, lambda: [database.get_items(Stat, guild_id=x) for x in guilds])
+        timed("get_items (warm cache)", 1000, lambda: [database.get_items(Stat, guild_id=x % 10) for x in range(1000)])
+        timed("get_item by key", 1000, lambda: [database.get_item(Stat, cache=False, guild_id=x % 10, user_id=x)
+                                                for x in range(1000)])
+        timed("get_count", 100, lambda: [database.get_count(Stat, cache=False, guild_id=x % 10) for x in range(100)])
+        timed("iter_items", count, lambda: sum(1 for _ in database.iter_items(Stat, batch_size=1000)))
+        database.remove_listener(stats)
+
+        print("Slowest statements:")
+        for entry in stats.dump()[:5]:
+            print(f"  {entry['count']:6} x {entry['mean'] * 1000:7.3f} ms  p95 {entry['p95'] * 1000:7.3f} ms  "
+                  f"{entry['statement'][:80]}")
+
+        database._accessor.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
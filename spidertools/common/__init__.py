@@ -12,6 +12,6 @@ from .client import TalosHTTPClient
 from .data import Row, MultiRow, SqlConvertable
 from .element import Document, Node, Content, Element
 from .pw_classes import PW, PWMember
-from .sql import GenericDatabase
+from .sql import GenericDatabase, AsyncGenericDatabase
 from .utils import *
 from . import *
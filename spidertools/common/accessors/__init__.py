@@ -1,6 +1,9 @@
-
-from . import base, postgres, mysql
+from . import base, pool, stats, routing, postgres, mysql, sqlite
 
 from .base import DatabaseAccessor, ConnectionLost
+from .pool import ConnectionPool
+from .stats import QueryEvent, QueryStats
+from .routing import ReadRouter
 from .postgres import PostgresAccessor
 from .mysql import MysqlAccessor
+from .sqlite import SqliteAccessor
@@ -1,12 +1,33 @@
 
 import abc
+import collections
+import contextlib
 import logging
+import threading
+import time
+
+from . import pool, stats
 
 
 log = logging.getLogger("spidertools.common.accessor")
 ConnectionLost = object()
 
 
+def _group_indexes(rows):
+    """
+        Group one-row-per-column index listings into one tuple per index
+    :param rows: Iterable of (table, index name, unique, column), ordered by table, index, then column position
+    :return: List of (table, index name, tuple of column names, unique)
+    """
+    out = []
+    for table, name, unique, column in rows:
+        if out and out[-1][0] == table and out[-1][1] == name:
+            out[-1][2].append(column)
+        else:
+            out.append((table, name, [column], bool(unique)))
+    return [(table, name, tuple(columns), unique) for table, name, columns, unique in out]
+
+
 class EmptyCursor:
     """
         A cursor for a non-existent database that should pretend to be connected. Returns None or empty list values
@@ -70,25 +91,340 @@ class EmptyCursor:
         return None
 
 
+class StatementCache:
+    """
+        A thread-safe, bounded least-recently-used cache of generated SQL statement text
+    """
+
+    __slots__ = ("maxsize", "_statements", "_lock")
+
+    def __init__(self, maxsize=1024):
+        """
+            Initialize a StatementCache
+        :param maxsize: Maximum number of statements to keep
+        """
+        self.maxsize = maxsize
+        self._statements = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+            Get the number of cached statements
+        :return: Number of statements
+        """
+        return len(self._statements)
+
+    def get(self, key, build):
+        """
+            Get the statement for a key, building and storing it if it isn't cached
+        :param key: Hashable key describing the statement shape
+        :param build: Callable taking no arguments that returns the statement
+        :return: Statement text
+        """
+        with self._lock:
+            query = self._statements.get(key)
+            if query is not None:
+                self._statements.move_to_end(key)
+                return query
+        query = build()
+        with self._lock:
+            self._statements[key] = query
+            if len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+        return query
+
+    def clear(self):
+        """
+            Remove all cached statements
+        """
+        with self._lock:
+            self._statements.clear()
+
+
 class DatabaseAccessor(abc.ABC):
     """
         Abstract base for Database Accessors, classes that abstract SQL differences and allow different flavors
         to be treated in the same way
     """
 
-    __slots__ = ("_connection", "_cursor")
+    __slots__ = ("_pool", "_local", "_pool_args", "_schema_name", "_statements", "_listeners")
 
-    def __init__(self):
+    #: Whether schema changes can be rolled back as part of a transaction
+    TRANSACTIONAL_DDL = False
+
+    def __init__(self, *, min_size=1, max_size=10, idle_timeout=300):
         """
             Initialize a DatabaseAccessor, sets up no connection and an empty cursor
+        :param min_size: Minimum number of pooled connections to keep open
+        :param max_size: Maximum number of pooled connections to have open at once
+        :param idle_timeout: Seconds an extra connection may sit idle before it is closed
+        """
+        self._pool = None
+        self._local = threading.local()
+        self._pool_args = {"min_size": min_size, "max_size": max_size, "idle_timeout": idle_timeout}
+        self._schema_name = None
+        self._statements = StatementCache()
+        self._listeners = ()
+
+    @property
+    def schema(self):
+        """
+            The schema in use by this accessor's connections. Queried once per connection pool, as every pooled
+            connection is opened on the same schema
+        """
+        name = self._schema_name
+        if name is None:
+            name = self.current_schema()
+            if self._pool is not None:
+                self._schema_name = name
+        return name
+
+    def invalidate_statements(self):
+        """
+            Forget the resolved schema and all cached statements. Called on reconnect, and should be called after
+            changing table structure
+        """
+        self._schema_name = None
+        self._statements.clear()
+
+    def _statement(self, verb, table, where=None, order=None, limit=None):
+        """
+            Get the text of a simple `VERB FROM schema.table [WHERE] [ORDER BY] [LIMIT]` statement, reusing a
+            previously built one of the same shape
+        :param verb: Start of the statement, such as `SELECT *` or `DELETE`
+        :param table: Table the statement acts on
+        :param where: Condition string
+        :param order: How to order the rows
+        :param limit: Max limit of rows
+        :return: Statement text
+        """
+        def build():
+            query = f"{verb} FROM {self.schema}.{table}"
+            if where:
+                query += f" WHERE {where}"
+            if order:
+                query += f" ORDER BY {order}"
+            if limit:
+                query += f" LIMIT {limit}"
+            return query
+
+        return self._statements.get((verb, table, where, order, limit), build)
+
+    @property
+    def listening(self):
+        """
+            Whether any query listeners are attached
+        """
+        return bool(self._listeners)
+
+    def add_listener(self, listener):
+        """
+            Attach a query listener, called with a QueryEvent after every statement this accessor runs
+        :param listener: Callable taking a QueryEvent, such as a QueryStats
+        """
+        self._listeners += (listener,)
+
+    def remove_listener(self, listener):
+        """
+            Detach a query listener
+        :param listener: Listener previously passed to add_listener
+        """
+        self._listeners = tuple(x for x in self._listeners if x is not listener)
+
+    def _emit(self, event):
+        """
+            Send a QueryEvent to every attached listener. Listener errors are logged, never raised into the query
+        :param event: QueryEvent to send
+        """
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                log.exception("Error in query listener")
+
+    def _run(self, cursor, query, params=None, execute=None):
+        """
+            Execute a query on a cursor, timing it and emitting a QueryEvent if any listeners are attached
+        :param cursor: Cursor to execute on
+        :param query: Query to execute
+        :param params: Parameters to pass to the query
+        :param execute: Cursor method to call with the query and params, defaults to cursor.execute
+        :return: Result of the execute call
+        """
+        if execute is None:
+            execute = cursor.execute
+        if not self._listeners:
+            return execute(query, params)
+
+        error = None
+        start = time.perf_counter()
+        try:
+            return execute(query, params)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            try:
+                rows = cursor.rowcount
+            except Exception:
+                rows = None
+            if rows is not None and rows < 0:
+                rows = None
+            _, operation, table = stats.describe(query)
+            self._emit(stats.QueryEvent(query, operation, table, duration, rows, None, error))
+
+    @property
+    def _connection(self):
+        """
+            The connection checked out by the current thread, or None if there isn't one
+        """
+        if getattr(self._local, "depth", 0):
+            return self._local.connection
+        return None
+
+    @property
+    def _cursor(self):
+        """
+            The cursor checked out by the current thread, or an EmptyCursor if there isn't one
+        """
+        if getattr(self._local, "depth", 0):
+            return self._local.cursor
+        return EmptyCursor()
+
+    def _start_pool(self, factory, first=None):
         """
-        self._connection = None
-        self._cursor = EmptyCursor()
+            Replace any current pool with a new one using the given connection factory
+        :param factory: Callable returning a new connection
+        :param first: Optional already open connection to seed the pool with
+        """
+        if self._pool is not None:
+            self._pool.close()
+        self.invalidate_statements()
+        self._pool = pool.ConnectionPool(factory, check=self.check_connection, **self._pool_args)
+        self._pool.fill(first)
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """
+            Check a connection out of the pool for the current thread, yielding its cursor. Nested checkouts on the
+            same thread share one connection, so multi-statement operations stay on a single connection
+        :return: Context manager yielding a cursor
+        """
+        local = self._local
+        if getattr(local, "depth", 0):
+            local.depth += 1
+            try:
+                yield local.cursor
+            finally:
+                local.depth -= 1
+            return
+
+        if self._pool is None:
+            yield EmptyCursor()
+            return
+
+        cnx_pool = self._pool
+        cnx = cnx_pool.acquire()
+        try:
+            cursor = cnx.cursor()
+        except Exception:
+            cnx_pool.release(cnx, discard=True)
+            raise
+        local.connection = cnx
+        local.cursor = cursor
+        local.lost = False
+        local.depth = 1
+        try:
+            yield cursor
+        finally:
+            local.depth = 0
+            local.connection = None
+            local.cursor = None
+            try:
+                cursor.close()
+            except Exception:
+                local.lost = True
+            cnx_pool.release(cnx, discard=local.lost)
+
+    @contextlib.contextmanager
+    def dedicated_connection(self, discard_incomplete=True):
+        """
+            Check a connection out of the pool without binding it to the current thread, for long-lived work like
+            streaming a result set
+        :param discard_incomplete: Whether to discard the connection if the block exits with an error or
+                                   GeneratorExit, for drivers that leave unread results on the connection
+        :return: Context manager yielding a connection, or None if not connected
+        """
+        if self._pool is None:
+            yield None
+            return
+
+        cnx_pool = self._pool
+        cnx = cnx_pool.acquire()
+        discard = discard_incomplete
+        try:
+            yield cnx
+            discard = False
+        finally:
+            cnx_pool.release(cnx, discard=discard)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+            Run the enclosed statements on one connection in a single transaction, committing at the end or rolling
+            back if an error is raised. Nested transactions on the same thread join the outer one
+        :return: Context manager yielding a cursor
+        """
+        with self.checkout() as cursor:
+            local = self._local
+            cnx = self._connection
+            if cnx is None or getattr(local, "in_transaction", False):
+                yield cursor
+                return
+
+            previous = cnx.autocommit
+            cnx.autocommit = False
+            local.in_transaction = True
+            try:
+                yield cursor
+                cnx.commit()
+            except BaseException:
+                try:
+                    cnx.rollback()
+                except Exception:
+                    local.lost = True
+                raise
+            finally:
+                local.in_transaction = False
+                if not local.lost:
+                    cnx.autocommit = previous
+
+    def in_transaction(self):
+        """
+            Check whether the current thread is inside a transaction
+        :return: Whether a transaction is open
+        """
+        return getattr(self._local, "in_transaction", False)
+
+    def _mark_lost(self):
+        """
+            Mark the current thread's connection as broken, so it is discarded instead of returned to the pool
+        """
+        self._local.lost = True
+
+    def check_connection(self, cnx):
+        """
+            Check whether a pooled connection is still usable. Called on checkout for connections that have sat idle
+        :param cnx: Connection to check
+        :return: Whether the connection is alive
+        """
+        return True
 
     @abc.abstractmethod
     def create_connection(self, *, user, password, host, port, schema, autocommit):
         """
-            Create a new database connection
+            Create a new database connection pool
         :param user: Database username
         :param password: Database password
         :param host: Host location of the database
@@ -197,6 +533,19 @@ class DatabaseAccessor(abc.ABC):
         """
         raise NotImplementedError()
 
+    def get_all_columns(self):
+        """
+            Get a list of information about every column of every table in the current schema, in one query
+        :return: List of column info tuples
+        """
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT * FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, "
+                "ORDINAL_POSITION",
+                [self.schema]
+            )
+            return cursor.fetchall()
+
     @abc.abstractmethod
     def has_column(self, table, column):
         """
@@ -236,6 +585,41 @@ class DatabaseAccessor(abc.ABC):
         """
         raise NotImplementedError()
 
+    def insert_many(self, table, *, rows, names=None, update=False, chunk_size=500):
+        """
+            Insert many rows into a table. Default implementation inserts one at a time on a single connection,
+            flavors override it to send rows in batches
+        :param table: Table to insert into
+        :param rows: Sequence of value sequences to insert
+        :param names: Names of the columns being inserted
+        :param update: Whether to upsert
+        :param chunk_size: Max number of rows to send in one statement
+        """
+        with self.checkout():
+            for values in rows:
+                self.insert(table, values=values, names=names, update=update)
+
+    def delete_many(self, table, *, names, keys, chunk_size=500):
+        """
+            Delete many rows from a table by key, batching them into `WHERE (names) IN (...)` statements
+        :param table: Table to delete from
+        :param names: Names of the key columns
+        :param keys: Sequence of key value sequences, one per row to delete
+        :param chunk_size: Max number of keys to send in one statement
+        """
+        if len(names) == 1:
+            target = names[0]
+            placeholder = "%s"
+        else:
+            target = "(" + ", ".join(names) + ")"
+            placeholder = "(" + ", ".join("%s" for _ in names) + ")"
+
+        with self.checkout():
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                where = f"{target} IN (" + ", ".join(placeholder for _ in chunk) + ")"
+                self.execute(self._statement("DELETE", table, where), [value for key in chunk for value in key])
+
     @abc.abstractmethod
     def count(self, table, *, where, params=None, limit=None):
         """
@@ -248,6 +632,14 @@ class DatabaseAccessor(abc.ABC):
         """
         raise NotImplementedError()
 
+    def estimate_count(self, table):
+        """
+            Estimate the number of rows in a table from the database's statistics, without scanning it
+        :param table: Table to estimate
+        :return: Estimated number of rows, or None if the database has no estimate
+        """
+        return None
+
     @abc.abstractmethod
     def select(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -261,6 +653,22 @@ class DatabaseAccessor(abc.ABC):
         """
         raise NotImplementedError()
 
+    def select_iter(self, table, *, where, params=None, order=None, limit=None, batch_size=1000):
+        """
+            Select rows from a table matching a query, yielding them in batches. Default implementation selects
+            everything and slices it, flavors override it to stream from the server
+        :param table: Table to select from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the result
+        :param limit: Max limit of rows to select
+        :param batch_size: Number of rows per batch
+        :return: Generator of lists of tuples of row data
+        """
+        rows = self.select(table, where=where, params=params, order=order, limit=limit)
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
     @abc.abstractmethod
     def delete(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -301,21 +709,55 @@ class DatabaseAccessor(abc.ABC):
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def create_index(self, name, table, columns, *, unique=False):
+        """
+            Create a new secondary index on a table
+        :param name: Name of the index
+        :param table: Table the index is on
+        :param columns: List of column names, in index order
+        :param unique: Whether the index enforces uniqueness
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def get_indexes(self):
+        """
+            Get the indexes in the current schema made with CREATE INDEX. Primary keys and indexes backing UNIQUE or
+            FOREIGN KEY constraints aren't included
+        :return: List of tuples of table name, index name, tuple of column names, and whether it's unique
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def drop_index(self, table, name):
+        """
+            Drop an index from the current schema by name
+        :param table: Table the index is on
+        :param name: Name of the index to drop
+        """
+        raise NotImplementedError()
+
     def is_connected(self):
         """
             Check whether the database is currently connected
         :return: Whether connection is active
         """
-        return self._connection is not None
+        return self._pool is not None and not self._pool.closed
 
-    def close(self):
+    def commit(self):
         """
-            Close the current connection, without re-opening
+            Commit the current thread's connection, if it has one checked out
         """
-        try:
-            self._connection.close()
-        except Exception as e:
-            log.info(f"Error while closing SQL connection: {e}")
+        cnx = self._connection
+        if cnx is not None:
+            cnx.commit()
 
-        self._connection = None
-        self._cursor = EmptyCursor()
+    def close(self):
+        """
+            Close the connection pool, without re-opening. Checked out connections close once released
+        """
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = None
+        self.invalidate_statements()
@@ -28,7 +28,7 @@ class MysqlAccessor(base.DatabaseAccessor):
 
     def create_connection(self, *, user, password, host, port, schema, autocommit):
         """
-            Create a new database connection
+            Create a new database connection pool
         :param user: Database username
         :param password: Database password
         :param host: Host location of the database
@@ -56,10 +56,24 @@ class MysqlAccessor(base.DatabaseAccessor):
         if cnx is None:
             return False
 
-        self._connection = cnx
-        self._cursor = cnx.cursor()
+        def connect():
+            new = mysql.connector.connect(user=user, password=password, host=host, port=port, autocommit=autocommit)
+            cursor = new.cursor()
+            cursor.execute(f"USE {schema}")
+            cursor.close()
+            return new
+
+        self._start_pool(connect, cnx)
         return True
 
+    def check_connection(self, cnx):
+        """
+            Check whether a pooled connection is still usable
+        :param cnx: Connection to check
+        :return: Whether the connection is alive
+        """
+        return cnx.is_connected()
+
     def execute(self, query, params=None, multi=False):
         """
             Execute a query with the given params, optionally allowing multi-query execution
@@ -68,34 +82,38 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param multi: Whether to allow multi-query
         """
         import mysql.connector
-        try:
-            return self._cursor.execute(query, params)
-        except mysql.connector.errors.Error as e:
-            if e.errno == 2006:
-                return base.ConnectionLost
-            else:
-                raise
+        with self.checkout() as cursor:
+            try:
+                return self._run(cursor, query, params)
+            except mysql.connector.errors.Error as e:
+                if e.errno == 2006:
+                    self._mark_lost()
+                    return base.ConnectionLost
+                else:
+                    raise
 
     def get_schemata(self):
         """
             Get a list of information about the databases's available schemata
         :return: List of schemata info tuples
         """
-        self.execute(
-            "SELECT * FROM information_schema.SCHEMATA"
-        )
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT * FROM information_schema.SCHEMATA"
+            )
+            return cursor.fetchall()
 
     def current_schema(self):
         """
             Get the current schema in use by the database
         :return: Current in-use schema
         """
-        self.execute("SELECT DATABASE()")
-        result = self._cursor.fetchone()
-        if result is None:
-            return self._schema
-        return result[0]
+        with self.checkout() as cursor:
+            self.execute("SELECT DATABASE()")
+            result = cursor.fetchone()
+            if result is None:
+                return self._schema
+            return result[0]
 
     def create_schema(self, schema):
         """
@@ -110,11 +128,12 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param schema: Schema name to check
         :return: Whether schema exists in database
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s LIMIT 1",
-            [schema]
-        )
-        return self._cursor.fetchone()[0] == 1
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s LIMIT 1",
+                [schema]
+            )
+            return cursor.fetchone()[0] == 1
 
     def create_table(self, name, columns, primary_keys=None, foreign_keys=None):
         """
@@ -181,8 +200,9 @@ class MysqlAccessor(base.DatabaseAccessor):
         :return: List of table info tuples
         """
         query = "SELECT * FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s"
-        self.execute(query, [self.current_schema()])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema])
+            return cursor.fetchall()
 
     def has_table(self, name):
         """
@@ -190,11 +210,12 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param name: Name of the table
         :return: Whether the table exists
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s LIMIT 1",
-            [self.current_schema(), name]
-        )
-        return self._cursor.fetchone()[0] == 1
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s LIMIT 1",
+                [self.schema, name]
+            )
+            return cursor.fetchone()[0] == 1
 
     def drop_table(self, name):
         """
@@ -213,7 +234,7 @@ class MysqlAccessor(base.DatabaseAccessor):
         name = column["name"]
         type = column["type"]
 
-        query = f"MODIFY TABLE {table} ADD COLUMN {name} {type}"
+        query = f"ALTER TABLE {table} ADD COLUMN {name} {_transform_type(type)}"
         if column.get("not_null", False) is True:
             query += " NOT NULL"
         if column.get("is_unique", False) is True:
@@ -222,7 +243,7 @@ class MysqlAccessor(base.DatabaseAccessor):
         if after is None:
             query += " FIRST"
         else:
-            query += f" AFTER {query}"
+            query += f" AFTER {after}"
 
         self.execute(query)
 
@@ -233,8 +254,9 @@ class MysqlAccessor(base.DatabaseAccessor):
         :return: List of column info tuples
         """
         query = "SELECT * FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
-        self.execute(query, [self.current_schema(), table])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema, table])
+            return cursor.fetchall()
 
     def has_column(self, table, column):
         """
@@ -243,12 +265,13 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param column: Column to check for
         :return: Whether a column with that name exists
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
-            "AND COLUMN_NAME = %s",
-            [self.current_schema(), table, column]
-        )
-        return self._cursor.fetchone()[0] > 0
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                "AND COLUMN_NAME = %s",
+                [self.schema, table, column]
+            )
+            return cursor.fetchone()[0] > 0
 
     def alter_column(self, table, column):
         """
@@ -271,7 +294,30 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param table: Table to drop column from
         :param column: Name of column to drop
         """
-        self.execute(f"ALTER TABLE {self.current_schema()}.{table} DROP COLUMN {column}")
+        self.execute(f"ALTER TABLE {self.schema}.{table} DROP COLUMN {column}")
+
+    def _insert_parts(self, table, width, names, update):
+        """
+            Get the pieces of an insert statement, reusing previously built ones of the same shape
+        :param table: Table to insert into
+        :param width: Number of values per row
+        :param names: Names of the columns being inserted, or None
+        :param update: Whether to upsert
+        :return: Tuple of statement prefix, placeholder for one row, and statement suffix
+        """
+        def build():
+            prefix = f"INSERT INTO {self.schema}.{table}"
+            if names is not None:
+                prefix += " (" + ", ".join(names) + ")"
+            prefix += " VALUES "
+            placeholder = "(" + ", ".join("%s" for _ in range(width)) + ")"
+            suffix = ""
+            if update:
+                suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(f"{i} = VALUES({i})" for i in names)
+            return prefix, placeholder, suffix
+
+        key = ("INSERT", table, width, None if names is None else tuple(names), update)
+        return self._statements.get(key, build)
 
     def insert(self, table, *, values, names=None, update=False):
         """
@@ -281,17 +327,37 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param names: Names of rows to insert
         :param update: Whether to upsert
         """
-        query = f"INSERT INTO {self.current_schema()}.{table} VALUES (" + \
-                ", ".join("%s" for _ in range(len(values))) + \
-                ")"
+        if names is not None and len(names) != len(values):
+            raise ValueError("Names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
 
-        if update:
-            if len(names) != len(values):
-                raise ValueError("Names must match values for update")
+        prefix, placeholder, suffix = self._insert_parts(table, len(values), names, update)
+        return self.execute(prefix + placeholder + suffix, values)
 
-            query += " ON DUPLICATE KEY UPDATE " + ", ".join(f"{i} = VALUES({i})" for i in names)
-
-        return self.execute(query, values)
+    def insert_many(self, table, *, rows, names=None, update=False, chunk_size=500):
+        """
+            Insert many rows into a table, using multi-row VALUES lists
+        :param table: Table to insert into
+        :param rows: Sequence of value sequences to insert
+        :param names: Names of the columns being inserted
+        :param update: Whether to upsert
+        :param chunk_size: Max number of rows to send in one statement
+        """
+        if not rows:
+            return
+        width = len(rows[0])
+        if names is not None and len(names) != width:
+            raise ValueError("Names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
+
+        with self.checkout():
+            prefix, placeholder, suffix = self._insert_parts(table, width, names, update)
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                query = prefix + ", ".join(placeholder for _ in chunk) + suffix
+                self.execute(query, [value for values in chunk for value in values])
 
     def count(self, table, *, where, params=None, limit=None):
         """
@@ -302,13 +368,22 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param limit: Max limit to count
         :return: Number of rows matching query
         """
-        query = f"SELECT COUNT(*) FROM {self.current_schema()}.{table}"
-        if where:
-            query += " WHERE " + where
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
-        return self._cursor.fetchone()[0]
+        query = self._statement("SELECT COUNT(*)", table, where, limit=limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchone()[0]
+
+    def estimate_count(self, table):
+        """
+            Estimate the number of rows in a table from information_schema.TABLES, which InnoDB keeps from sampling
+        :param table: Table to estimate
+        :return: Estimated number of rows, or None if the database has no estimate
+        """
+        query = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema, table])
+            row = cursor.fetchone()
+        return None if row is None or row[0] is None else int(row[0])
 
     def select(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -320,15 +395,40 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param limit: Max limit of rows to select
         :return: List of tuples of row data
         """
-        query = f"SELECT * FROM {self.current_schema()}.{table}"
-        if where:
-            query += " WHERE " + where
-        if order:
-            query += f" ORDER BY {order}"
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
-        return self._cursor.fetchall()
+        query = self._statement("SELECT *", table, where, order, limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchall()
+
+    def select_iter(self, table, *, where, params=None, order=None, limit=None, batch_size=1000):
+        """
+            Select rows from a table matching a query, streaming them in batches through an unbuffered cursor on a
+            dedicated connection
+        :param table: Table to select from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the result
+        :param limit: Max limit of rows to select
+        :param batch_size: Number of rows per batch
+        :return: Generator of lists of tuples of row data
+        """
+        query = self._statement("SELECT *", table, where, order, limit)
+        with self.dedicated_connection() as cnx:
+            if cnx is None:
+                return
+            cursor = cnx.cursor(buffered=False)
+            try:
+                self._run(cursor, query, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                try:
+                    cursor.close()
+                except Exception as e:
+                    log.info(f"Error while closing streaming cursor: {e}")
 
     def delete(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -339,14 +439,7 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param order: How to order the deletion
         :param limit: Max limit of rows to delete
         """
-        query = f"DELETE FROM {self.current_schema()}.{table}"
-        if where:
-            query += f" WHERE {where}"
-        if order:
-            query += f" ORDER BY {order}"
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
+        self.execute(self._statement("DELETE", table, where, order, limit), params)
 
     def create_trigger(self, name, cause, table, for_each, text):
         """
@@ -357,7 +450,7 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param for_each: Row or statement
         :param text: Functional code of the trigger
         """
-        schema = self.current_schema()
+        schema = self.schema
         query = f"CREATE TRIGGER {schema}.{name} {cause} ON {schema}.{table} FOR EACH {for_each} BEGIN {text} END;"
         self.execute(query)
 
@@ -366,8 +459,9 @@ class MysqlAccessor(base.DatabaseAccessor):
             Get a list of triggers on the current database schema
         :return: List of tuples of trigger info
         """
-        self.execute("SELECT * FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s", [self.current_schema()])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute("SELECT * FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s", [self.schema])
+            return cursor.fetchall()
 
     def drop_trigger(self, trigger):
         """
@@ -375,3 +469,41 @@ class MysqlAccessor(base.DatabaseAccessor):
         :param trigger: Name of trigger to drop
         """
         self.execute(f"DROP TRIGGER {trigger}")
+
+    def create_index(self, name, table, columns, *, unique=False):
+        """
+            Create a new secondary index on a table
+        :param name: Name of the index
+        :param table: Table the index is on
+        :param columns: List of column names, in index order
+        :param unique: Whether the index enforces uniqueness
+        """
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        self.execute(f"CREATE {kind} {name} ON {self.schema}.{table} ({', '.join(columns)})")
+
+    def get_indexes(self):
+        """
+            Get the indexes in the current schema made with CREATE INDEX. Primary keys and indexes backing UNIQUE or
+            FOREIGN KEY constraints aren't included
+        :return: List of tuples of table name, index name, tuple of column names, and whether it's unique
+        """
+        # MySQL names the index it makes for a foreign key after the constraint, or the first column if unnamed
+        query = "SELECT s.TABLE_NAME, s.INDEX_NAME, NOT s.NON_UNIQUE, s.COLUMN_NAME " \
+                "FROM information_schema.STATISTICS s WHERE s.TABLE_SCHEMA = %(schema)s AND s.INDEX_NAME != 'PRIMARY' " \
+                "AND s.INDEX_NAME NOT IN (SELECT c.CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS c " \
+                "WHERE c.TABLE_SCHEMA = s.TABLE_SCHEMA AND c.TABLE_NAME = s.TABLE_NAME) " \
+                "AND s.INDEX_NAME NOT IN (SELECT k.COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE k " \
+                "WHERE k.TABLE_SCHEMA = s.TABLE_SCHEMA AND k.TABLE_NAME = s.TABLE_NAME " \
+                "AND k.REFERENCED_TABLE_NAME IS NOT NULL) " \
+                "ORDER BY s.TABLE_NAME, s.INDEX_NAME, s.SEQ_IN_INDEX"
+        with self.checkout() as cursor:
+            self.execute(query, {"schema": self.schema})
+            return base._group_indexes(cursor.fetchall())
+
+    def drop_index(self, table, name):
+        """
+            Drop an index from the current schema by name
+        :param table: Table the index is on
+        :param name: Name of the index to drop
+        """
+        self.execute(f"DROP INDEX {name} ON {self.schema}.{table}")
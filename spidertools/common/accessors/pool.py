@@ -0,0 +1,201 @@
+
+import logging
+import threading
+import time
+
+
+log = logging.getLogger("spidertools.common.accessors")
+
+
+class ConnectionPool:
+    """
+        A thread-safe pool of database connections. Keeps at least min_size connections open, never more than
+        max_size, checks connections that have sat idle before handing them out, and closes connections that have
+        been idle longer than idle_timeout when the pool is above its minimum size
+    """
+
+    __slots__ = ("_factory", "_check", "min_size", "max_size", "idle_timeout", "check_after", "_idle", "_size",
+                 "_cond", "_closed", "_last_reap")
+
+    def __init__(self, factory, *, min_size=1, max_size=10, idle_timeout=300, check=None, check_after=30):
+        """
+            Initialize a ConnectionPool. No connections are created until fill or acquire is called
+        :param factory: Callable taking no arguments that returns a new connection
+        :param min_size: Minimum number of connections to keep open
+        :param max_size: Maximum number of connections to have open at once
+        :param idle_timeout: Seconds a connection may sit idle before being reaped, if above min_size
+        :param check: Callable taking a connection and returning whether it is still usable
+        :param check_after: Seconds a connection must be idle before it is health checked on checkout
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._factory = factory
+        self._check = check
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._last_reap = time.monotonic()
+
+    @property
+    def size(self):
+        """
+            Get the number of connections currently owned by the pool, idle or checked out
+        :return: Number of open connections
+        """
+        return self._size
+
+    @property
+    def idle(self):
+        """
+            Get the number of connections currently waiting in the pool
+        :return: Number of idle connections
+        """
+        return len(self._idle)
+
+    @property
+    def closed(self):
+        """
+            Check whether this pool has been closed
+        :return: Whether the pool is closed
+        """
+        return self._closed
+
+    def fill(self, first=None):
+        """
+            Open connections until the pool holds min_size of them
+        :param first: Optional already open connection to add to the pool
+        """
+        with self._cond:
+            if first is not None:
+                self._size += 1
+                self._idle.append((first, time.monotonic()))
+            while self._size < self.min_size:
+                self._idle.append((self._factory(), time.monotonic()))
+                self._size += 1
+            self._cond.notify_all()
+
+    def acquire(self, timeout=None):
+        """
+            Check a connection out of the pool, opening a new one if none are idle and the pool isn't full.
+            Blocks if the pool is exhausted
+        :param timeout: Max seconds to wait for a connection, None to wait forever
+        :return: A usable connection
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    cnx, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    cnx, last_used = None, None
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                    continue
+
+            if cnx is None:
+                try:
+                    return self._factory()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._check is None or time.monotonic() - last_used < self.check_after or self._healthy(cnx):
+                return cnx
+
+            log.info("Discarding dead pooled connection")
+            self._discard(cnx)
+
+    def release(self, cnx, *, discard=False):
+        """
+            Return a connection to the pool
+        :param cnx: Connection to return
+        :param discard: Whether the connection is broken and should be closed instead of reused
+        """
+        if discard or self._closed:
+            self._discard(cnx)
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._idle.append((cnx, now))
+            self._cond.notify()
+        if now - self._last_reap > self.idle_timeout:
+            self.reap()
+
+    def reap(self):
+        """
+            Close connections that have been idle longer than idle_timeout, down to min_size
+        :return: Number of connections closed
+        """
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            self._last_reap = now
+            keep = []
+            # Idle list is oldest first, so the stalest connections are closed first
+            for cnx, last_used in self._idle:
+                if now - last_used > self.idle_timeout and self._size - len(to_close) > self.min_size:
+                    to_close.append(cnx)
+                else:
+                    keep.append((cnx, last_used))
+            self._idle = keep
+            self._size -= len(to_close)
+        for cnx in to_close:
+            _close(cnx)
+        return len(to_close)
+
+    def close(self):
+        """
+            Close the pool and all idle connections. Connections currently checked out are closed when released
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for cnx, _ in idle:
+            _close(cnx)
+
+    def _healthy(self, cnx):
+        """
+            Run the health check on a connection, treating errors as unhealthy
+        :param cnx: Connection to check
+        :return: Whether the connection is usable
+        """
+        try:
+            return bool(self._check(cnx))
+        except Exception:
+            return False
+
+    def _discard(self, cnx):
+        """
+            Close a connection and give up its place in the pool
+        :param cnx: Connection to discard
+        """
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        _close(cnx)
+
+
+def _close(cnx):
+    """
+        Close a connection, ignoring any errors
+    :param cnx: Connection to close
+    """
+    try:
+        cnx.close()
+    except Exception as e:
+        log.info(f"Error while closing SQL connection: {e}")
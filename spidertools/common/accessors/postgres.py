@@ -1,11 +1,67 @@
 
+import io
+import itertools
+import json
 import logging
+import math
 
 from . import base
 
 
 log = logging.getLogger("spidertools.common.accessors")
 _Sentinel = object()
+_cursor_ids = itertools.count()
+_copy_escapes = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value, array=False):
+    """
+        Convert a value to the text form PostgreSQL parses for its column type. Bytes use the bytea hex format,
+        dicts and lists are JSON unless the column is an array
+    :param value: Non-null value to convert
+    :param array: Whether the value is going into an array column
+    :return: Text form of the value
+    """
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        return repr(value)
+    if array and isinstance(value, (list, tuple)):
+        return "{" + ",".join(_array_element(x) for x in value) + "}"
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _array_element(value):
+    """
+        Convert an element of an array value to its quoted array literal form
+    :param value: Element to convert
+    :return: Array literal text of the element
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, (list, tuple)):
+        return _copy_text(value, True)
+    return '"' + _copy_text(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _copy_value(value, array=False):
+    """
+        Convert a value to its COPY text format representation
+    :param value: Value to convert
+    :param array: Whether the value is going into an array column
+    :return: Escaped string form of the value
+    """
+    if value is None:
+        return "\\N"
+    return _copy_text(value, array).translate(_copy_escapes)
 
 
 class PostgresAccessor(base.DatabaseAccessor):
@@ -15,9 +71,14 @@ class PostgresAccessor(base.DatabaseAccessor):
 
     __slots__ = ("_schema",)
 
+    TRANSACTIONAL_DDL = True
+
+    #: Upserts of at least this many rows are loaded with COPY through a temporary table
+    COPY_THRESHOLD = 1000
+
     def create_connection(self, *, user, password, host, port, schema, autocommit):
         """
-            Create a new database connection
+            Create a new database connection pool
         :param user: Database username
         :param password: Database password
         :param host: Host location of the database
@@ -41,10 +102,31 @@ class PostgresAccessor(base.DatabaseAccessor):
         if cnx is None:
             return False
 
-        cnx.autocommit = True
-        cnx.cursor().execute(f"SET search_path TO {schema}")
-        self._connection = cnx
-        self._cursor = cnx.cursor()
+        def connect(cnx=None):
+            if cnx is None:
+                cnx = psycopg2.connect(user=user, password=password, host=host, port=port, dbname=schema)
+            cnx.autocommit = autocommit
+            cursor = cnx.cursor()
+            cursor.execute(f"SET search_path TO {schema}")
+            cursor.close()
+            return cnx
+
+        self._start_pool(connect, connect(cnx))
+        return True
+
+    def check_connection(self, cnx):
+        """
+            Check whether a pooled connection is still usable
+        :param cnx: Connection to check
+        :return: Whether the connection is alive
+        """
+        if cnx.closed:
+            return False
+        cursor = cnx.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
         return True
 
     def execute(self, query, params=None, multi=False):
@@ -54,28 +136,31 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param params: Parameters to pass to the query
         :param multi: Whether to allow multi-query
         """
-        return self._cursor.execute(query, params)
+        with self.checkout() as cursor:
+            return self._run(cursor, query, params)
 
     def get_schemata(self):
         """
             Get a list of information about the databases's available schemata
         :return: List of schemata info tuples
         """
-        self.execute(
-            "SELECT * FROM information_schema.SCHEMATA"
-        )
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT * FROM information_schema.SCHEMATA"
+            )
+            return cursor.fetchall()
 
     def current_schema(self):
         """
             Get the current schema in use by the database
         :return: Current in-use schema
         """
-        self.execute("SELECT CURRENT_SCHEMA()")
-        result = self._cursor.fetchone()
-        if result is None:
-            return self._schema
-        return result[0]
+        with self.checkout() as cursor:
+            self.execute("SELECT CURRENT_SCHEMA()")
+            result = cursor.fetchone()
+            if result is None:
+                return self._schema
+            return result[0]
 
     def create_schema(self, schema):
         """
@@ -90,11 +175,12 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param schema: Schema name to check
         :return: Whether schema exists in database
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s LIMIT 1",
-            [schema]
-        )
-        return self._cursor.fetchone()[0] == 1
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s LIMIT 1",
+                [schema]
+            )
+            return cursor.fetchone()[0] == 1
 
     def create_table(self, name, columns, primary_keys=None, foreign_keys=None):
         """
@@ -105,7 +191,7 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param foreign_keys: List of foreign keys, of the form of a dict with "local_name" and "remote_table" params,
                              minimally
         """
-        query = f"CREATE TABLE {self.current_schema()}.{name} ("
+        query = f"CREATE TABLE {self.schema}.{name} ("
 
         lines = []
 
@@ -161,8 +247,9 @@ class PostgresAccessor(base.DatabaseAccessor):
         :return: List of table info tuples
         """
         query = "SELECT * FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s"
-        self.execute(query, [self.current_schema()])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema])
+            return cursor.fetchall()
 
     def has_table(self, name):
         """
@@ -170,11 +257,12 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param name: Name of the table
         :return: Whether the table exists
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s LIMIT 1",
-            [self.current_schema(), name]
-        )
-        return self._cursor.fetchone()[0] == 1
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s LIMIT 1",
+                [self.schema, name]
+            )
+            return cursor.fetchone()[0] == 1
 
     def drop_table(self, name):
         """
@@ -208,8 +296,9 @@ class PostgresAccessor(base.DatabaseAccessor):
         :return: List of column info tuples
         """
         query = "SELECT * FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
-        self.execute(query, [self.current_schema(), table])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema, table])
+            return cursor.fetchall()
 
     def has_column(self, table, column):
         """
@@ -218,12 +307,13 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param column: Column to check for
         :return: Whether a column with that name exists
         """
-        self.execute(
-            "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
-            "AND COLUMN_NAME = %s",
-            [self.current_schema(), table, column]
-        )
-        return self._cursor.fetchone()[0] > 0
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                "AND COLUMN_NAME = %s",
+                [self.schema, table, column]
+            )
+            return cursor.fetchone()[0] > 0
 
     def alter_column(self, table, column):
         """
@@ -246,7 +336,35 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param table: Table to drop column from
         :param column: Name of column to drop
         """
-        self.execute(f"ALTER TABLE {self.current_schema()}.{table} DROP COLUMN {column}")
+        self.execute(f"ALTER TABLE {self.schema}.{table} DROP COLUMN {column}")
+
+    def _insert_parts(self, table, width, names, update):
+        """
+            Get the pieces of an insert statement, reusing previously built ones of the same shape. Building an
+            upsert looks up the table's primary keys, so that lookup also only happens once per shape
+        :param table: Table to insert into
+        :param width: Number of values per row
+        :param names: Names of the columns being inserted, or None
+        :param update: Whether to upsert
+        :return: Tuple of statement prefix, placeholder for one row, and statement suffix
+        """
+        def build():
+            prefix = f"INSERT INTO {self.schema}.{table}"
+            if names is not None:
+                prefix += " (" + ", ".join(names) + ")"
+            prefix += " VALUES "
+            placeholder = "(" + ", ".join("%s" for _ in range(width)) + ")"
+            suffix = ""
+            if update:
+                cols = self.get_primary_keys(table)
+                if len(cols) == 0:
+                    raise ValueError("Table has no primary keys, cannot update")  # TODO: allow update anyways?
+                suffix = f" ON CONFLICT ({', '.join(cols)}) DO UPDATE SET " + \
+                         ", ".join(f"{i} = EXCLUDED.{i}" for i in names)
+            return prefix, placeholder, suffix
+
+        key = ("INSERT", table, width, None if names is None else tuple(names), update)
+        return self._statements.get(key, build)
 
     def insert(self, table, *, values, names=None, update=False):
         """
@@ -258,21 +376,19 @@ class PostgresAccessor(base.DatabaseAccessor):
         """
         if names and len(names) != len(values):
             raise ValueError("Number of names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
 
-        query = f"INSERT INTO {self.current_schema()}.{table}"\
-
-        if names is not None:
-            query += " (" + ", ".join(names) + ")"
-
-        query += " VALUES (" + \
-                 ", ".join("%s" for _ in range(len(values))) + \
-                 ")"
+        prefix, placeholder, suffix = self._insert_parts(table, len(values), names, update)
+        return self.execute(prefix + placeholder + suffix, values)
 
-        if update:
-            if names is None:
-                raise ValueError("Must supply names with update")
-
-            # TODO: Make this an accessor method?
+    def get_primary_keys(self, table):
+        """
+            Get the names of the primary key columns of a table
+        :param table: Table to get primary keys of
+        :return: Tuple of column names
+        """
+        with self.checkout() as cursor:
             self.execute("SELECT col.column_name from information_schema.TABLE_CONSTRAINTS tab, " +
                          "information_schema.CONSTRAINT_COLUMN_USAGE col WHERE " +
                          "col.table_schema = %s AND " +
@@ -280,16 +396,69 @@ class PostgresAccessor(base.DatabaseAccessor):
                          "col.constraint_name = tab.constraint_name AND " +
                          "col.table_name = tab.table_name AND " +
                          "tab.constraint_type = 'PRIMARY KEY' AND " +
-                         "col.table_name = %s", [self.current_schema(), table])
-            cols = self._cursor.fetchall()
-            cols = tuple(map(lambda x: x[0], cols))
-            if len(cols) == 0:
-                raise ValueError("Table has no primary keys, cannot update")  # TODO: allow update anyways?
-            cols = ", ".join(cols)
+                         "col.table_name = %s", [self.schema, table])
+            return tuple(map(lambda x: x[0], cursor.fetchall()))
 
-            query += f" ON CONFLICT ({cols}) DO UPDATE SET " + ", ".join(f"{i} = EXCLUDED.{i}" for i in names)
+    def insert_many(self, table, *, rows, names=None, update=False, chunk_size=500):
+        """
+            Insert many rows into a table, using multi-row VALUES lists, or COPY for large batches
+        :param table: Table to insert into
+        :param rows: Sequence of value sequences to insert
+        :param names: Names of the columns being inserted
+        :param update: Whether to upsert
+        :param chunk_size: Max number of rows to send in one VALUES statement
+        """
+        if not rows:
+            return
+        width = len(rows[0])
+        if names is not None and len(names) != width:
+            raise ValueError("Number of names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
+
+        with self.checkout():
+            prefix, placeholder, suffix = self._insert_parts(table, width, names, update)
+            if names is not None and len(rows) >= self.COPY_THRESHOLD:
+                self._copy_insert(table, rows, names, suffix)
+                return
+
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                query = prefix + ", ".join(placeholder for _ in chunk) + suffix
+                self.execute(query, [value for values in chunk for value in values])
 
-        return self.execute(query, values)
+    def _copy_insert(self, table, rows, names, suffix):
+        """
+            Load rows into a temporary table with COPY, then move them into the real table in one statement. The
+            temporary table is created fresh for each load, so it always matches the real table's columns
+        :param table: Table to insert into
+        :param rows: Sequence of value sequences to insert
+        :param names: Names of the columns being inserted
+        :param suffix: Conflict clause to apply to the final insert
+        """
+        schema = self.schema
+        temp = f"st_copy_{table}"
+        columns = ", ".join(names)
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                "AND DATA_TYPE = 'ARRAY'",
+                [schema, table]
+            )
+            arrays = {x[0] for x in cursor.fetchall()}
+            is_array = [x in arrays for x in names]
+
+            buffer = io.StringIO()
+            for values in rows:
+                buffer.write("\t".join(_copy_value(value, array) for value, array in zip(values, is_array)))
+                buffer.write("\n")
+            buffer.seek(0)
+
+            self.execute(f"DROP TABLE IF EXISTS {temp}")
+            self.execute(f"CREATE TEMPORARY TABLE {temp} (LIKE {schema}.{table} INCLUDING DEFAULTS)")
+            self._run(cursor, f"COPY {temp} ({columns}) FROM STDIN", buffer, execute=cursor.copy_expert)
+            self.execute(f"INSERT INTO {schema}.{table} ({columns}) SELECT {columns} FROM {temp}{suffix}")
+            self.execute(f"DROP TABLE {temp}")
 
     def count(self, table, *, where, params=None, limit=None):
         """
@@ -300,13 +469,24 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param limit: Max limit to count
         :return: Number of rows matching query
         """
-        query = f"SELECT COUNT(*) FROM {self.current_schema()}.{table}"
-        if where:
-            query += f" WHERE {where}"
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
-        return self._cursor.fetchone()[0]
+        query = self._statement("SELECT COUNT(*)", table, where, limit=limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchone()[0]
+
+    def estimate_count(self, table):
+        """
+            Estimate the number of rows in a table from pg_class.reltuples, which VACUUM and ANALYZE keep current
+        :param table: Table to estimate
+        :return: Estimated number of rows, or None if the table hasn't been analyzed yet
+        """
+        query = "SELECT c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace " \
+                "WHERE n.nspname = %s AND c.relname = %s"
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema, table])
+            row = cursor.fetchone()
+        # reltuples is -1 for tables that have never been vacuumed or analyzed
+        return None if row is None or row[0] is None or row[0] < 0 else int(row[0])
 
     def select(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -318,15 +498,42 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param limit: Max limit of rows to select
         :return: List of tuples of row data
         """
-        query = f"SELECT * FROM {self.current_schema()}.{table}"
-        if where:
-            query += f" WHERE {where}"
-        if order:
-            query += f" ORDER BY {order}"
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
-        return self._cursor.fetchall()
+        query = self._statement("SELECT *", table, where, order, limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchall()
+
+    def select_iter(self, table, *, where, params=None, order=None, limit=None, batch_size=1000):
+        """
+            Select rows from a table matching a query, streaming them in batches through a named server-side cursor
+            on a dedicated connection
+        :param table: Table to select from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the result
+        :param limit: Max limit of rows to select
+        :param batch_size: Number of rows per batch
+        :return: Generator of lists of tuples of row data
+        """
+        query = self._statement("SELECT *", table, where, order, limit)
+        with self.dedicated_connection(discard_incomplete=False) as cnx:
+            if cnx is None:
+                return
+            # Named cursors outside a transaction have to be held open across commits
+            cursor = cnx.cursor(name=f"st_iter_{next(_cursor_ids)}", withhold=cnx.autocommit)
+            cursor.itersize = batch_size
+            try:
+                self._run(cursor, query, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                try:
+                    cursor.close()
+                except Exception as e:
+                    log.info(f"Error while closing streaming cursor: {e}")
 
     def delete(self, table, *, where, params=None, order=None, limit=None):
         """
@@ -337,14 +544,7 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param order: How to order the deletion
         :param limit: Max limit of rows to delete
         """
-        query = f"DELETE FROM {self.current_schema()}.{table}"
-        if where:
-            query += f" WHERE {where}"
-        if order:
-            query += f" ORDER BY {order}"
-        if limit:
-            query += f" LIMIT {limit}"
-        self.execute(query, params)
+        self.execute(self._statement("DELETE", table, where, order, limit), params)
 
     def create_trigger(self, name, cause, table, for_each, text):
         """
@@ -355,7 +555,7 @@ class PostgresAccessor(base.DatabaseAccessor):
         :param for_each: Row or statement
         :param text: Functional code of the trigger
         """
-        schema = self.current_schema()
+        schema = self.schema
         # Postgres doesn't support the full trigger spec, so we need to fake it
         query1 = f"CREATE OR REPLACE FUNCTION {schema}.st_trigger_{name}() RETURNS trigger AS $BODY$ BEGIN " \
                  f"{text} " \
@@ -370,8 +570,9 @@ class PostgresAccessor(base.DatabaseAccessor):
             Get a list of triggers on the current database schema
         :return: List of tuples of trigger info
         """
-        self.execute("SELECT * FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s", [self.current_schema()])
-        return self._cursor.fetchall()
+        with self.checkout() as cursor:
+            self.execute("SELECT * FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s", [self.schema])
+            return cursor.fetchall()
 
     def drop_trigger(self, trigger):
         """
@@ -380,3 +581,40 @@ class PostgresAccessor(base.DatabaseAccessor):
         """
         self.execute(f"DROP FUNCTION st_trigger_{trigger}")
         self.execute(f"DROP TRIGGER {trigger}")
+
+    def create_index(self, name, table, columns, *, unique=False):
+        """
+            Create a new secondary index on a table
+        :param name: Name of the index
+        :param table: Table the index is on
+        :param columns: List of column names, in index order
+        :param unique: Whether the index enforces uniqueness
+        """
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        self.execute(f"CREATE {kind} {name} ON {self.schema}.{table} ({', '.join(columns)})")
+
+    def get_indexes(self):
+        """
+            Get the indexes in the current schema made with CREATE INDEX. Primary keys and indexes backing UNIQUE or
+            FOREIGN KEY constraints aren't included
+        :return: List of tuples of table name, index name, tuple of column names, and whether it's unique
+        """
+        query = "SELECT t.relname, i.relname, x.indisunique, a.attname FROM pg_index x " \
+                "JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid " \
+                "JOIN pg_namespace n ON n.oid = t.relnamespace " \
+                "CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, position) " \
+                "JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum " \
+                "WHERE n.nspname = %s AND NOT x.indisprimary " \
+                "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid) " \
+                "ORDER BY t.relname, i.relname, k.position"
+        with self.checkout() as cursor:
+            self.execute(query, [self.schema])
+            return base._group_indexes(cursor.fetchall())
+
+    def drop_index(self, table, name):
+        """
+            Drop an index from the current schema by name
+        :param table: Table the index is on
+        :param name: Name of the index to drop
+        """
+        self.execute(f"DROP INDEX {self.schema}.{name}")
@@ -0,0 +1,230 @@
+
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+
+log = logging.getLogger("spidertools.common.accessors")
+_last_write = contextvars.ContextVar("spidertools_last_write", default=None)
+
+
+def context_writes():
+    """
+        Get the dict of last write times for the current context, creating it if needed. Code that hands work to
+        other threads should call this before copying the context, so writes made there are seen by later reads
+    :return: Dict of ReadRouter id to monotonic time of the last write
+    """
+    writes = _last_write.get()
+    if writes is None:
+        writes = {}
+        _last_write.set(writes)
+    return writes
+
+
+def _in_use(accessor):
+    """
+        Get the number of pooled connections an accessor has checked out
+    :param accessor: DatabaseAccessor to check
+    :return: Connections in use, 0 if the pool was just closed
+    """
+    cnx_pool = accessor._pool
+    return 0 if cnx_pool is None else cnx_pool.size - cnx_pool.idle
+
+
+class ReadRouter:
+    """
+        Routes reads across replica accessors while writes stay on the primary. Replicas are chosen round-robin or by
+        fewest connections in use. Reads stay on the primary for sticky_window seconds after a write in the same
+        context, so callers read their own writes despite replication lag. A replica that fails a read the primary
+        can serve is taken out of rotation for retry_after seconds. Reads of a table written by anyone in the last
+        sticky_window seconds may be stale, see recent
+    """
+
+    __slots__ = ("primary", "replicas", "strategy", "sticky_window", "retry_after", "_down", "_counter", "_tables",
+                 "_lock")
+
+    STRATEGIES = ("round_robin", "least_loaded")
+
+    def __init__(self, primary, replicas, *, strategy="round_robin", sticky_window=1.0, retry_after=30):
+        """
+            Initialize a ReadRouter
+        :param primary: DatabaseAccessor receiving writes, and reads when no replica is usable
+        :param replicas: List of DatabaseAccessors to spread reads over
+        :param strategy: round_robin or least_loaded
+        :param sticky_window: Seconds after a write that reads in the same context go to the primary
+        :param retry_after: Seconds a failed replica is skipped before being tried again
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unrecognized read strategy {strategy}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.sticky_window = sticky_window
+        self.retry_after = retry_after
+        self._down = {}
+        self._counter = itertools.count()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def wrote(self, table=None):
+        """
+            Record a write in the current context, starting its read-your-writes window
+        :param table: Name of the table written to, if known
+        """
+        now = time.monotonic()
+        context_writes()[id(self)] = now
+        if table is not None:
+            self._tables[table] = now
+
+    def recent(self, table):
+        """
+            Check whether a table was written from any context within the last sticky_window seconds, so replicas
+            may not have caught up and their results shouldn't be cached
+        :param table: Name of the table
+        :return: Whether the table was written recently
+        """
+        last = self._tables.get(table)
+        return last is not None and time.monotonic() - last < self.sticky_window
+
+    def sticky(self):
+        """
+            Check whether the current context wrote recently enough that it should read from the primary
+        :return: Whether reads should go to the primary
+        """
+        writes = _last_write.get()
+        if writes is None:
+            return False
+        last = writes.get(id(self))
+        return last is not None and time.monotonic() - last < self.sticky_window
+
+    def available(self):
+        """
+            Get the replicas currently in rotation. Replicas whose retry time has passed are put back
+        :return: List of usable replica accessors
+        """
+        if not self._down:
+            return [x for x in self.replicas if x.is_connected()]
+        now = time.monotonic()
+        with self._lock:
+            for replica, until in list(self._down.items()):
+                if until <= now:
+                    del self._down[replica]
+        return [x for x in self.replicas if x not in self._down and x.is_connected()]
+
+    def choose(self):
+        """
+            Pick the accessor for a read
+        :return: A replica accessor, or the primary if sticky or no replica is usable
+        """
+        if self.sticky():
+            return self.primary
+        replicas = self.available()
+        if not replicas:
+            return self.primary
+        if self.strategy == "least_loaded":
+            start = next(self._counter)
+            order = replicas[start % len(replicas):] + replicas[:start % len(replicas)]
+            return min(order, key=_in_use)
+        return replicas[next(self._counter) % len(replicas)]
+
+    def mark_down(self, replica, error):
+        """
+            Take a replica out of rotation for retry_after seconds
+        :param replica: Replica accessor that failed
+        :param error: Error it failed with
+        """
+        log.warning(f"Read replica failed, falling back to primary for {self.retry_after}s: {error}")
+        with self._lock:
+            self._down[replica] = time.monotonic() + self.retry_after
+
+    def read(self, method, *args, **kwargs):
+        """
+            Run a read method on a chosen accessor, retrying on the primary if a replica fails
+        :param method: Name of the accessor method
+        :param args: Positional arguments to the method
+        :param kwargs: Keyword arguments to the method
+        :return: Result of the method
+        """
+        accessor = self.choose()
+        if accessor is self.primary:
+            return getattr(accessor, method)(*args, **kwargs)
+        try:
+            return getattr(accessor, method)(*args, **kwargs)
+        except Exception as e:
+            # Only blame the replica if the primary can answer, otherwise it's the query that's broken
+            result = getattr(self.primary, method)(*args, **kwargs)
+            self.mark_down(accessor, e)
+            return result
+
+    def stream(self, method, *args, **kwargs):
+        """
+            Run a streaming read method on a chosen accessor, retrying on the primary if a replica fails before
+            producing its first batch
+        :param method: Name of the accessor method, returning a generator
+        :param args: Positional arguments to the method
+        :param kwargs: Keyword arguments to the method
+        :return: Generator of the method's results
+        """
+        accessor = self.choose()
+        if accessor is self.primary:
+            yield from getattr(accessor, method)(*args, **kwargs)
+            return
+        started = False
+        try:
+            for batch in getattr(accessor, method)(*args, **kwargs):
+                started = True
+                yield batch
+        except Exception as e:
+            if started:
+                raise
+            self.mark_down(accessor, e)
+            yield from getattr(self.primary, method)(*args, **kwargs)
+
+    def connect(self, addresses, **kwargs):
+        """
+            Open the connection pools of all replicas. Replicas that fail to connect are logged and left out of
+            rotation until they are reconnected
+        :param addresses: List of (host, port) pairs, one per replica
+        :param kwargs: Other arguments to the accessors' create_connection
+        """
+        with self._lock:
+            self._down.clear()
+        for replica, (host, port) in zip(self.replicas, addresses):
+            if replica.is_connected():
+                replica.close()
+            try:
+                replica.create_connection(host=host, port=port, **kwargs)
+            except Exception as e:
+                log.warning(f"Failed to connect to read replica {host}:{port}: {e}")
+
+    def add_listener(self, listener):
+        """
+            Attach a query listener to every replica
+        :param listener: Callable taking a QueryEvent
+        """
+        for replica in self.replicas:
+            replica.add_listener(listener)
+
+    def remove_listener(self, listener):
+        """
+            Detach a query listener from every replica
+        :param listener: Listener previously passed to add_listener
+        """
+        for replica in self.replicas:
+            replica.remove_listener(listener)
+
+    def invalidate_statements(self):
+        """
+            Forget cached statements on every replica, after a schema change
+        """
+        for replica in self.replicas:
+            replica.invalidate_statements()
+
+    def close(self):
+        """
+            Close the connection pools of all replicas
+        """
+        for replica in self.replicas:
+            replica.close()
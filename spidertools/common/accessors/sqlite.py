@@ -0,0 +1,609 @@
+
+import functools
+import logging
+import re
+import sqlite3
+
+from . import base
+
+
+log = logging.getLogger("spidertools.common.accessors")
+_Sentinel = object()
+_param = re.compile(r"%\((\w+)\)s|%s")
+
+
+def _transform_type(t):
+    """
+        Convert a type from a schema-def to a SQLite type
+    :param t: Type in schemadef
+    :return: SQLite equivalent
+    """
+    if t.lower() == "serial":
+        t = "integer"
+    return t
+
+
+@functools.lru_cache(maxsize=1024)
+def _convert_params(query):
+    """
+        Convert a query from the pyformat placeholders used by the other flavors to SQLite's named and qmark styles
+    :param query: Query using %s and %(name)s placeholders
+    :return: Query using ? and :name placeholders
+    """
+    return _param.sub(lambda m: "?" if m.group(1) is None else f":{m.group(1)}", query)
+
+
+def _pad(values, length):
+    """
+        Pad a tuple of information with nulls, so it fits the information_schema layout the data Rows expect
+    :param values: Known values
+    :param length: Length of the full row
+    :return: Tuple of the values followed by None
+    """
+    return tuple(values) + (None,) * (length - len(values))
+
+
+class _Connection(sqlite3.Connection):
+    """
+        SQLite connection with the autocommit switch the pool and transactions expect from other drivers.
+        Turning autocommit off begins a transaction immediately, so DDL is included in it as well
+    """
+
+    @property
+    def autocommit(self):
+        """
+            Whether statements are committed as they run
+        """
+        return self.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if value:
+            if self.in_transaction:
+                self.commit()
+            self.isolation_level = None
+        elif self.isolation_level is None:
+            self.isolation_level = "DEFERRED"
+            self.execute("BEGIN")
+
+
+class SqliteAccessor(base.DatabaseAccessor):
+    """
+        Database accessor for an embedded SQLite database. The host is the database file path, or empty or `:memory:`
+        for a shared in-memory database named after the schema, which lives as long as the pool keeps a connection
+        open. SQLite has no separate schemas, so the configured schema name refers to the main database
+    """
+
+    __slots__ = ("_schema",)
+
+    TRANSACTIONAL_DDL = True
+
+    #: Page cache size per connection, in KiB
+    CACHE_SIZE = 64 * 1024
+    #: Bytes of the database file to memory map
+    MMAP_SIZE = 256 * 1024 * 1024
+    #: Seconds to wait for a lock held by another connection
+    BUSY_TIMEOUT = 5.0
+
+    def create_connection(self, *, user, password, host, port, schema, autocommit):
+        """
+            Create a new database connection pool
+        :param user: Unused
+        :param password: Unused
+        :param host: Path to the database file, or empty or :memory: for an in-memory database
+        :param port: Unused
+        :param schema: Schema name to use
+        :param autocommit: Whether to autocommit changes
+        """
+        self._schema = schema
+        memory = not host or host == ":memory:"
+        if memory:
+            path = f"file:{schema}?mode=memory&cache=shared"
+        else:
+            path = host
+
+        def connect():
+            cnx = sqlite3.connect(
+                path, timeout=self.BUSY_TIMEOUT, isolation_level=None, check_same_thread=False, uri=memory,
+                factory=_Connection
+            )
+            if memory:
+                # Shared cache connections lock whole tables, let readers skip those locks
+                cnx.execute("PRAGMA read_uncommitted = ON")
+            else:
+                cnx.execute("PRAGMA journal_mode = WAL")
+                cnx.execute("PRAGMA synchronous = NORMAL")
+                cnx.execute(f"PRAGMA mmap_size = {int(self.MMAP_SIZE)}")
+            cnx.execute(f"PRAGMA cache_size = -{int(self.CACHE_SIZE)}")
+            cnx.execute("PRAGMA temp_store = MEMORY")
+            cnx.execute("PRAGMA foreign_keys = ON")
+            cnx.autocommit = autocommit
+            return cnx
+
+        self._start_pool(connect, connect())
+        return True
+
+    def check_connection(self, cnx):
+        """
+            Check whether a pooled connection is still usable
+        :param cnx: Connection to check
+        :return: Whether the connection is alive
+        """
+        cnx.execute("SELECT 1").close()
+        return True
+
+    def execute(self, query, params=None, multi=False):
+        """
+            Execute a query with the given params, optionally allowing multi-query execution
+        :param query: Query to execute
+        :param params: Parameters to pass to the query
+        :param multi: Whether to allow multi-query
+        """
+        with self.checkout() as cursor:
+            if multi:
+                return self._run(cursor, query, None, execute=lambda q, _: cursor.executescript(q))
+            return self._run(cursor, _convert_params(query), () if params is None else params)
+
+    def get_schemata(self):
+        """
+            Get a list of information about the databases's available schemata
+        :return: List of schemata info tuples
+        """
+        with self.checkout() as cursor:
+            self.execute("PRAGMA database_list")
+            return [("def", x[1], "UTF-8", None, x[2], None) for x in cursor.fetchall()]
+
+    def current_schema(self):
+        """
+            Get the current schema in use by the database
+        :return: Current in-use schema
+        """
+        return "main"
+
+    def create_schema(self, schema):
+        """
+            Create a new schema in the database. SQLite keeps one schema per file, so there is nothing to create
+        :param schema: Name of the new schema
+        """
+        log.info(f"SQLite has no separate schemas, using the main database for {schema}")
+
+    def has_schema(self, schema):
+        """
+            Check whether the database contains a desired schema. The configured schema is always the main database
+        :param schema: Schema name to check
+        :return: Whether schema exists in database
+        """
+        if schema == self._schema:
+            return True
+        return any(x[1] == schema for x in self.get_schemata())
+
+    def create_table(self, name, columns, primary_keys=None, foreign_keys=None):
+        """
+            Create a new table in the current schema.
+        :param name: Name of the new table
+        :param columns: Columns to create, takes the form of a dict with "name" and "type" params, minimally
+        :param primary_keys: List of primary key names
+        :param foreign_keys: List of foreign keys, of the form of a dict with "local_name" and "remote_table" params,
+                             minimally
+        """
+        query = f"CREATE TABLE {self.schema}.{name} ("
+
+        lines = []
+
+        for i in columns:
+            column = f"{i['name']} {_transform_type(i['type'])}"
+            if i.get("not_null", False):
+                column += " NOT NULL"
+            if i.get("is_unique", False):
+                column += " UNIQUE"
+            default = i.get("default", _Sentinel)
+            if default is not _Sentinel:
+                if default is None:
+                    default = "null"
+                elif isinstance(default, str):
+                    default = f"\'{default}\'"
+                column += f" DEFAULT {default}"
+            lines.append(column)
+
+        if primary_keys is not None:
+            lines.append("PRIMARY KEY (" + ", ".join(primary_keys) + ")")
+
+        if foreign_keys is not None:
+            for i in foreign_keys:
+                local_name = i["local_name"]
+                remote_name = i.get("remote_name", local_name)
+                foreign = f"FOREIGN KEY ({local_name}) REFERENCES {i['remote_table']}({remote_name})"
+                if i.get("on_delete") is not None:
+                    foreign += f" ON DELETE {i['on_delete']}"
+                if i.get("on_update") is not None:
+                    foreign += f" ON UPDATE {i['on_update']}"
+                lines.append(foreign)
+
+        query += ", ".join(lines)
+        query += ")"
+
+        self.execute(query)
+
+    def get_tables(self):
+        """
+            Get a list of information about the current schema's tables
+        :return: List of table info tuples
+        """
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )
+            return [_pad(("def", self._schema, x[0], "BASE TABLE"), 21) for x in cursor.fetchall()]
+
+    def has_table(self, name):
+        """
+            Check whether a given table exists in the current schema
+        :param name: Name of the table
+        :return: Whether the table exists
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", [name])
+            return cursor.fetchone()[0] == 1
+
+    def drop_table(self, name):
+        """
+            Drop a given table from the current schema
+        :param name: Name of the table to drop
+        """
+        self.execute(f"DROP TABLE {name}")
+
+    def add_column(self, table, column, *, after=None):
+        """
+            Add a column to a table. SQLite always adds columns at the end, so after is ignored
+        :param table: Table to add the column to
+        :param column: Column to add, same format as create_table
+        :param after: Column to add it after, if supported
+        """
+        query = f"ALTER TABLE {self.schema}.{table} ADD COLUMN {column['name']} {_transform_type(column['type'])}"
+        if column.get("not_null", False) is True:
+            query += " NOT NULL"
+        if column.get("is_unique", False) is True:
+            query += " UNIQUE"
+        default = column.get("default", _Sentinel)
+        if default is not _Sentinel:
+            query += " DEFAULT " + ("null" if default is None else f"\'{default}\'" if isinstance(default, str)
+                                    else str(default))
+        self.execute(query)
+
+    def _column_info(self, table, row):
+        """
+            Convert a table_info pragma row into an information_schema COLUMNS layout
+        :param table: Table the column belongs to
+        :param row: Tuple of cid, name, type, notnull, default and pk
+        :return: Column info tuple
+        """
+        cid, name, type, not_null, default, pk = row
+        return _pad((
+            "def", self._schema, table, name, cid + 1, default, "NO" if not_null else "YES", type.lower(), None,
+            None, None, None, None, None, None, type, "PRI" if pk else ""
+        ), 21)
+
+    def get_columns(self, table):
+        """
+            Get a list of information about columns on a given table
+        :param table: Table to get column info for
+        :return: List of column info tuples
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT cid, name, type, \"notnull\", dflt_value, pk FROM pragma_table_info(%s)", [table])
+            return [self._column_info(table, x) for x in cursor.fetchall()]
+
+    def get_all_columns(self):
+        """
+            Get a list of information about every column of every table in the current schema, in one query
+        :return: List of column info tuples
+        """
+        with self.checkout() as cursor:
+            self.execute(
+                "SELECT m.name, p.cid, p.name, p.type, p.\"notnull\", p.dflt_value, p.pk FROM sqlite_master m "
+                "JOIN pragma_table_info(m.name) p WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' "
+                "ORDER BY m.name, p.cid"
+            )
+            return [self._column_info(x[0], x[1:]) for x in cursor.fetchall()]
+
+    def has_column(self, table, column):
+        """
+            Check whether a column with a given name exists on a table
+        :param table: Table to check
+        :param column: Column to check for
+        :return: Whether a column with that name exists
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT COUNT(*) FROM pragma_table_info(%s) WHERE name = %s", [table, column])
+            return cursor.fetchone()[0] > 0
+
+    def alter_column(self, table, column):
+        """
+            Change the type or constraints of a column on a table. SQLite can't alter columns in place, so the table
+            is rebuilt with the new column definition, its rows copied over, and its indexes and triggers recreated
+        :param table: Table to alter
+        :param column: Column to alter, same format as create_table
+        """
+        schema = self.schema
+        with self.checkout() as cursor:
+            self.execute("SELECT cid, name, type, \"notnull\", dflt_value, pk FROM pragma_table_info(%s)", [table])
+            info = cursor.fetchall()
+            self.execute("SELECT * FROM pragma_foreign_key_list(%s) ORDER BY id, seq", [table])
+            foreign = cursor.fetchall()
+            self.execute(
+                "SELECT sql FROM sqlite_master WHERE tbl_name = %s AND type IN ('index', 'trigger') AND sql NOT NULL",
+                [table]
+            )
+            attached = [x[0] for x in cursor.fetchall()]
+
+            lines = []
+            for _, name, type, not_null, default, _ in info:
+                if name == column["name"]:
+                    line = f"{name} {_transform_type(column['type'])}"
+                    if column.get("not_null", False) is True:
+                        line += " NOT NULL"
+                    if column.get("is_unique", False) is True:
+                        line += " UNIQUE"
+                else:
+                    line = f"{name} {type}"
+                    if not_null:
+                        line += " NOT NULL"
+                if default is not None:
+                    line += f" DEFAULT {default}"
+                lines.append(line)
+            primary = [x[1] for x in sorted((x for x in info if x[5]), key=lambda x: x[5])]
+            if primary:
+                lines.append("PRIMARY KEY (" + ", ".join(primary) + ")")
+            for _, _, remote_table, local_name, remote_name, on_update, on_delete, _ in foreign:
+                line = f"FOREIGN KEY ({local_name}) REFERENCES {remote_table}({remote_name})"
+                if on_delete != "NO ACTION":
+                    line += f" ON DELETE {on_delete}"
+                if on_update != "NO ACTION":
+                    line += f" ON UPDATE {on_update}"
+                lines.append(line)
+
+            temp = f"st_alter_{table}"
+            names = ", ".join(x[1] for x in info)
+            self.execute(f"CREATE TABLE {schema}.{temp} (" + ", ".join(lines) + ")")
+            self.execute(f"INSERT INTO {schema}.{temp} ({names}) SELECT {names} FROM {schema}.{table}")
+            self.execute(f"DROP TABLE {schema}.{table}")
+            self.execute(f"ALTER TABLE {schema}.{temp} RENAME TO {table}")
+            for query in attached:
+                self.execute(query)
+
+    def drop_column(self, table, column):
+        """
+            Remove a column from a table
+        :param table: Table to drop column from
+        :param column: Name of column to drop
+        """
+        self.execute(f"ALTER TABLE {self.schema}.{table} DROP COLUMN {column}")
+
+    def get_primary_keys(self, table):
+        """
+            Get the names of the primary key columns of a table
+        :param table: Table to get primary keys of
+        :return: Tuple of column names
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT name FROM pragma_table_info(%s) WHERE pk > 0 ORDER BY pk", [table])
+            return tuple(x[0] for x in cursor.fetchall())
+
+    def _insert_parts(self, table, width, names, update):
+        """
+            Get the pieces of an insert statement, reusing previously built ones of the same shape. Building an
+            upsert looks up the table's primary keys, so that lookup also only happens once per shape
+        :param table: Table to insert into
+        :param width: Number of values per row
+        :param names: Names of the columns being inserted, or None
+        :param update: Whether to upsert
+        :return: Tuple of statement prefix, placeholder for one row, and statement suffix
+        """
+        def build():
+            prefix = f"INSERT INTO {self.schema}.{table}"
+            if names is not None:
+                prefix += " (" + ", ".join(names) + ")"
+            prefix += " VALUES "
+            placeholder = "(" + ", ".join("?" for _ in range(width)) + ")"
+            suffix = ""
+            if update:
+                cols = self.get_primary_keys(table)
+                if len(cols) == 0:
+                    raise ValueError("Table has no primary keys, cannot update")
+                suffix = f" ON CONFLICT ({', '.join(cols)}) DO UPDATE SET " + \
+                         ", ".join(f"{i} = excluded.{i}" for i in names)
+            return prefix, placeholder, suffix
+
+        key = ("INSERT", table, width, None if names is None else tuple(names), update)
+        return self._statements.get(key, build)
+
+    def insert(self, table, *, values, names=None, update=False):
+        """
+            Insert a row into a table
+        :param table: Table to insert into
+        :param values: Values to insert
+        :param names: Names of rows to insert
+        :param update: Whether to upsert
+        """
+        if names and len(names) != len(values):
+            raise ValueError("Number of names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
+
+        prefix, placeholder, suffix = self._insert_parts(table, len(values), names, update)
+        return self.execute(prefix + placeholder + suffix, values)
+
+    def insert_many(self, table, *, rows, names=None, update=False, chunk_size=500):
+        """
+            Insert many rows into a table. SQLite runs in process, so one prepared statement executed per row is
+            as fast as multi-row VALUES lists and isn't limited by the max number of bound parameters
+        :param table: Table to insert into
+        :param rows: Sequence of value sequences to insert
+        :param names: Names of the columns being inserted
+        :param update: Whether to upsert
+        :param chunk_size: Max number of rows to send in one call
+        """
+        if not rows:
+            return
+        width = len(rows[0])
+        if names is not None and len(names) != width:
+            raise ValueError("Number of names must match values for update")
+        if update and names is None:
+            raise ValueError("Must supply names with update")
+
+        with self.checkout() as cursor:
+            prefix, placeholder, suffix = self._insert_parts(table, width, names, update)
+            query = prefix + placeholder + suffix
+            for start in range(0, len(rows), chunk_size):
+                self._run(cursor, query, rows[start:start + chunk_size], execute=cursor.executemany)
+
+    def count(self, table, *, where, params=None, limit=None):
+        """
+            Count the number of rows matching a query
+        :param table: Table to count from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param limit: Max limit to count
+        :return: Number of rows matching query
+        """
+        query = self._statement("SELECT COUNT(*)", table, where, limit=limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchone()[0]
+
+    def estimate_count(self, table):
+        """
+            Estimate the number of rows in a table from sqlite_stat1, which ANALYZE and PRAGMA optimize fill in
+        :param table: Table to estimate
+        :return: Estimated number of rows, or None if the table hasn't been analyzed
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            self.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+        # The first number of each stat is the row count of the table
+        return None if row is None or not row[0] else int(row[0].split(" ", 1)[0])
+
+    def select(self, table, *, where, params=None, order=None, limit=None):
+        """
+            Select rows from a table matching a query
+        :param table: Table to select from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the result
+        :param limit: Max limit of rows to select
+        :return: List of tuples of row data
+        """
+        query = self._statement("SELECT *", table, where, order, limit)
+        with self.checkout() as cursor:
+            self.execute(query, params)
+            return cursor.fetchall()
+
+    def select_iter(self, table, *, where, params=None, order=None, limit=None, batch_size=1000):
+        """
+            Select rows from a table matching a query, stepping through the result in batches on a dedicated
+            connection
+        :param table: Table to select from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the result
+        :param limit: Max limit of rows to select
+        :param batch_size: Number of rows per batch
+        :return: Generator of lists of tuples of row data
+        """
+        query = _convert_params(self._statement("SELECT *", table, where, order, limit))
+        with self.dedicated_connection(discard_incomplete=False) as cnx:
+            if cnx is None:
+                return
+            cursor = cnx.cursor()
+            try:
+                self._run(cursor, query, () if params is None else params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                cursor.close()
+
+    def delete(self, table, *, where, params=None, order=None, limit=None):
+        """
+            Delete rows from a table matching a query. SQLite doesn't support ORDER BY or LIMIT on DELETE, so limited
+            deletes select the rowids to remove
+        :param table: Table to delete from
+        :param where: Query string
+        :param params: Parameters to the query
+        :param order: How to order the deletion
+        :param limit: Max limit of rows to delete
+        """
+        if order is None and limit is None:
+            self.execute(self._statement("DELETE", table, where), params)
+            return
+        inner = self._statement("SELECT rowid", table, where, order, limit)
+        self.execute(f"DELETE FROM {self.schema}.{table} WHERE rowid IN ({inner})", params)
+
+    def create_trigger(self, name, cause, table, for_each, text):
+        """
+            Create a new trigger on the database. SQLite only has row triggers
+        :param name: Name of the trigger
+        :param cause: Cause of the trigger
+        :param table: Table the trigger is on
+        :param for_each: Row or statement
+        :param text: Functional code of the trigger
+        """
+        if for_each.upper() != "ROW":
+            raise ValueError("SQLite only supports FOR EACH ROW triggers")
+        self.execute(f"CREATE TRIGGER {self.schema}.{name} {cause} ON {table} FOR EACH ROW BEGIN {text} END")
+
+    def get_triggers(self):
+        """
+            Get a list of triggers on the current database schema
+        :return: List of tuples of trigger info
+        """
+        with self.checkout() as cursor:
+            self.execute("SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+            return [
+                _pad(("def", self._schema, name, None, "def", self._schema, table, None, None, sql), 22)
+                for name, table, sql in cursor.fetchall()
+            ]
+
+    def drop_trigger(self, trigger):
+        """
+            Drop a trigger from the current schema by name
+        :param trigger: Name of trigger to drop
+        """
+        self.execute(f"DROP TRIGGER IF EXISTS {self.schema}.{trigger}")
+
+    def create_index(self, name, table, columns, *, unique=False):
+        """
+            Create a new secondary index on a table
+        :param name: Name of the index
+        :param table: Table the index is on
+        :param columns: List of column names, in index order
+        :param unique: Whether the index enforces uniqueness
+        """
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        self.execute(f"CREATE {kind} {self.schema}.{name} ON {table} ({', '.join(columns)})")
+
+    def get_indexes(self):
+        """
+            Get the indexes in the current schema made with CREATE INDEX. Primary keys and indexes backing UNIQUE or
+            FOREIGN KEY constraints aren't included
+        :return: List of tuples of table name, index name, tuple of column names, and whether it's unique
+        """
+        query = "SELECT m.name, l.name, l.\"unique\", i.name FROM sqlite_master m " \
+                "JOIN pragma_index_list(m.name) l JOIN pragma_index_info(l.name) i " \
+                "WHERE m.type = 'table' AND l.origin = 'c' ORDER BY m.name, l.name, i.seqno"
+        with self.checkout() as cursor:
+            self.execute(query)
+            return base._group_indexes(cursor.fetchall())
+
+    def drop_index(self, table, name):
+        """
+            Drop an index from the current schema by name
+        :param table: Table the index is on
+        :param name: Name of the index to drop
+        """
+        self.execute(f"DROP INDEX IF EXISTS {self.schema}.{name}")
@@ -0,0 +1,204 @@
+
+import bisect
+import collections
+import functools
+import logging
+import re
+import threading
+
+
+log = logging.getLogger("spidertools.common.accessors.stats")
+
+#: Upper bounds, in seconds, of the latency histogram buckets. The last bucket catches everything slower
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf")
+)
+
+QueryEvent = collections.namedtuple(
+    "QueryEvent", ("statement", "operation", "table", "duration", "rows", "cached", "error")
+)
+QueryEvent.__doc__ = """
+    A record of one statement run by an accessor, or one cached read by a GenericDatabase. duration is in seconds,
+    rows is the rows returned or affected if the driver reports it, cached is True for a cache hit, False for a cache
+    miss and None for statements that don't go through the cache, and error is the raised exception, if any
+"""
+
+_placeholder_list = re.compile(r"\((\s*(?:%s|%\(\w+\)s|\?)\s*)(?:,(?:\s*(?:%s|%\(\w+\)s|\?)\s*))+\)")
+_repeated_group = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+_number = re.compile(r"\b\d+\b")
+_space = re.compile(r"\s+")
+_table = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|JOIN)\s+(?:\w+\.)?(\w+)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def describe(statement):
+    """
+        Get the shape, operation and table of a statement. The shape is the statement with placeholder lists,
+        repeated row groups and number literals collapsed, so statements differing only in batch size, limit or
+        offset are counted together
+    :param statement: SQL statement text
+    :return: Tuple of shape, operation, and table name or None
+    """
+    shape = _space.sub(" ", statement).strip()
+    shape = _placeholder_list.sub(r"(\1, ...)", shape)
+    shape = _repeated_group.sub(r"\1, ...", shape)
+    shape = _number.sub("?", shape)
+    operation = shape.split(" ", 1)[0].upper()
+    match = _table.search(shape)
+    return shape, operation, match.group(1) if match else None
+
+
+class StatementStats:
+    """
+        Aggregated timings for one statement shape
+    """
+
+    __slots__ = ("statement", "operation", "table", "count", "errors", "total", "max", "rows", "hits", "misses",
+                 "buckets")
+
+    def __init__(self, statement, operation, table):
+        """
+            Initialize an empty StatementStats
+        :param statement: Statement shape
+        :param operation: SQL operation, such as SELECT or INSERT
+        :param table: Table the statement acts on, or None
+        """
+        self.statement = statement
+        self.operation = operation
+        self.table = table
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    @property
+    def mean(self):
+        """
+            Mean duration of the statement in seconds
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, event):
+        """
+            Add one event to these stats
+        :param event: QueryEvent for this statement shape
+        """
+        self.count += 1
+        self.total += event.duration
+        if event.duration > self.max:
+            self.max = event.duration
+        if event.rows is not None and event.rows > 0:
+            self.rows += event.rows
+        if event.error is not None:
+            self.errors += 1
+        if event.cached is True:
+            self.hits += 1
+        elif event.cached is False:
+            self.misses += 1
+        self.buckets[bisect.bisect_left(BUCKETS, event.duration)] += 1
+
+    def percentile(self, fraction):
+        """
+            Estimate a duration percentile from the histogram
+        :param fraction: Percentile as a fraction, such as 0.95
+        :return: Upper bound of the bucket holding that percentile, in seconds
+        """
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+            Convert these stats to a plain dict
+        :return: Dict of the stats, with the histogram keyed by bucket upper bound
+        """
+        return {
+            "statement": self.statement,
+            "operation": self.operation,
+            "table": self.table,
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "rows": self.rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "histogram": dict(zip(BUCKETS, self.buckets)),
+        }
+
+
+class QueryStats:
+    """
+        A query listener that aggregates events into per-statement-shape latency histograms, and logs statements
+        slower than a threshold. Attach it to a GenericDatabase or DatabaseAccessor with add_listener
+    """
+
+    __slots__ = ("slow_threshold", "_stats", "_lock")
+
+    def __init__(self, slow_threshold=None):
+        """
+            Initialize a QueryStats
+        :param slow_threshold: Seconds after which a statement is logged as slow, or None to not log
+        """
+        self.slow_threshold = slow_threshold
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        """
+            Record a query event
+        :param event: QueryEvent to record
+        """
+        shape, operation, table = describe(event.statement)
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None:
+                stats = self._stats[shape] = StatementStats(shape, event.operation or operation, event.table or table)
+            stats.add(event)
+        threshold = self.slow_threshold
+        if threshold is not None and event.duration >= threshold:
+            log.warning(f"Slow query ({event.duration * 1000:.1f}ms, {event.rows} rows): {shape}")
+
+    def __len__(self):
+        """
+            Get the number of statement shapes seen
+        :return: Number of shapes
+        """
+        return len(self._stats)
+
+    def get(self, statement):
+        """
+            Get the stats for the shape of a statement
+        :param statement: Statement text or shape
+        :return: StatementStats, or None if the shape hasn't been seen
+        """
+        return self._stats.get(describe(statement)[0])
+
+    def dump(self):
+        """
+            Get a snapshot of all stats, slowest total time first
+        :return: List of dicts, see StatementStats.to_dict
+        """
+        with self._lock:
+            stats = [x.to_dict() for x in self._stats.values()]
+        stats.sort(key=lambda x: x["total"], reverse=True)
+        return stats
+
+    def reset(self):
+        """
+            Forget all recorded stats
+        """
+        with self._lock:
+            self._stats.clear()
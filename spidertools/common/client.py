@@ -11,6 +11,28 @@ from spidertools.common import utils
 log = logging.getLogger("spidertools.common.client")
 
 
+def _smbc_list_loaded(doc, parser):
+    """
+        Check whether the comic list of the SMBC archive has been parsed, the rest of the page isn't needed
+    :param doc: Partial archive Document
+    :param parser: TreeGen parsing it
+    :return: Whether the list is complete
+    """
+    selector = doc.get_by_name("comic")
+    return selector is not None and not parser.is_open(selector)
+
+
+def _smbc_loaded(doc, parser):
+    """
+        Check whether everything get_smbc reads from a comic page has been parsed
+    :param doc: Partial comic Document
+    :param parser: TreeGen parsing it
+    :return: Whether the comic and its publish time are complete
+    """
+    time = doc.get_first_by_class("cc-publishtime")
+    return doc.get_by_id("cc-comic") is not None and time is not None and not parser.is_open(time)
+
+
 class TalosHTTPClient:
     """
         Extension of the aiohttp ClientSession to provide utility methods for getting certain sites and such,
@@ -53,15 +75,32 @@ class TalosHTTPClient:
         """
         await self.client.close()
 
-    async def get_site(self, url, **kwargs):
+    async def _stream_dom(self, response, until=None, keep=None):
+        """
+            Parse a response body into a Document while it downloads. If until is satisfied before the end, the
+            response is closed so the rest isn't downloaded
+        :param response: aiohttp response to read
+        :param until: Optional callable taking the partial Document and parser, see utils.to_dom_stream
+        :param keep: Optional CSS selector or predicate limiting which elements are built, see parsers.TreeGen
+        :return: Parsed Document, or None if the body was empty
+        """
+        doc, complete = await utils.to_dom_stream(
+            response.content.iter_any(), encoding=response.charset or "utf-8", until=until, keep=keep
+        )
+        if not complete:
+            response.close()
+        return doc
+
+    async def get_site(self, url, *, until=None, **kwargs):
         """
             Get the text of a given URL
         :param url: url to get text from
+        :param until: Optional callable taking the partial Document and parser, to stop downloading once it's True
         :param kwargs: keyword args to pass to the GET call
         :return: text of the requested page
         """
         async with self.client.get(url, **kwargs) as response:
-            return utils.to_dom(await response.text())
+            return await self._stream_dom(response, until)
 
     async def server_post_commands(self, commands):
         """
@@ -107,7 +146,9 @@ class TalosHTTPClient:
                              f"{gender}{usage}"
         async with self.client.get(url) as response:
             if response.status == 200:
-                doc = utils.to_dom(await response.text())
+                doc = await self._stream_dom(response, keep="name")
+                if doc is None:
+                    return []
                 return [x.innertext for x in doc.get_by_tag("name")]
             else:
                 log.warning(f"BTN returned {response.status}")
@@ -148,9 +189,10 @@ class TalosHTTPClient:
         :return: List of elements
         """
         async with self.client.get(self.SMBC_URL + "comic/archive/") as response:
-            dom = utils.to_dom(await response.text())
-            selector = dom.get_by_name("comic")
-            return selector.child_nodes[1:]
+            dom = await self._stream_dom(response, _smbc_list_loaded, "select[name=comic]")
+            if dom is None:
+                return []
+            return dom.select("select[name=comic] > option:nth-child(n+2)")
 
     async def get_smbc(self, smbc):
         """
@@ -164,7 +206,9 @@ class TalosHTTPClient:
         else:
             url = self.SMBC_URL + f"comic/{smbc}"
         async with self.client.get(url, headers={"user-agent": ""}) as response:
-            dom = utils.to_dom(await response.text())
+            dom = await self._stream_dom(response, _smbc_loaded, "title, #cc-comic, .cc-publishtime")
+            if dom is None:
+                return None
             data["title"] = "-".join(dom.get_by_tag("title")[0].innertext.split("-")[1:]).strip()
             comic = dom.get_by_id("cc-comic")
             if comic is None:
@@ -1,5 +1,13 @@
 
+import asyncio
+import collections
+import functools
+import inspect
+import itertools
+import threading
+import time
 import types
+import weakref
 
 
 def _mangle(cls, name):
@@ -123,6 +131,11 @@ def noarg_decorator(func):
 
 
 _caches = {}
+_Missing = object()
+_kwd_mark = object()
+_fast_types = {int, str}
+
+CacheInfo = collections.namedtuple("CacheInfo", ("hits", "misses", "maxsize", "currsize"))
 
 
 def _make_unique(key, val):
@@ -139,89 +152,426 @@ def _make_unique(key, val):
 
 def _make_key(args, kwargs):
     """
-        Generate a unique key from a set of arguments. If the arguments are all hashable,
-        then their hash is used. Otherwise, their ID is used. Hashables are thus compared
-        same by value equality, non-hashables by identity
+        Generate a key from a set of arguments. Positional arguments keep their order, and keyword arguments follow
+        a marker so the two can't collide. Hashables are compared by value equality, non-hashables by their str.
+        A single int or str argument is its own key
     :param args: Positional arguments to key on
     :param kwargs: Keyword arguments to key on
-    :return: FrozenSet that represents this set of arguments
+    :return: Hashable key that represents this set of arguments
+    """
+    if not kwargs and len(args) == 1 and type(args[0]) in _fast_types:
+        return args[0]
+    key = args
+    if kwargs:
+        key += (_kwd_mark,) + tuple(kwargs.items())
+    try:
+        hash(key)
+    except TypeError:
+        key = tuple(str(x) if type(x).__hash__ is None else x for x in args)
+        if kwargs:
+            key += (_kwd_mark,) + tuple(_make_unique(x, y) for x, y in kwargs.items())
+    return key
+
+
+def _split_key(key):
+    """
+        Recover the arguments a key was made from. Unhashable values come back as their str
+    :param key: Key from _make_key
+    :return: Tuple of positional arguments and dict of keyword arguments
+    """
+    if type(key) in _fast_types:
+        return (key,), {}
+    for index, item in enumerate(key):
+        if item is _kwd_mark:
+            return key[:index], dict(key[index + 1:])
+    return key, {}
+
+
+class CallCache:
+    """
+        Cached results of one function, or of one instance's method. Entries are evicted least-recently-used once
+        maxsize is reached, and optionally expire ttl seconds after being stored. Keys are indexed by each argument's
+        position or name with its value and with its type, so invalidating by argument only touches matching entries
+    """
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "version", "flights", "_entries", "_values", "_types", "_lock")
+
+    def __init__(self, maxsize=None, ttl=None):
+        """
+            Initialize a CallCache
+        :param maxsize: Maximum number of results to keep, or None for no limit. 0 keeps nothing, so a coroutine
+                        function only has concurrent calls coalesced
+        :param ttl: Seconds a result stays valid, or None for no expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.flights = {}
+        self._entries = collections.OrderedDict()
+        self._values = {}
+        self._types = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+            Get the number of cached results
+        :return: Number of entries
+        """
+        return len(self._entries)
+
+    def get(self, key, default=_Missing):
+        """
+            Get a cached result, counting the hit or miss
+        :param key: Key from _make_key
+        :param default: Value to return on a miss
+        :return: Cached result, or default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return default
+        if self.maxsize is not None:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                pass
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """
+            Store a result, evicting the least recently used results if the cache is full
+        :param key: Key from _make_key
+        :param value: Result to store
+        """
+        if self.maxsize == 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if key not in self._entries:
+                self._index(key, True)
+            self._entries[key] = (value, expires)
+            if self.maxsize is not None:
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._index(self._entries.popitem(last=False)[0], False)
+
+    def _index(self, key, add):
+        """
+            Add a key to or remove it from the argument indexes. Must be called holding the lock
+        :param key: Key from _make_key
+        :param add: Whether to add the key, instead of removing it
+        """
+        args, kwargs = _split_key(key)
+        for index in (self._values, self._types):
+            is_values = index is self._values
+            for position, value in itertools.chain(enumerate(args), kwargs.items()):
+                pair = (position, value if is_values else type(value))
+                if add:
+                    keys = index.get(pair)
+                    if keys is None:
+                        keys = index[pair] = set()
+                    keys.add(key)
+                else:
+                    keys = index.get(pair)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del index[pair]
+
+    def pop(self, key):
+        """
+            Remove a cached result, if it exists
+        :param key: Key from _make_key
+        """
+        with self._lock:
+            if self._entries.pop(key, _Missing) is not _Missing:
+                self._index(key, False)
+
+    def matching(self, position, value, generic=False):
+        """
+            Get the keys of cached results called with a value at an argument position or name
+        :param position: Positional index or keyword name of the argument
+        :param value: Value the argument must equal, or type it must have if generic
+        :param generic: Whether to match by type instead of equality
+        :return: Set of keys
+        """
+        index = self._types if generic else self._values
+        with self._lock:
+            return set(index.get((position, value), ()))
+
+    def invalidate(self, keys=None):
+        """
+            Remove cached results because what they were computed from changed. Results of calls still in flight
+            won't be stored, and later calls won't join them
+        :param keys: Iterable of keys to remove, or None for all
+        """
+        if keys is None:
+            self.clear()
+            return
+        with self._lock:
+            self.version += 1
+            self.flights.clear()
+            for key in keys:
+                if self._entries.pop(key, _Missing) is not _Missing:
+                    self._index(key, False)
+
+    def keys(self):
+        """
+            Get the keys of all cached results
+        :return: List of keys
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        """
+            Remove all cached results
+        """
+        with self._lock:
+            self.version += 1
+            self.flights.clear()
+            self._entries.clear()
+            self._values.clear()
+            self._types.clear()
+
+
+def _drop_instance(instances, key, ref):
+    """
+        Weak reference callback removing a dead instance's cache from a CacheGroup, unless its id was already reused
+    :param instances: CacheGroup's dict of instance id to (weak reference, CallCache)
+    :param key: id of the instance
+    :param ref: Weak reference that died
+    """
+    entry = instances.get(key)
+    if entry is not None and entry[0] is ref:
+        del instances[key]
+
+
+class CacheGroup:
+    """
+        The caches of one function wrapped by invalidating_cache. A function has one cache, and a method has one per
+        instance, dropped along with the instance. Instances are told apart by identity, not equality. Instances that
+        can't be weakly referenced share one cache, with the instance as part of the key
+    """
+
+    __slots__ = ("maxsize", "ttl", "method", "shared", "_instances")
+
+    def __init__(self, maxsize=None, ttl=None, method=False):
+        """
+            Initialize a CacheGroup
+        :param maxsize: Maximum number of results kept by each cache, or None for no limit
+        :param ttl: Seconds a result stays valid, or None for no expiry
+        :param method: Whether the function is a method, and results are cached per instance
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.method = method
+        self.shared = CallCache(maxsize, ttl)
+        self._instances = {} if method else None
+
+    def _get(self, instance):
+        """
+            Get the existing cache of an instance
+        :param instance: Instance the method is called on
+        :return: CallCache for the instance, or None if it has none
+        """
+        entry = self._instances.get(id(instance))
+        if entry is None or entry[0]() is not instance:
+            return None
+        return entry[1]
+
+    def cache(self, instance):
+        """
+            Get the cache of an instance, creating it if needed
+        :param instance: Instance the method is called on
+        :return: CallCache for the instance, or None if it can't be weakly referenced
+        """
+        cache = self._get(instance)
+        if cache is not None:
+            return cache
+        key = id(instance)
+        try:
+            ref = weakref.ref(instance, functools.partial(_drop_instance, self._instances, key))
+        except TypeError:
+            return None
+        cache = CallCache(self.maxsize, self.ttl)
+        self._instances[key] = (ref, cache)
+        return cache
+
+    def caches(self, instance=_Missing):
+        """
+            Get the caches results may be in
+        :param instance: Only get the caches for this instance, if given
+        :return: List of CallCaches
+        """
+        if not self.method:
+            return [self.shared]
+        if instance is _Missing:
+            return [self.shared] + [x[1] for x in list(self._instances.values())]
+        cache = self._get(instance)
+        return [self.shared] if cache is None else [self.shared, cache]
+
+    def info(self):
+        """
+            Get statistics summed over all caches in this group
+        :return: CacheInfo of hits, misses, maxsize and current size
+        """
+        caches = self.caches()
+        return CacheInfo(
+            sum(x.hits for x in caches), sum(x.misses for x in caches), self.maxsize, sum(len(x) for x in caches)
+        )
+
+    def clear(self):
+        """
+            Remove all cached results in this group, and reset the statistics
+        """
+        for cache in self.caches():
+            cache.clear()
+            cache.hits = cache.misses = 0
+
+
+def _retrieve(task):
+    """
+        Mark a task's exception as retrieved, for single-flight tasks whose callers were all cancelled
+    :param task: Finished task
+    """
+    if not task.cancelled():
+        task.exception()
+
+
+async def _fill(cache, key, coro, version):
+    """
+        Await the underlying call for a cache miss, and store its result unless the cache was invalidated meanwhile.
+        Exceptions aren't stored, so the next call tries again
+    :param cache: CallCache the result belongs in
+    :param key: Key from _make_key
+    :param coro: Coroutine of the underlying call
+    :param version: Version of the cache when the call started
+    :return: Result of the call
     """
-    set_vals = []
+    try:
+        out = await coro
+    finally:
+        if cache.flights.get(key) is asyncio.current_task():
+            del cache.flights[key]
+    if cache.version == version:
+        cache.put(key, out)
+    return out
 
-    for index, value in enumerate(args):
-        set_vals.append(_make_unique(index, value))
-    for key, value in kwargs.items():
-        set_vals.append(_make_unique(key, value))
 
-    return frozenset(set_vals)
+async def _single_flight(cache, key, call):
+    """
+        Get the result for a cache miss, joining the call already in flight for the same key if there is one, so
+        concurrent callers share one underlying await. Cancelling one caller doesn't cancel the shared call
+    :param cache: CallCache the result belongs in
+    :param key: Key from _make_key
+    :param call: Callable returning the coroutine to await if nothing is in flight
+    :return: Result of the call
+    """
+    loop = asyncio.get_running_loop()
+    task = cache.flights.get(key)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(_fill(cache, key, call(), cache.version))
+        task.add_done_callback(_retrieve)
+        cache.flights[key] = task
+    return await asyncio.shield(task)
 
 
 @decorator
-def invalidating_cache(*, method=False):
+def invalidating_cache(*, method=False, maxsize=None, ttl=None):
     """
         Mark a function as using an 'invalidating cache', a cache that remains the same till invalidated
-        by a different function call
-    :param method: Whether this is a method, if so 'self' param will be ignored
+        by a different function call. The wrapper gets cache_info and cache_clear, like functools.lru_cache.
+        Coroutine functions cache their awaited result, and concurrent calls with the same arguments share one await
+    :param method: Whether this is a method. If so, each instance gets its own cache and 'self' isn't part of the key
+    :param maxsize: Maximum number of results to keep per cache, least recently used are evicted first. None for no
+                    limit, 0 to only coalesce concurrent calls of a coroutine function
+    :param ttl: Seconds a result stays valid, or None to keep it until invalidated
     :return: Forwarded function wrapper
     """
 
     def predicate(func):
 
-        _caches[unwrap(func)] = {}
+        group = _caches[unwrap(func)] = CacheGroup(maxsize, ttl, method)
 
-        def check_cache(*args, **kwargs):
-            self = None
-            if method:
-                self, args = args[0], args[1:]
+        if inspect.iscoroutinefunction(func):
+            shared = group.shared
 
-            _key = _make_key(args, kwargs)
-            _cache = _caches[unwrap(func)]
-            if _key in _cache:
-                return _cache[_key]
+            async def check_cache(*args, **kwargs):
+                cache = shared
+                if method:
+                    cache = group.cache(args[0])
+                    if cache is None:
+                        cache = shared
+                        key = _make_key(args, kwargs)
+                    else:
+                        key = _make_key(args[1:], kwargs)
+                else:
+                    key = _make_key(args, kwargs)
+                out = cache.get(key)
+                if out is _Missing:
+                    out = await _single_flight(cache, key, lambda: func(*args, **kwargs))
+                return out
+        elif method:
+            def check_cache(self, *args, **kwargs):
+                cache = group.cache(self)
+                if cache is None:
+                    cache = group.shared
+                    key = _make_key((self,) + args, kwargs)
+                else:
+                    key = _make_key(args, kwargs)
+                out = cache.get(key)
+                if out is _Missing:
+                    out = func(self, *args, **kwargs)
+                    cache.put(key, out)
+                return out
+        else:
+            shared = group.shared
 
-            if method:
-                out = func(self, *args, **kwargs)
-            else:
-                out = func(*args, **kwargs)
-            _cache[_key] = out
-            return out
+            def check_cache(*args, **kwargs):
+                key = _make_key(args, kwargs)
+                out = shared.get(key)
+                if out is _Missing:
+                    out = func(*args, **kwargs)
+                    shared.put(key, out)
+                return out
 
         forward_func(check_cache, func)
+        check_cache.cache_info = group.info
+        check_cache.cache_clear = group.clear
         return check_cache
 
     return predicate
 
 
-def _check_cache(to_check, args, cache, generic):
+def _check_cache(to_check, args, cache, generic, offset=0):
     """
-        Check for items to remove in a cache
+        Find the entries of a cache to remove for an invalidating call, using the cache's argument indexes
     :param to_check: Args to check, ints or strings
     :param args: List or dict of args or kwargs
-    :param cache: Cache to check in
+    :param cache: CallCache to check in
     :param generic: Whether to check types instead of strict equality
-    :return: Set of cache objects to remove
+    :param offset: Number of leading positional arguments in the cached keys to skip, such as an instance
+    :return: Set of cache keys to remove
     """
     to_remove = set()
     for i in to_check:
-        if generic:
-            pair = (i, type(args[i]))
-        else:
-            pair = _make_unique(i, args[i])
-
         if isinstance(args, (list, tuple)) and i >= len(args):
-            break
+            continue
         elif isinstance(args, dict) and i not in args:
-            break
-
-        for j in cache:
-            if generic:
-                for k in j:
-                    if k[0] == pair[0] and k[1] == pair[1]:
-                        to_remove.add(j)
-            else:
-                if pair in j:
-                    to_remove.add(j)
-
+            continue
+        if generic:
+            value = type(args[i])
+        else:
+            value = _make_unique(i, args[i])[1]
+        to_remove |= cache.matching(i + offset if isinstance(i, int) else i, value, generic)
     return to_remove
 
 
@@ -231,7 +581,8 @@ def cache_invalidator(*, func=None, method=False, args=None, kwargs=None, generi
         Mark a function as invalidating the cache of associated function(s). Optionally
         can only invalidate part of the cache, based on args/kwargs positions
     :param func: Function / tuple of functions to invalidate. If missing, invalidates everything
-    :param method: Whether this function is a method. Only used if args/kwargs to key on are specified
+    :param method: Whether this function is a method. If so, only the calling instance's caches of cached methods
+                   are invalidated, and 'self' isn't compared against args
     :param args: Optional tuple of arguments that are compared, only invalidating cached calls
                  that use the same args in the same position as the tuple
     :param kwargs: Optional tuple of argument names that are compared, only invalidating cached calls
@@ -258,7 +609,7 @@ def cache_invalidator(*, func=None, method=False, args=None, kwargs=None, generi
         if isinstance(kwargs, (list, tuple, set)):
             kwargs = set(kwargs)
         elif isinstance(kwargs, str):
-            kwargs = {args}
+            kwargs = {kwargs}
         else:
             raise TypeError("Kwargs must be list of string argnames, or single string argname")
 
@@ -267,31 +618,29 @@ def cache_invalidator(*, func=None, method=False, args=None, kwargs=None, generi
         def invalidate_cache(*_args, **_kwargs):
 
             if func is None:
-                search = _caches.keys()
+                search = list(_caches.values())
             else:
-                search = func
-
-            for item in search:
-                item = unwrap(item)
-                if args is None and kwargs is None:
-                    _caches[item].clear()
-                else:
-                    self = None
-                    if method:
-                        self, _args = _args[0], _args[1:]
+                search = [_caches[unwrap(x)] for x in func]
 
+            self = _Missing
+            check_args = _args
+            if method:
+                self, check_args = _args[0], _args[1:]
+
+            for group in search:
+                for cache in group.caches(self):
+                    if args is None and kwargs is None:
+                        cache.invalidate()
+                        continue
+                    offset = 1 if group.method and cache is group.shared else 0
                     to_remove = set()
                     if args is not None:
-                        to_remove |= _check_cache(args, _args, _caches[item], generic)
+                        to_remove |= _check_cache(args, check_args, cache, generic, offset)
                     if kwargs is not None:
-                        to_remove |= _check_cache(kwargs, _kwargs, _caches[item], generic)
-                    for i in to_remove:
-                        del _caches[item][i]
-
-                    if method:
-                        _args = (self,) + _args
+                        to_remove |= _check_cache(kwargs, _kwargs, cache, generic, offset)
+                    cache.invalidate(to_remove)
 
-            _func(*_args, **_kwargs)
+            return _func(*_args, **_kwargs)
 
         forward_func(invalidate_cache, _func)
         return invalidate_cache
@@ -0,0 +1,398 @@
+
+import functools
+import re
+
+from spidertools.common import element as el
+
+
+_token = re.compile(r"""
+    \s*(?P<comb>[>+~,])\s*
+  | (?P<space>\s+)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w:-]+)\s*(?:
+        (?P<op>[~|^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<uq>[\w-]+))\s*(?P<flag>[iI])?\s*
+    )?\]
+  | :(?P<pseudo>[\w-]+)(?:\(\s*(?P<arg>[^)]*?)\s*\))?
+  | (?P<tag>\*|[\w-]+)
+""", re.VERBOSE)
+
+_nth = re.compile(r"(?P<a>[+-]?\d*)n(?:\s*(?P<sign>[+-])\s*(?P<b>\d+))?|(?P<only>[+-]?\d+)")
+
+
+class SelectorError(ValueError):
+    """
+        Raised when a CSS selector can't be parsed
+    """
+
+
+def _attr_value(element, name):
+    """
+        Get an attribute as a string for matching. Valueless attributes are empty, repeated ones use the first value
+    :param element: Element to check
+    :param name: Attribute name
+    :return: Attribute value, or None if missing
+    """
+    attrs = element._attrs
+    if name not in attrs:
+        return None
+    value = attrs[name]
+    if isinstance(value, list):
+        value = value[0]
+    return "" if value is None else value
+
+
+def _classes(element):
+    """
+        Get the classes of an element, tolerating repeated or valueless class attributes
+    :param element: Element to check
+    :return: List of class names
+    """
+    value = element._attrs.get("class")
+    if isinstance(value, str):
+        return value.split()
+    return []
+
+
+def _position(element, last=False):
+    """
+        Get the position of an element among its parent's child elements, ignoring content
+    :param element: Element to locate
+    :param last: Whether to count from the last child instead of the first
+    :return: 1-based position
+    """
+    parent = element.parent
+    if parent is None:
+        return 1
+    siblings = parent.child_nodes
+    pos = parent._pos_map[element]
+    if last:
+        others = siblings[pos + 1:]
+    else:
+        others = siblings[:pos]
+    return 1 + sum(1 for x in others if isinstance(x, el.Element))
+
+
+def _previous(element):
+    """
+        Iterate over the element siblings before an element, nearest first
+    :param element: Element to start at
+    :return: Iterator of Elements
+    """
+    parent = element.parent
+    if parent is None:
+        return
+    siblings = parent.child_nodes
+    for i in range(parent._pos_map[element] - 1, -1, -1):
+        if isinstance(siblings[i], el.Element):
+            yield siblings[i]
+
+
+def _parse_nth(arg):
+    """
+        Parse the argument of an nth pseudo-class
+    :param arg: an+b expression, odd or even
+    :return: Tuple of (a, b)
+    """
+    arg = arg.replace(" ", "").lower()
+    if arg == "odd":
+        return 2, 1
+    if arg == "even":
+        return 2, 0
+    match = _nth.fullmatch(arg)
+    if match is None:
+        raise SelectorError(f"Invalid nth expression {arg!r}")
+    if match["only"] is not None:
+        return 0, int(match["only"])
+    a = match["a"]
+    a = -1 if a == "-" else 1 if a in ("", "+") else int(a)
+    b = int(match["b"] or 0)
+    if match["sign"] == "-":
+        b = -b
+    return a, b
+
+
+def _nth_test(a, b, last):
+    """
+        Build a test for whether an element's position is a*n + b for some n >= 0
+    :param a: Step
+    :param b: Offset
+    :param last: Whether positions count from the last child
+    :return: Test function
+    """
+    def test(element):
+        pos = _position(element, last)
+        if a == 0:
+            return pos == b
+        return (pos - b) % a == 0 and (pos - b) // a >= 0
+    return test
+
+
+def _attr_test(name, op, value, ignore_case):
+    """
+        Build a test for an attribute selector
+    :param name: Attribute name
+    :param op: Comparison operator, or None for presence
+    :param value: Value to compare with
+    :param ignore_case: Whether to compare case-insensitively
+    :return: Test function
+    """
+    if op is None:
+        return lambda element: name in element._attrs
+    if ignore_case:
+        value = value.lower()
+    if op == "=":
+        check = value.__eq__
+    elif op == "~=":
+        check = lambda x: value in x.split()
+    elif op == "|=":
+        check = lambda x: x == value or x.startswith(value + "-")
+    elif op == "^=":
+        check = lambda x: bool(value) and x.startswith(value)
+    elif op == "$=":
+        check = lambda x: bool(value) and x.endswith(value)
+    else:
+        check = lambda x: bool(value) and value in x
+
+    def test(element):
+        found = _attr_value(element, name)
+        if found is None:
+            return False
+        return check(found.lower() if ignore_case else found)
+    return test
+
+
+_pseudos = {
+    "first-child": lambda element: _position(element) == 1,
+    "last-child": lambda element: _position(element, True) == 1,
+    "only-child": lambda element: _position(element) == 1 and _position(element, True) == 1,
+}
+
+
+class Compound:
+    """
+        A compound selector, such as div#main.post[data-id]:first-child, compiled into a single test. The type, ids
+        and classes are kept so callers can look candidates up in a DocumentIndex
+    """
+
+    __slots__ = ("tag", "ids", "classes", "tests", "positional")
+
+    def __init__(self):
+        """
+            Initialize an empty compound selector, matching any element
+        """
+        self.tag = None
+        self.ids = []
+        self.classes = []
+        self.tests = []
+        self.positional = False
+
+    def __bool__(self):
+        """
+            Whether anything was added to this compound
+        :return: Whether it's non-empty
+        """
+        return self.tag is not None or bool(self.ids or self.classes or self.tests)
+
+    def __call__(self, element):
+        """
+            Check whether an element matches this compound
+        :param element: Element to check
+        :return: Whether it matches
+        """
+        if self.tag is not None and self.tag != "*" and element.tag != self.tag:
+            return False
+        if self.ids and any(_attr_value(element, "id") != x for x in self.ids):
+            return False
+        if self.classes:
+            classes = _classes(element)
+            if any(x not in classes for x in self.classes):
+                return False
+        for test in self.tests:
+            if not test(element):
+                return False
+        return True
+
+
+class Selector:
+    """
+        A compiled CSS selector list. Each complex selector is stored right to left, as (compound, combinator) steps
+        where the combinator links to the next step, and matching works outward from the candidate element
+    """
+
+    __slots__ = ("text", "groups")
+
+    def __init__(self, text, groups):
+        """
+            Initialize a Selector. Use compile_selector rather than calling this directly
+        :param text: Source of the selector
+        :param groups: List of step lists, one per comma-separated selector
+        """
+        self.text = text
+        self.groups = groups
+
+    def __repr__(self):
+        """
+            Get the selector as it would be written in code
+        :return: repr of Selector
+        """
+        return f"Selector({self.text!r})"
+
+    @staticmethod
+    def _match(element, steps, i):
+        """
+            Check whether an element matches the steps of a complex selector from a given step on
+        :param element: Element to check
+        :param steps: Steps of the complex selector
+        :param i: Index of the step the element must match
+        :return: Whether it matches
+        """
+        compound, combinator = steps[i]
+        if not compound(element):
+            return False
+        if combinator is None:
+            return True
+        i += 1
+        if combinator == ">":
+            parent = element.parent
+            return isinstance(parent, el.Element) and Selector._match(parent, steps, i)
+        if combinator == " ":
+            node = element.parent
+            while isinstance(node, el.Element):
+                if Selector._match(node, steps, i):
+                    return True
+                node = node.parent
+            return False
+        if combinator == "+":
+            sibling = next(_previous(element), None)
+            return sibling is not None and Selector._match(sibling, steps, i)
+        return any(Selector._match(x, steps, i) for x in _previous(element))
+
+    def matches(self, element):
+        """
+            Check whether an element matches this selector
+        :param element: Element to check
+        :return: Whether any of the selector list matches
+        """
+        return isinstance(element, el.Element) and any(self._match(element, x, 0) for x in self.groups)
+
+    def positional(self):
+        """
+            Check whether this selector depends on an element's siblings, through sibling combinators or position
+            pseudo-classes, rather than only on the element and its ancestors
+        :return: Whether sibling information is needed
+        """
+        return any(
+            compound.positional or combinator in ("+", "~") for steps in self.groups for compound, combinator in steps
+        )
+
+    def candidates(self, index):
+        """
+            Get a superset of the matches from a DocumentIndex, using the id, class or type of the rightmost compound
+        :param index: DocumentIndex of the tree being searched
+        :return: List of Elements in document order, or None if the index can't narrow the search
+        """
+        if len(self.groups) != 1:
+            return None
+        compound = self.groups[0][0][0]
+        if compound.ids:
+            return index.get("id", compound.ids[0])
+        if compound.classes:
+            return index.get("class", compound.classes[0])
+        if compound.tag is not None and compound.tag != "*":
+            return index.get("tag", compound.tag)
+        return None
+
+    def iter(self, root, inclusive=False):
+        """
+            Iterate over the matching elements under a root, in a single pass in document order
+        :param root: Node to search under
+        :param inclusive: Whether the root itself may match
+        :return: Iterator of matching Elements
+        """
+        walk = el._walk(root)
+        if not inclusive:
+            next(walk, None)
+        for element in walk:
+            if any(self._match(element, x, 0) for x in self.groups):
+                yield element
+
+
+def _parse(text):
+    """
+        Parse a selector list into step lists
+    :param text: Selector source
+    :return: List of step lists, right to left
+    """
+    groups = []
+    compounds = []
+    compound = Compound()
+    pos = 0
+    source = text.strip()
+    if not source:
+        raise SelectorError("Empty selector")
+
+    def finish(combinator):
+        if not compound:
+            raise SelectorError(f"Selector {text!r} has a combinator without a selector at position {pos}")
+        compounds.append((compound, combinator))
+
+    while pos < len(source):
+        match = _token.match(source, pos)
+        if match is None:
+            raise SelectorError(f"Unexpected character in selector {text!r} at position {pos}")
+        kind = match.lastgroup
+        if kind in ("comb", "space"):
+            combinator = match["comb"] or " "
+            finish(combinator)
+            compound = Compound()
+            if combinator == ",":
+                groups.append(compounds)
+                compounds = []
+        elif kind == "tag":
+            if compound:
+                raise SelectorError(f"Type selector must come first in {text!r} at position {pos}")
+            compound.tag = match["tag"].lower()
+        elif match["id"] is not None:
+            compound.ids.append(match["id"])
+        elif match["cls"] is not None:
+            compound.classes.append(match["cls"])
+        elif match["attr"] is not None:
+            value = match["dq"] if match["dq"] is not None else match["sq"] if match["sq"] is not None else match["uq"]
+            compound.tests.append(
+                _attr_test(match["attr"].lower(), match["op"], value, match["flag"] is not None)
+            )
+        else:
+            name = match["pseudo"].lower()
+            if name in ("nth-child", "nth-last-child"):
+                if match["arg"] is None:
+                    raise SelectorError(f":{name} needs an argument in {text!r}")
+                compound.tests.append(_nth_test(*_parse_nth(match["arg"]), name == "nth-last-child"))
+                compound.positional = True
+            elif name in _pseudos and match["arg"] is None:
+                compound.tests.append(_pseudos[name])
+                compound.positional = True
+            else:
+                raise SelectorError(f"Unsupported pseudo-class :{name} in {text!r}")
+        pos = match.end()
+
+    finish(None)
+    groups.append(compounds)
+
+    # Compounds hold the combinator to their right, steps the combinator to their left
+    return [
+        [(compounds[i][0], compounds[i - 1][1] if i else None) for i in range(len(compounds) - 1, -1, -1)]
+        for compounds in groups
+    ]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_selector(text):
+    """
+        Compile a CSS selector list into a Selector. Supports type, universal, #id, .class and attribute selectors,
+        the descendant, child, adjacent and general sibling combinators, and the :nth-child, :nth-last-child,
+        :first-child, :last-child and :only-child pseudo-classes. Compiled selectors are cached by source
+    :param text: Selector source
+    :return: Compiled Selector
+    """
+    return Selector(text, _parse(text))
@@ -1,6 +1,7 @@
 
 import abc
 import datetime as dt
+import keyword
 
 
 class _EmptyVal:
@@ -20,6 +21,74 @@ class _EmptyVal:
 _Empty = _EmptyVal()
 
 
+def _compile_row(cls):
+    """
+        Generate the fill, bulk construct, and to_row functions for a Row subclass from its __slots__, so loading
+        rows is straight-line attribute stores instead of a loop of setattr calls
+    :param cls: Row subclass to generate functions for
+    :return: Dict of generated functions by name
+    """
+    slots = cls.__slots__
+    if isinstance(slots, str):
+        slots = (slots,)
+
+    namespace = {"_new": object.__new__, "_safe": _sql_safe}
+    stores = []
+    loads = []
+    for index, slot in enumerate(slots):
+        if slot.isidentifier() and not keyword.iskeyword(slot) and not slot.startswith("__"):
+            stores.append(f"self.{slot} = {{}}")
+            loads.append(f"self.{slot}")
+        else:
+            # Keywords and private names can't be written as attributes, go through the slot descriptor instead
+            name = f"_{cls.__name__.lstrip('_')}{slot}" if slot.startswith("__") and not slot.endswith("__") else slot
+            descriptor = cls.__dict__[name]
+            namespace[f"_set{index}"] = descriptor.__set__
+            namespace[f"_get{index}"] = descriptor.__get__
+            stores.append(f"_set{index}(self, {{}})")
+            loads.append(f"_get{index}(self)")
+
+    fill = [f"    {store.format(f'row[{index}]')}" for index, store in enumerate(stores)]
+    fill_bool = []
+    for index, store in enumerate(stores):
+        fill_bool.append(f"    value = row[{index}]")
+        fill_bool.append(f"    {store.format('bool(value) if value == 0 or value == 1 else value')}")
+    bulk = [f"        {store.format(f'row[{index}]')}" for index, store in enumerate(stores)]
+    to_row = [f"        _safe({load})," for load in loads]
+
+    source = "\n".join([
+        "def _fill(self, row):",
+        *(fill or ["    pass"]),
+        "def _fill_bool(self, row):",
+        *(fill_bool or ["    pass"]),
+        "def _from_rows(cls, rows):",
+        "    out = []",
+        "    append = out.append",
+        "    for row in rows:",
+        "        self = _new(cls)",
+        *bulk,
+        "        append(self)",
+        "    return out",
+        "def to_row(self):",
+        "    return [",
+        *to_row,
+        "    ]",
+    ])
+    exec(compile(source, f"<{cls.__qualname__} row functions>", "exec"), namespace)
+    return namespace
+
+
+def _sql_safe(value):
+    """
+        Convert a value to a SQL storable form, if it is a SqlConvertable
+    :param value: Value to convert
+    :return: SQL storable value
+    """
+    if isinstance(value, SqlConvertable):
+        return value.sql_safe()
+    return value
+
+
 class Row(metaclass=abc.ABCMeta):
     """
         Conceptually, a Row in a SQL database. Subclass to define a table, __slots__ is used to define
@@ -28,6 +97,26 @@ class Row(metaclass=abc.ABCMeta):
 
     __slots__ = ()
 
+    def __init_subclass__(cls, **kwargs):
+        """
+            Generate the constructor and to_row functions for a new subclass, based on its __slots__
+        :param kwargs: Passed on to super
+        """
+        super().__init_subclass__(**kwargs)
+        generated = _compile_row(cls)
+        cls._fill = generated["_fill"]
+        cls._fill_bool = generated["_fill_bool"]
+        # Bulk construction skips __init__, so only use it if this class doesn't have its own
+        if cls.__init__ is Row.__init__:
+            cls._from_rows = generated["_from_rows"]
+        else:
+            cls._from_rows = None
+        if getattr(cls.to_row, "_generated", False) or cls.to_row is Row.to_row:
+            to_row = generated["to_row"]
+            to_row.__doc__ = Row.to_row.__doc__
+            to_row._generated = True
+            cls.to_row = to_row
+
     def __init__(self, row, conv_bool=False):
         """
             Initializer for a row. Handles magical __slots__ initialization
@@ -37,12 +126,26 @@ class Row(metaclass=abc.ABCMeta):
         if self.__class__ == Row:
             raise TypeError("Can't instantiate a non-subclassed row")
 
-        for index in range(len(self.__slots__)):
-            slot = self.__slots__[index]
-            value = row[index]
-            if conv_bool and (value == 0 or value == 1):
-                value = bool(value)
-            setattr(self, slot, value)
+        if conv_bool:
+            self._fill_bool(row)
+        else:
+            self._fill(row)
+
+    @classmethod
+    def from_rows(cls, rows, conv_bool=False):
+        """
+            Construct many instances of this Row at once, from a sequence of items pulled from a table
+        :param rows: Iterable of sequences of row data
+        :param conv_bool: Whether to convert 0's and 1's to boolean values or not
+        :return: List of new instances
+        """
+        if cls is Row:
+            raise TypeError("Can't instantiate a non-subclassed row")
+        if conv_bool:
+            return [cls(x, conv_bool) for x in rows]
+        if cls._from_rows is None:
+            return [cls(x) for x in rows]
+        return cls._from_rows(cls, rows)
 
     def __str__(self):
         """
@@ -226,3 +329,11 @@ class Trigger(Row):
                  "action_timing", "action_reference_old_table", "action_reference_new_table",
                  "action_reference_old_row", "action_reference_new_row", "created", "sql_mode", "definer",
                  "character_set_client", "collation_connection", "database_collation")
+
+
+class Index(Row):
+    """
+        A secondary index, as listed by DatabaseAccessor.get_indexes
+    """
+
+    __slots__ = ("table_name", "name", "columns", "unique")
@@ -1,8 +1,107 @@
 
 import abc
+import functools
 
-from functools import lru_cache
-from spidertools.common import utils
+from spidertools.common import css, utils
+
+
+def _cached(func):
+    """
+        Cache the result of a Node property on the node itself, till the node or one of its descendants changes
+    :param func: Property getter to cache
+    :return: Caching getter
+    """
+    key = func.__name__
+
+    @functools.wraps(func)
+    def getter(self):
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = {}
+        elif key in cache:
+            return cache[key]
+        out = cache[key] = func(self)
+        return out
+
+    return getter
+
+
+def _walk(node):
+    """
+        Iterate over the elements of a subtree in document order, without recursion
+    :param node: Head of the subtree
+    :return: Iterator of Elements
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Element):
+            yield node
+            stack.extend(reversed(node.child_nodes))
+
+
+def _path(node):
+    """
+        Get the position of a node in its tree, as the child index at each level from the head down. Paths sort in
+        document order
+    :param node: Node to locate
+    :return: List of child indexes
+    """
+    path = []
+    while node.parent is not None:
+        path.append(node.parent._pos_map[node])
+        node = node.parent
+    path.reverse()
+    return path
+
+
+def flatten(node):
+    """
+        Serialize a subtree into a flat list, compact to pickle and rebuilt without recursion. Elements become
+        (tag, attrs, child count) tuples and content becomes its string, in document order
+    :param node: Head of the subtree
+    :return: List of tuples and strings
+    """
+    out = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Element):
+            out.append((node.tag, node._attrs, len(node.child_nodes)))
+            stack.extend(reversed(node.child_nodes))
+        else:
+            out.append(node.value)
+    return out
+
+
+def unflatten(data):
+    """
+        Rebuild a subtree from the output of flatten
+    :param data: List from flatten
+    :return: Head node of the new subtree
+    """
+    head = None
+    # Elements still waiting for children, with how many are left
+    stack = []
+    for item in data:
+        if isinstance(item, str):
+            node, count = Content(item), 0
+        else:
+            node, count = Element(item[0], item[1]), item[2]
+        if stack:
+            # New nodes have no caches or index to update, so skip add_child
+            parent = stack[-1][0]
+            parent._pos_map[node] = len(parent.child_nodes)
+            parent.child_nodes.append(node)
+            node.parent = parent
+            stack[-1][1] -= 1
+            while stack and not stack[-1][1]:
+                stack.pop()
+        else:
+            head = node
+        if count:
+            stack.append([node, count])
+    return head
 
 
 class Document:
@@ -61,6 +160,22 @@ class Document:
                         cur = parent
             cur = next_node
 
+    def _indexed(self, start=None):
+        """
+            Get the index of this document's tree, building it on first use. Documents over a subtree of another
+            tree, or searches from below the head, aren't served from the index
+        :param start: Element a search starts at, or None for the head
+        :return: DocumentIndex or None
+        """
+        head = self._head
+        if start is not None and start is not head:
+            return None
+        if head.parent is not None or not isinstance(head, Element):
+            return None
+        if head._index is None:
+            DocumentIndex(head)
+        return head._index
+
     def get_by_tag(self, tag, start=None):
         """
             Get all the elements in this document with a given tag
@@ -68,6 +183,9 @@ class Document:
         :param start: Element to start iteration at, defaults to head
         :return: list of elements with given tag
         """
+        index = self._indexed(start)
+        if index is not None:
+            return index.get("tag", tag)
         out = []
         for node in self._depth_iterator(start):
             if isinstance(node, Element) and node.tag == tag:
@@ -80,6 +198,9 @@ class Document:
         :param nid: ID to get
         :return: Element with ID or None
         """
+        index = self._indexed()
+        if index is not None:
+            return index.first("id", nid)
         for node in self._depth_iterator():
             if isinstance(node, Element) and node.id == nid:
                 return node
@@ -91,6 +212,9 @@ class Document:
         :param name: Name to get
         :return: Element with name or None
         """
+        index = self._indexed()
+        if index is not None:
+            return index.first("name", name)
         for node in self._depth_iterator():
             if isinstance(node, Element) and node.name == name:
                 return node
@@ -103,6 +227,9 @@ class Document:
         :param start: Element to start iteration at, defaults to head
         :return: All elements with the given class
         """
+        index = self._indexed(start)
+        if index is not None:
+            return index.get("class", classname)
         out = []
         for node in self._depth_iterator(start):
             if isinstance(node, Element) and node.has_class(classname):
@@ -116,11 +243,43 @@ class Document:
         :param start: Element to start iteration at, defaults to head
         :return: First element with the given class or None
         """
+        index = self._indexed(start)
+        if index is not None:
+            return index.first("class", classname)
         for node in self._depth_iterator(start):
             if isinstance(node, Element) and node.has_class(classname):
                 return node
         return None
 
+    def select(self, selector):
+        """
+            Get all the elements in this document matching a CSS selector. The selector is compiled once and cached,
+            and candidates come from the document's index when the selector allows it
+        :param selector: CSS selector, see css.compile_selector for what's supported
+        :return: List of matching elements in document order
+        """
+        compiled = css.compile_selector(selector)
+        index = self._indexed()
+        if index is not None:
+            candidates = compiled.candidates(index)
+            if candidates is not None:
+                return [x for x in candidates if compiled.matches(x)]
+        return list(compiled.iter(self._head, inclusive=True))
+
+    def select_one(self, selector):
+        """
+            Get the first element in this document matching a CSS selector
+        :param selector: CSS selector, see css.compile_selector for what's supported
+        :return: First matching element or None
+        """
+        compiled = css.compile_selector(selector)
+        index = self._indexed()
+        if index is not None:
+            candidates = compiled.candidates(index)
+            if candidates is not None:
+                return next((x for x in candidates if compiled.matches(x)), None)
+        return next(compiled.iter(self._head, inclusive=True), None)
+
     def compare_ignoring(self, doc, *, tags=None, attrs=None, content=False):
         """
             Compare this Document with another one, ignoring specified factors
@@ -208,13 +367,123 @@ class Document:
         return True
 
 
+class DocumentIndex:
+    """
+        Lookup tables from id, name, tag and class to the elements under a head node. Built on the first indexed
+        query of a Document, then kept up to date as nodes are added and removed. Changing an element's tag or
+        attributes in place isn't tracked, replacing its outerhtml is
+    """
+
+    __slots__ = ("head", "maps", "_unordered")
+
+    KINDS = ("id", "name", "tag", "class")
+
+    def __init__(self, head):
+        """
+            Index every element under a head node
+        :param head: Head of the tree to index
+        """
+        self.head = head
+        self.maps = {x: {} for x in self.KINDS}
+        self._unordered = set()
+        self.add(head, ordered=True)
+
+    @staticmethod
+    def _entries(element):
+        """
+            Get the index entries of an element. Attributes that were repeated or have no value aren't indexed
+        :param element: Element to index
+        :return: List of (kind, key) pairs
+        """
+        attrs = element._attrs
+        out = [("tag", element.tag)]
+        for kind in ("id", "name"):
+            value = attrs.get(kind)
+            if isinstance(value, str):
+                out.append((kind, value))
+        classes = attrs.get("class")
+        if isinstance(classes, str):
+            out.extend(("class", x) for x in dict.fromkeys(classes.split()))
+        return out
+
+    def add(self, node, ordered=False):
+        """
+            Index a subtree that was added to the tree
+        :param node: Head of the added subtree
+        :param ordered: Whether the subtree comes after everything already indexed, so lists stay in document order
+        """
+        maps = self.maps
+        for element in _walk(node):
+            element._index = self
+            for kind, key in self._entries(element):
+                items = maps[kind].get(key)
+                if items is None:
+                    maps[kind][key] = [element]
+                else:
+                    items.append(element)
+                    if not ordered:
+                        self._unordered.add((kind, key))
+
+    def remove(self, node):
+        """
+            Remove a subtree that was removed from the tree from the index
+        :param node: Head of the removed subtree
+        """
+        maps = self.maps
+        for element in _walk(node):
+            element._index = None
+            for kind, key in self._entries(element):
+                items = maps[kind].get(key)
+                if items is None or element not in items:
+                    # Tag or attributes were changed in place since the element was indexed
+                    continue
+                items.remove(element)
+                if not items:
+                    del maps[kind][key]
+                    self._unordered.discard((kind, key))
+
+    def _items(self, kind, key):
+        """
+            Get the indexed list for a key, sorting it back into document order if additions disordered it
+        :param kind: One of KINDS
+        :param key: Value to look up
+        :return: List of Elements, not to be modified
+        """
+        items = self.maps[kind].get(key)
+        if items is None:
+            return ()
+        if (kind, key) in self._unordered:
+            items.sort(key=_path)
+            self._unordered.discard((kind, key))
+        return items
+
+    def get(self, kind, key):
+        """
+            Get all elements with a given key
+        :param kind: One of KINDS
+        :param key: Value to look up
+        :return: List of Elements in document order
+        """
+        return list(self._items(kind, key))
+
+    def first(self, kind, key):
+        """
+            Get the first element with a given key
+        :param kind: One of KINDS
+        :param key: Value to look up
+        :return: First Element in document order, or None
+        """
+        items = self._items(kind, key)
+        return items[0] if items else None
+
+
 class Node(abc.ABC):
     """
         Node in the DOM tree. Could be an element, content, or some other HTML construct.
         Handles all the stuff most nodes could be expected to handle, and defines the interface that they follow
     """
 
-    __slots__ = ("parent", "child_nodes", "_pos_map")
+    __slots__ = ("parent", "child_nodes", "_pos_map", "_depth", "_cache", "_index")
 
     def __init__(self):
         """
@@ -223,20 +492,44 @@ class Node(abc.ABC):
         self.parent = None
         self.child_nodes = []
         self._pos_map = {}
+        self._depth = None
+        self._cache = None
+        self._index = None
 
     @property
-    @lru_cache()
     def depth(self):
         """
-            Check the depth of the current node recursively
+            Check the depth of the current node recursively. Cached till the node is moved
         :return: Depth from the head of the tree
         """
-        if self.parent is None:
-            return 0
-        return self.parent.depth + 1
+        if self._depth is None:
+            self._depth = 0 if self.parent is None else self.parent.depth + 1
+        return self._depth
+
+    def _changed(self):
+        """
+            Mark this node as changed, dropping the cached properties of it and its ancestors. A node with nothing
+            cached can't have ancestors with cached HTML or text, as computing those caches it, so the walk stops there
+        """
+        self._cache = None
+        node = self.parent
+        while node is not None and node._cache is not None:
+            node._cache = None
+            node = node.parent
+
+    def _moved(self):
+        """
+            Mark this node as having a new parent, dropping the cached depth of it and its descendants. A node without
+            a cached depth can't have descendants with one, so those subtrees are skipped
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._depth is not None:
+                node._depth = None
+                stack.extend(node.child_nodes)
 
     @property
-    @lru_cache()
     def first_child(self):
         """
             Get the first child of this Node, or None
@@ -254,10 +547,18 @@ class Node(abc.ABC):
         """
         old = self.child_nodes[0]
         old.parent = None
+        old._moved()
         del self._pos_map[old]
+        if self._index is not None:
+            self._index.remove(old)
 
         self.child_nodes[0] = value
         self._pos_map[value] = 0
+        value.parent = self
+        value._moved()
+        self._changed()
+        if self._index is not None:
+            self._index.add(value)
 
     @property
     def last_child(self):
@@ -279,10 +580,18 @@ class Node(abc.ABC):
 
         old = self.child_nodes[pos]
         old.parent = None
+        old._moved()
         del self._pos_map[old]
+        if self._index is not None:
+            self._index.remove(old)
 
         self.child_nodes[pos] = value
         self._pos_map[value] = pos
+        value.parent = self
+        value._moved()
+        self._changed()
+        if self._index is not None:
+            self._index.add(value)
 
     @property
     @abc.abstractmethod
@@ -323,11 +632,13 @@ class Node(abc.ABC):
         else:
             self.child_nodes.insert(pos, el)
             for i in range(pos, len(self.child_nodes)):
-                el = self.child_nodes[i]
-                self._pos_map[el] = i
+                self._pos_map[self.child_nodes[i]] = i
         el.parent = self
+        el._moved()
+        self._changed()
+        if self._index is not None:
+            self._index.add(el)
 
-    @lru_cache()
     def next_child(self, el):
         """
             Get the child node immediately after the passed child node. Will raise a ValueError if el is not a child of
@@ -355,9 +666,12 @@ class Node(abc.ABC):
             i = self._pos_map.pop(el)
             del self.child_nodes[i]
             for i in range(i, len(self.child_nodes)):
-                el = self.child_nodes[i]
-                self._pos_map[el] = i
+                self._pos_map[self.child_nodes[i]] = i
             el.parent = None
+            el._moved()
+            self._changed()
+            if self._index is not None:
+                self._index.remove(el)
         else:
             raise ValueError("Passed element not a child of self")
 
@@ -385,7 +699,7 @@ class Content(Node):
         Content node, raw data inside of an element
     """
 
-    __slots__ = ("value",)
+    __slots__ = ("_value",)
 
     def __init__(self, data):
         """
@@ -393,7 +707,24 @@ class Content(Node):
         :param data: Raw node data
         """
         super().__init__()
-        self.value = data
+        self._value = data
+
+    @property
+    def value(self):
+        """
+            Get the raw data of this content
+        :return: Content value
+        """
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        """
+            Set the raw data of this content, marking its ancestors as changed
+        :param value: New content value
+        """
+        self._value = value
+        self._changed()
 
     def __str__(self):
         """
@@ -538,7 +869,7 @@ class Element(Node):
         return self._attrs.get("name", None)
 
     @property
-    @lru_cache()
+    @_cached
     def starttag(self):
         """
             Get the start tag of this Element. Tag and attributes, self closed if tag is self closing
@@ -550,7 +881,7 @@ class Element(Node):
         return f"<{self.tag}{attrs}>"
 
     @property
-    @lru_cache()
+    @_cached
     def endtag(self):
         """
             Get the end tag of this element. Empty string if tag is self closing
@@ -561,7 +892,7 @@ class Element(Node):
         return f"</{self.tag}>"
 
     @property
-    @lru_cache()
+    @_cached
     def innertext(self):
         """
             Get the Element innertext, combination of all child Content nodes
@@ -600,7 +931,7 @@ class Element(Node):
         self.add_child(Content(value))
 
     @property
-    @lru_cache()
+    @_cached
     def innerhtml(self):
         """
             Get the innerhtml of this Element, all the children's HTML
@@ -626,7 +957,7 @@ class Element(Node):
             self.add_child(el)
 
     @property
-    @lru_cache()
+    @_cached
     def outerhtml(self):
         """
             Get the outerhtml of this Element, this element as it would appear in an HTML document
@@ -655,10 +986,35 @@ class Element(Node):
         new_self = els[0]
         if not isinstance(new_self, Element):
             raise TypeError("Cannot replace outerhtml of element with non-element")
+        index = self._index
+        if index is not None:
+            index.remove(self)
         self.tag = new_self.tag
         self._attrs = new_self._attrs
         self.child_nodes = new_self.child_nodes
         self._pos_map = new_self._pos_map
+        for child in self.child_nodes:
+            child.parent = self
+            child._moved()
+        self._changed()
+        if index is not None:
+            index.add(self)
+
+    def select(self, selector):
+        """
+            Get all the descendants of this Element matching a CSS selector, in a single pass over the subtree
+        :param selector: CSS selector, see css.compile_selector for what's supported
+        :return: List of matching elements in document order
+        """
+        return list(css.compile_selector(selector).iter(self))
+
+    def select_one(self, selector):
+        """
+            Get the first descendant of this Element matching a CSS selector
+        :param selector: CSS selector, see css.compile_selector for what's supported
+        :return: First matching element or None
+        """
+        return next(css.compile_selector(selector).iter(self), None)
 
     def get_attribute(self, attr, default=None):
         """
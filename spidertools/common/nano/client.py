@@ -1,6 +1,7 @@
 import aiohttp
 import json
 from . import state, types, errors
+from .. import clstools
 
 
 class NanoClient:
@@ -115,6 +116,7 @@ class NanoClient:
         status, data = await self.make_request("/fundometer", "GET")
         return types.Funds(data)
 
+    @clstools.invalidating_cache(method=True, maxsize=0)
     async def get_user(self, username, include=()):
         """
             Get info about a user based on their username, optionally pre-loading various data about the user
@@ -1,8 +1,10 @@
 
+import contextlib
 import html.parser as parser
 import logging
+import threading
 
-from spidertools.common import element as el
+from spidertools.common import css, element as el
 
 
 log = logging.getLogger("spidertools.common.parsers")
@@ -27,16 +29,31 @@ def attrs_to_dict(attrs):
 
 class TreeGen(parser.HTMLParser):
     """
-        HTML Parser subclass to convert an HTML document into a DOM Tree of Nodes
+        HTML Parser subclass to convert an HTML document into a DOM Tree of Nodes. Can be limited to the subtrees
+        matching a selector, in which case everything else is tokenized and discarded without building nodes
     """
 
-    def __init__(self):
+    def __init__(self, keep=None, *, ancestors=False):
         """
             Initialize the TreeGen parser
+        :param keep: Optional CSS selector or predicate, to only build the subtrees whose root matches. A predicate
+                     gets each element before its children are parsed, linked to its open ancestors by parent only
+        :param ancestors: Whether kept subtrees are attached to their ancestor elements, built without any of their
+                          other children, instead of becoming separate heads
         """
+        if isinstance(keep, str):
+            selector = css.compile_selector(keep)
+            if selector.positional():
+                raise ValueError(f"Selector {keep!r} depends on siblings, which aren't built when filtering")
+            keep = selector.matches
+        self.keep = keep
+        self.ancestors = ancestors
         super().__init__()
         self.heads = []
         self.cur = None
+        self._text = []
+        self._open = []
+        self._inside = 0
 
     def reset(self):
         """
@@ -45,6 +62,9 @@ class TreeGen(parser.HTMLParser):
         super().reset()
         self.heads = []
         self.cur = None
+        self._text = []
+        self._open = []
+        self._inside = 0
 
     def close(self):
         """
@@ -52,8 +72,84 @@ class TreeGen(parser.HTMLParser):
         :return: Heads of the parsed input
         """
         super().close()
+        self._flush()
         return self.heads
 
+    def _flush(self):
+        """
+            Add the text collected since the last tag as a Content node. The HTML parser may split one run of text
+            across several handle_data calls, such as when it's fed in chunks
+        """
+        if not self._text:
+            return
+        data = "".join(self._text).strip()
+        self._text = []
+        if not data:
+            return
+
+        content = el.Content(data)
+        if self.cur is None:
+            self.heads.append(content)
+        else:
+            self.cur.add_child(content)
+
+    def is_open(self, node):
+        """
+            Check whether a node is still being parsed, so children may yet be added to it. Useful for deciding
+            whether a partial tree is complete enough
+        :param node: Node to check
+        :return: Whether the node is the current element or one of its ancestors
+        """
+        cur = self.cur
+        while cur is not None:
+            if cur is node:
+                return True
+            cur = cur.parent
+        return any(x[0] is node for x in self._open)
+
+    def _attach(self):
+        """
+            Attach the open elements outside kept subtrees to each other, so a kept subtree can be added below them
+        :return: Innermost open element
+        """
+        start = len(self._open)
+        while start > 0 and not self._open[start - 1][1]:
+            start -= 1
+        for i in range(start, len(self._open)):
+            entry = self._open[i]
+            if i == 0:
+                entry[0].parent = None
+                self.heads.append(entry[0])
+            else:
+                self._open[i - 1][0].add_child(entry[0])
+            entry[1] = True
+        return self._open[-1][0]
+
+    def _filtered_start(self, tag, attrs):
+        """
+            Handle a starttag outside any kept subtree. The element is only kept if it matches, otherwise it's just
+            remembered as an ancestor for later matches till its endtag
+        :param tag: Element tag
+        :param attrs: Element attributes
+        """
+        element = el.Element(tag, attrs_to_dict(attrs))
+        opened = tag not in el.Element.SELF_CLOSING
+        if self._open:
+            element.parent = self._open[-1][0]
+        if not self.keep(element):
+            if opened:
+                self._open.append([element, False])
+            return
+
+        if self.ancestors and self._open:
+            self._attach().add_child(element)
+        else:
+            element.parent = None
+            self.heads.append(element)
+        if opened:
+            self.cur = element
+            self._inside = 1
+
     def error(self, message):
         """
             Error handler for the HTML parser
@@ -67,6 +163,11 @@ class TreeGen(parser.HTMLParser):
         :param tag: Element tag
         :param attrs: Element attributes
         """
+        self._flush()
+        if self.keep is not None and not self._inside:
+            self._filtered_start(tag, attrs)
+            return
+
         element = el.Element(tag, attrs_to_dict(attrs))
         if self.cur is None:
             self.heads.append(element)
@@ -75,29 +176,112 @@ class TreeGen(parser.HTMLParser):
 
         if tag not in el.Element.SELF_CLOSING:
             self.cur = element
+            if self._inside:
+                self._inside += 1
 
     def handle_endtag(self, tag):
         """
             Handle an element endtag. Closes the current element if it's not self closing
         :param tag: Element tag
         """
-        if tag not in el.Element.SELF_CLOSING:
-            self.cur = self.cur.parent
+        self._flush()
+        if tag in el.Element.SELF_CLOSING:
+            return
+        if self._inside:
+            self._inside -= 1
+            if not self._inside:
+                self.cur = None
+                return
+        elif self.keep is not None:
+            if self._open:
+                self._open.pop()
+            return
+        self.cur = self.cur.parent
 
     def handle_data(self, data):
         """
-            Handle internal element data. Adds a new Content object to the current Element
+            Handle internal element data. Collects it for a new Content object in the current Element
         :param data: Element internal data
         """
-        data = data.strip()
-        if not data:
+        if self.keep is not None and not self._inside:
             return
+        self._text.append(data)
 
-        content = el.Content(data)
-        if self.cur is None:
-            self.heads.append(content)
-        else:
-            self.cur.add_child(content)
+    def handle_comment(self, data):
+        """
+            Handle a comment. Comments aren't kept, but still separate the text around them
+        :param data: Comment text
+        """
+        self._flush()
+
+
+class ParserPool:
+    """
+        A thread-safe pool of reusable TreeGen parsers. Each parse gets a parser of its own, so concurrent parses from
+        threads or interleaved coroutines can't corrupt each other's state. Never blocks, a new parser is made when
+        none are idle, and at most max_idle are kept for reuse
+    """
+
+    __slots__ = ("max_idle", "_idle", "_lock")
+
+    def __init__(self, max_idle=4):
+        """
+            Initialize a ParserPool
+        :param max_idle: Maximum number of parsers to keep for reuse
+        """
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @property
+    def idle(self):
+        """
+            Get the number of parsers waiting in the pool
+        :return: Number of idle parsers
+        """
+        return len(self._idle)
+
+    def acquire(self):
+        """
+            Check a parser out of the pool, making a new one if none are idle
+        :return: A reset TreeGen
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return TreeGen()
+
+    def release(self, gen):
+        """
+            Return a parser to the pool. It's reset, so the heads it returned stay with the caller
+        :param gen: TreeGen from acquire
+        """
+        gen.reset()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(gen)
+
+    @contextlib.contextmanager
+    def parser(self):
+        """
+            Check a parser out of the pool for the duration of a with block
+        :return: Context manager yielding a TreeGen
+        """
+        gen = self.acquire()
+        try:
+            yield gen
+        finally:
+            self.release(gen)
+
+    def parse(self, html):
+        """
+            Parse an HTML string with a pooled parser
+        :param html: HTML to parse
+        :return: List of head nodes
+        """
+        with self.parser() as gen:
+            gen.feed(html)
+            return gen.close()
 
 
 class _Sentinel:
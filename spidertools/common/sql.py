@@ -1,12 +1,44 @@
 
+import asyncio
+import atexit
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import decimal
+import functools
+import json
 import logging
+import threading
+import time
+import weakref
 
-from . import accessors, data, clstools
+from . import accessors, data
 
 
 log = logging.getLogger("spidertools.common.sql")
 
 _caches = {}
+_Missing = object()
+
+CacheInfo = collections.namedtuple("CacheInfo", ("hits", "misses", "evictions", "size", "maxsize"))
+Page = collections.namedtuple("Page", ("items", "cursor"))
+SchemaChange = collections.namedtuple("SchemaChange", ("action", "table", "name", "detail"))
+IndexAdvice = collections.namedtuple("IndexAdvice", ("table", "columns", "count"))
+BufferInfo = collections.namedtuple(
+    "BufferInfo", ("depth", "writes", "coalesced", "flushes", "rows_flushed", "last_flush", "max_flush", "total_flush")
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _and_from_shape(shape):
+    """
+        Generate a SQL And statement from the shape of a filter, so the text is only built once per shape
+    :param shape: Tuple of (name, is null) pairs
+    :return: String AND statement
+    """
+    return " AND ".join(f"{x} = %({x})s" if not is_null else f"{x} is %({x})s" for x, is_null in shape)
 
 
 def and_from_dict(kwargs):
@@ -15,7 +47,77 @@ def and_from_dict(kwargs):
     :param kwargs: Keyword arguments dict
     :return: String AND statement
     """
-    return " AND ".join(f"{x} = %({x})s" if kwargs[x] is not None else f"{x} is %({x})s" for x in kwargs)
+    return _and_from_shape(tuple((x, kwargs[x] is None) for x in kwargs))
+
+
+def _normalize_value(value):
+    """
+        Normalize a stored value for comparison, so bools and their 0 or 1 and integral Decimals and ints are equal,
+        the same way Row's conv_bool treats them
+    :param value: Value to normalize
+    :return: Comparable value
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _encode_cursor(values):
+    """
+        Encode the ordering key values of the last row of a page into an opaque continuation cursor
+    :param values: List of key values
+    :return: URL safe cursor string
+    """
+    text = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor, length):
+    """
+        Decode a continuation cursor back into ordering key values
+    :param cursor: Cursor string from a previous Page
+    :param length: Number of key values expected
+    :return: List of key values
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError, AttributeError):
+        raise ValueError("Invalid page cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Page cursor doesn't match the requested ordering")
+    return values
+
+
+@functools.lru_cache(maxsize=256)
+def _seek_from_keys(keys, descending):
+    """
+        Generate the condition selecting rows strictly after a position in a keyset ordering, in the expanded
+        `a > x OR (a = x AND b > y)` form, which both flavors can use an index for
+    :param keys: Tuple of column names in the ordering
+    :param descending: Whether the ordering is descending
+    :return: String condition, using %(_after_N)s parameters
+    """
+    op = "<" if descending else ">"
+    terms = []
+    for index, key in enumerate(keys):
+        equal = [f"{keys[x]} = %(_after_{x})s" for x in range(index)]
+        terms.append("(" + " AND ".join(equal + [f"{key} {op} %(_after_{index})s"]) + ")")
+    return " OR ".join(terms)
+
+
+def _make_rows(type, rows):
+    """
+        Construct GenericDatabase compatible objects from row data, in bulk if the type supports it
+    :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+    :param rows: Sequence of tuples of row data
+    :return: List of type
+    """
+    from_rows = getattr(type, "from_rows", None)
+    if from_rows is None:
+        return [type(x) for x in rows]
+    return from_rows(rows)
 
 
 def key_from_dict(kwargs):
@@ -28,6 +130,23 @@ def key_from_dict(kwargs):
     return frozenset(f"{x}|{kwargs[x]}" for x in kwargs)
 
 
+def _index_spec(table, index):
+    """
+        Normalize one entry of a table's indexes in the schemadef. An entry is a column name, a list of column names,
+        or a dict with "columns" and optionally "name" and "unique". Unnamed indexes are named ix_table_columns
+    :param table: Name of the table the index is on
+    :param index: Index entry from the schemadef
+    :return: Tuple of index name, tuple of column names, and whether it's unique
+    """
+    if isinstance(index, str):
+        index = {"columns": [index]}
+    elif not isinstance(index, dict):
+        index = {"columns": list(index)}
+    columns = tuple(index["columns"])
+    name = index.get("name") or f"ix_{table}_{'_'.join(columns)}"
+    return name, columns, bool(index.get("unique", False))
+
+
 def cached(func):
     """
         Marks a method as cached, meaning that it will not actually poll the database,
@@ -81,15 +200,518 @@ def invalidate(func):
     return cache_invalidate
 
 
+class QueryCache:
+    """
+        A bounded cache of query results, owned by one GenericDatabase. Entries are evicted least-recently-used once
+        maxsize is reached, and optionally expire after ttl seconds. Keys include a per-table generation number, so
+        invalidating a table is a single increment, and the stale entries are never read again and age out
+    """
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "evictions", "_entries", "_generations", "_lock")
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+            Initialize a QueryCache
+        :param maxsize: Maximum number of results to keep. 0 disables caching
+        :param ttl: Seconds a result stays valid, or None for no expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def key(self, table, *parts):
+        """
+            Build the cache key for a query against a table, valid until the table is next invalidated
+        :param table: Table the query reads
+        :param parts: Anything else that distinguishes the query
+        :return: Key tuple, or None if the query can't be cached
+        """
+        if self.maxsize <= 0:
+            return None
+        key = (table, self._generations.get(table, 0)) + parts
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key, default=_Missing):
+        """
+            Get a cached result, counting the hit or miss
+        :param key: Key from QueryCache.key
+        :param default: Value to return on a miss
+        :return: Cached result, or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+            Store a result, evicting the least recently used results if the cache is full
+        :param key: Key from QueryCache.key
+        :param value: Result to store
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table):
+        """
+            Invalidate all cached results for a table
+        :param table: Name of the table
+        """
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        """
+            Remove all cached results
+        """
+        with self._lock:
+            self._entries.clear()
+            for table in self._generations:
+                self._generations[table] += 1
+
+    def info(self):
+        """
+            Get statistics about this cache
+        :return: CacheInfo of hits, misses, evictions, current size and maxsize
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, len(self._entries), self.maxsize)
+
+    def reset_stats(self):
+        """
+            Reset the hit, miss and eviction counters
+        """
+        self.hits = self.misses = self.evictions = 0
+
+
+class IndexAdvisor:
+    """
+        Counts the combinations of columns that reads and deletes filter on, per table, to find filters that no index
+        serves. Enable with the index_advisor argument of GenericDatabase, and read with index_advice
+    """
+
+    __slots__ = ("_seen", "_lock")
+
+    def __init__(self):
+        """
+            Initialize an empty IndexAdvisor
+        """
+        self._seen = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, table, columns):
+        """
+            Record one filtered query. Unfiltered queries aren't recorded, no index helps them
+        :param table: Name of the table queried
+        :param columns: Names of the columns filtered on
+        """
+        if not columns:
+            return
+        key = (table, tuple(sorted(columns)))
+        with self._lock:
+            self._seen[key] += 1
+
+    def seen(self):
+        """
+            Get every recorded filter and how often it was used
+        :return: Dict of (table, tuple of column names) to count
+        """
+        with self._lock:
+            return dict(self._seen)
+
+    def report(self, indexes):
+        """
+            List the recorded filters no index covers. An index covers a filter if its leading columns are exactly
+            the filter's columns in any order, or if it's unique and all its columns are filtered on
+        :param indexes: Dict of table name to list of (tuple of column names, unique), including primary keys
+        :return: List of IndexAdvice, most used first
+        """
+        out = []
+        for (table, columns), count in self.seen().items():
+            wanted = set(columns)
+            covered = False
+            for index_columns, unique in indexes.get(table, ()):
+                if set(index_columns[:len(columns)]) == wanted or (unique and wanted.issuperset(index_columns)):
+                    covered = True
+                    break
+            if not covered:
+                out.append(IndexAdvice(table, columns, count))
+        out.sort(key=lambda x: x.count, reverse=True)
+        return out
+
+    def reset(self):
+        """
+            Forget all recorded filters
+        """
+        with self._lock:
+            self._seen.clear()
+
+
+class CountTracker:
+    """
+        Row counts for registered filters, kept current by GenericDatabase.save_item and remove_item adjusting them
+        as rows start or stop matching, so get_count can answer without a query. Writes that can't be followed row
+        by row mark a table's counts stale, and they are recounted on next use
+    """
+
+    __slots__ = ("_tables", "_versions", "_lock", "_write_locks", "_writing")
+
+    def __init__(self):
+        """
+            Initialize an empty CountTracker
+        """
+        self._tables = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._write_locks = {}
+        self._writing = {}
+
+    def write_lock(self, table):
+        """
+            Get the lock that counted writes to a table hold while reading a row and writing it, so two writes of
+            the same row can't both count it. Writes to other tables don't wait on it
+        :param table: Name of the table
+        :return: Lock for the table
+        """
+        lock = self._write_locks.get(table)
+        if lock is None:
+            with self._lock:
+                lock = self._write_locks.setdefault(table, threading.Lock())
+        return lock
+
+    def track(self, table, filter, refresh=None):
+        """
+            Start tracking the count of rows matching a filter. The count starts stale
+        :param table: Name of the table
+        :param filter: Tuple of (column, value) pairs, sorted by column
+        :param refresh: Seconds after counting that the count is recounted anyway, to catch writes made by other
+                        processes, or None to trust it until a write marks it stale
+        """
+        with self._lock:
+            self._tables.setdefault(table, {})[filter] = [None, 0.0, refresh]
+
+    def untrack(self, table, filter):
+        """
+            Stop tracking the count of rows matching a filter
+        :param table: Name of the table
+        :param filter: Tuple of (column, value) pairs, sorted by column
+        """
+        with self._lock:
+            filters = self._tables.get(table)
+            if filters is not None:
+                filters.pop(filter, None)
+                if not filters:
+                    del self._tables[table]
+
+    def tracking(self, table, filter=None):
+        """
+            Check whether any count, or a specific count, is tracked for a table
+        :param table: Name of the table
+        :param filter: Tuple of (column, value) pairs, or None for any filter
+        :return: Whether the count is tracked
+        """
+        filters = self._tables.get(table)
+        if filters is None:
+            return False
+        return filter is None or filter in filters
+
+    def version(self, table):
+        """
+            Get a number that changes whenever a table's counts are adjusted or marked stale
+        :param table: Name of the table
+        :return: Version of the table's counts
+        """
+        return self._versions.get(table, 0)
+
+    def get(self, table, filter):
+        """
+            Get a tracked count
+        :param table: Name of the table
+        :param filter: Tuple of (column, value) pairs, sorted by column
+        :return: Count, or None if it isn't tracked or needs recounting
+        """
+        entry = self._tables.get(table, {}).get(filter)
+        if entry is None or entry[0] is None:
+            return None
+        if entry[2] is not None and time.monotonic() - entry[1] >= entry[2]:
+            return None
+        return entry[0]
+
+    def begin(self, table):
+        """
+            Mark a counted write to a table as started. Until its adjust, recounts of the table aren't stored, as
+            they may already include the row the adjust will add
+        :param table: Name of the table
+        """
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            self._writing[table] = self._writing.get(table, 0) + 1
+
+    def set(self, table, filter, value, version):
+        """
+            Store a fresh count, unless the table was written since counting started or a write is in progress
+        :param table: Name of the table
+        :param filter: Tuple of (column, value) pairs, sorted by column
+        :param value: Number of matching rows
+        :param version: Result of version from before the count was taken
+        """
+        with self._lock:
+            entry = self._tables.get(table, {}).get(filter)
+            if entry is not None and self._versions.get(table, 0) == version and not self._writing.get(table):
+                entry[0] = value
+                entry[1] = time.monotonic()
+
+    def adjust(self, table, old, new):
+        """
+            Update a table's counts for one row changing, finishing a write started with begin
+        :param table: Name of the table
+        :param old: Dict of column name to value of the row before, or None if it didn't exist
+        :param new: Dict of column name to value of the row after, or None if it was deleted
+        """
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            if self._writing.get(table, 0) > 0:
+                self._writing[table] -= 1
+            for filter, entry in self._tables.get(table, {}).items():
+                if entry[0] is None:
+                    continue
+                was = old is not None and all(old.get(x) == v for x, v in filter)
+                now = new is not None and all(new.get(x) == v for x, v in filter)
+                entry[0] += now - was
+
+    def stale(self, table):
+        """
+            Mark every count of a table for recounting
+        :param table: Name of the table
+        """
+        if table not in self._tables:
+            return
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            for entry in self._tables.get(table, {}).values():
+                entry[0] = None
+
+
+class WriteBuffer:
+    """
+        Upserts waiting to be written by a GenericDatabase in write-behind mode. Rows are kept per table by primary
+        key, so repeated saves of one row coalesce and only the last is written. Tracks queue depth and flush timing
+    """
+
+    __slots__ = ("max_size", "interval", "writes", "coalesced", "flushes", "rows_flushed", "last_flush", "max_flush",
+                 "total_flush", "_tables", "_depth", "_lock", "_flush_lock", "_stop")
+
+    def __init__(self, max_size=1000, interval=1.0):
+        """
+            Initialize a WriteBuffer
+        :param max_size: Number of pending rows that triggers a flush
+        :param interval: Seconds between background flushes, or None to only flush on size and shutdown
+        """
+        self.max_size = max_size
+        self.interval = interval
+        self.writes = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.last_flush = 0.0
+        self.max_flush = 0.0
+        self.total_flush = 0.0
+        self._tables = {}
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def depth(self):
+        """
+            Number of rows waiting to be written
+        """
+        return self._depth
+
+    def add(self, table, names, indices, values):
+        """
+            Queue a row to be upserted, replacing any pending write of the same row
+        :param table: Table the row belongs to
+        :param names: Names of the columns being written
+        :param indices: Indices of the primary key columns in names
+        :param values: Values of the row
+        :return: Whether the buffer has reached max_size and should be flushed
+        """
+        key = tuple(values[x] for x in indices)
+        with self._lock:
+            batch = self._tables.get(table)
+            if batch is None:
+                batch = self._tables[table] = [names, indices, {}]
+            rows = batch[2]
+            if rows.pop(key, None) is None:
+                self._depth += 1
+            else:
+                self.coalesced += 1
+            rows[key] = values
+            self.writes += 1
+            return self._depth >= self.max_size
+
+    def get(self, table, key):
+        """
+            Get the pending write of a row
+        :param table: Table the row belongs to
+        :param key: Tuple of primary key values
+        :return: Tuple of column names and values, or None if the row has no pending write
+        """
+        with self._lock:
+            batch = self._tables.get(table)
+            if batch is None or key not in batch[2]:
+                return None
+            return batch[0], batch[2][key]
+
+    def discard(self, table, keys):
+        """
+            Drop pending writes of rows, because they are being written or deleted directly
+        :param table: Table the rows belong to
+        :param keys: Iterable of tuples of primary key values
+        """
+        with self._lock:
+            batch = self._tables.get(table)
+            if batch is None:
+                return
+            for key in keys:
+                if batch[2].pop(key, None) is not None:
+                    self._depth -= 1
+
+    def pending(self, table=None):
+        """
+            Check whether there are writes pending or being flushed
+        :param table: Table to check, or None for any table
+        :return: Whether a read might not see all writes yet
+        """
+        if self._flush_lock.locked():
+            return True
+        if table is None:
+            return self._depth > 0
+        batch = self._tables.get(table)
+        return batch is not None and len(batch[2]) > 0
+
+    def take(self, table=None):
+        """
+            Remove pending writes from the buffer to be flushed
+        :param table: Table to take writes for, or None for all tables
+        :return: Dict of table name to [names, primary key indices, dict of key to values]
+        """
+        with self._lock:
+            if table is None:
+                tables, self._tables = self._tables, {}
+            else:
+                batch = self._tables.pop(table, None)
+                tables = {} if batch is None else {table: batch}
+            for batch in tables.values():
+                self._depth -= len(batch[2])
+        return {x: y for x, y in tables.items() if y[2]}
+
+    def restore(self, tables):
+        """
+            Put back writes from a failed flush, unless the row was saved again since
+        :param tables: Writes returned by take
+        """
+        with self._lock:
+            for table, (names, indices, rows) in tables.items():
+                batch = self._tables.get(table)
+                if batch is None:
+                    batch = self._tables[table] = [names, indices, {}]
+                for key, values in rows.items():
+                    if key not in batch[2]:
+                        batch[2][key] = values
+                        self._depth += 1
+
+    def record_flush(self, rows, duration):
+        """
+            Record the timing of a completed flush
+        :param rows: Number of rows written
+        :param duration: Seconds the flush took
+        """
+        with self._lock:
+            self.flushes += 1
+            self.rows_flushed += rows
+            self.last_flush = duration
+            self.total_flush += duration
+            if duration > self.max_flush:
+                self.max_flush = duration
+
+    def info(self):
+        """
+            Get statistics about this buffer
+        :return: BufferInfo of queue depth, writes, coalesced writes, flush count, rows flushed, and the last, max
+                 and total flush durations in seconds
+        """
+        return BufferInfo(
+            self._depth, self.writes, self.coalesced, self.flushes, self.rows_flushed, self.last_flush,
+            self.max_flush, self.total_flush
+        )
+
+
+def _flush_loop(ref, buffer):
+    """
+        Background loop flushing a GenericDatabase's write buffer every interval, until the buffer is stopped or the
+        database is garbage collected
+    :param ref: Weak reference to the GenericDatabase
+    :param buffer: The database's WriteBuffer
+    """
+    while not buffer._stop.wait(buffer.interval):
+        database = ref()
+        if database is None:
+            return
+        try:
+            database.flush()
+        except Exception:
+            log.exception("Error while flushing write buffer")
+        del database
+
+
+def _flush_at_exit(ref):
+    """
+        Flush a GenericDatabase's write buffer at interpreter shutdown, if it still exists
+    :param ref: Weak reference to the GenericDatabase
+    """
+    database = ref()
+    if database is not None and database.buffer is not None:
+        try:
+            database.flush()
+        except Exception:
+            log.exception("Error while flushing write buffer at exit")
+
+
 class GenericDatabase:
     """
         Class for handling a connection to a database that fits the a schema, as defined by a custom JSON format.
         (Database schema can be updated to match file with verify_schema)
     """
 
-    __slots__ = ("_accessor", "_username", "_password", "_schema", "_host", "_port", "_schemadef")
+    __slots__ = ("_accessor", "_username", "_password", "_schema", "_host", "_port", "_schemadef", "chunk_size",
+                 "cache", "buffer", "advisor", "counts", "_replicas", "_router", "_local", "__weakref__")
 
-    def __init__(self, address, port, username, password, schema, schemadef, *, connect=True):
+    def __init__(self, address, port, username, password, schema, schemadef, *, connect=True, min_connections=1,
+                 max_connections=10, idle_timeout=300, chunk_size=500, cache_size=1024,
+                 cache_ttl=None, write_behind=False, flush_size=1000, flush_interval=1.0, replicas=None,
+                 read_strategy="round_robin", sticky_window=1.0, replica_retry=30, index_advisor=False):
         """
             Initializes a GenericDatabase object. If passed None, then it replaces the cursor with a dummy class.
         :param address: Address of the SQL database
@@ -98,6 +720,24 @@ class GenericDatabase:
         :param password: SQL password
         :param schema: SQL schema
         :param schemadef: SQL Schema definition dict
+        :param connect: Whether to connect immediately
+        :param min_connections: Minimum number of pooled connections to keep open
+        :param max_connections: Maximum number of pooled connections, the limit on concurrent queries
+        :param idle_timeout: Seconds an extra pooled connection may sit idle before it is closed
+        :param chunk_size: Default max number of rows sent in one statement by save_items
+        :param cache_size: Max number of query results to cache, 0 to disable the result cache
+        :param cache_ttl: Seconds a cached query result stays valid, or None to keep it until a write
+        :param write_behind: Whether save_item should queue upserts in memory and write them in batches
+        :param flush_size: Number of queued rows that triggers a flush in write-behind mode
+        :param flush_interval: Seconds between background flushes in write-behind mode, or None to only flush by
+                               size, on flush, and on close
+        :param replicas: List of (address, port) pairs of read replicas, using the same credentials and schema.
+                         Writes and schema changes always go to the primary at address and port
+        :param read_strategy: How reads pick a replica, round_robin or least_loaded
+        :param sticky_window: Seconds after a write that reads from the same thread or task go to the primary, and
+                              that reads of the written table aren't cached
+        :param replica_retry: Seconds a replica that failed a read is skipped before being tried again
+        :param index_advisor: Whether to record the columns queries filter on, see index_advice
         """
         self._username = username
         self._password = password
@@ -105,110 +745,249 @@ class GenericDatabase:
         self._host = address
         self._port = port
         self._schemadef = schemadef
+        self.chunk_size = chunk_size
+        self.cache = QueryCache(cache_size, cache_ttl)
+        self.buffer = None
+        self.advisor = IndexAdvisor() if index_advisor else None
+        self.counts = CountTracker()
+        self._replicas = list(replicas or ())
+        self._router = None
+        self._local = threading.local()
 
+        pool_args = {"min_size": min_connections, "max_size": max_connections, "idle_timeout": idle_timeout}
         flavor = schemadef["sql_flavor"].lower()
         if flavor == "mysql":
-            self._accessor = accessors.MysqlAccessor()
+            accessor_type = accessors.MysqlAccessor
         elif flavor == "postgresql" or flavor == "postgres":
-            self._accessor = accessors.PostgresAccessor()
+            accessor_type = accessors.PostgresAccessor
+        elif flavor == "sqlite":
+            accessor_type = accessors.SqliteAccessor
         else:
             raise ValueError(f"Unrecognized SQL flavor {flavor}")
+        self._accessor = accessor_type(**pool_args)
+        if self._replicas:
+            self._router = accessors.ReadRouter(
+                self._accessor, [accessor_type(**pool_args) for _ in self._replicas], strategy=read_strategy,
+                sticky_window=sticky_window, retry_after=replica_retry
+            )
 
         if connect:
             self.reset_connection()
 
-    def verify_schema(self):
+        if write_behind:
+            self.buffer = WriteBuffer(flush_size, flush_interval)
+            ref = weakref.ref(self)
+            if flush_interval is not None:
+                threading.Thread(
+                    target=_flush_loop, args=(ref, self.buffer), name="spidertools-db-flush", daemon=True
+                ).start()
+            atexit.register(_flush_at_exit, ref)
+
+    def plan_schema(self):
         """
-            Verifies the schema of the connected Database. If the expected schema doesn't exist, or it doesn't match the
-            expected table forms, it will be updated to match. This requires basically root on the database.
+            Compare the connected Database against the schemadef and list the changes verify_schema would make,
+            without applying them. Existing tables, columns, indexes and triggers are each read in a single query and
+            diffed in memory, and default rows are only planned if they are missing or differ. Indexes on tables
+            without an indexes section are left alone
+        :return: List of SchemaChange, or None if not connected
         """
-        out = {"tables": 0, "columns_add": 0, "columns_remove": 0}
+        if not self.is_connected():
+            log.warning("Attempt to plan schema when database not connected")
+            return None
+
+        changes = []
         tables = self._schemadef.get("tables", {})
         triggers = self._schemadef.get("triggers", {})
 
-        if not self.is_connected():
-            log.warning("Attempt to verify schema when database not connected")
-            return
-
-        # Verify schema is extant
         if self._accessor.has_schema(self._schema):
-            log.info(f"Found schema {self._schema}")
+            existing = {x.name for x in self.get_tables()}
+            columns = {}
+            for column in self._accessor.get_all_columns():
+                column = data.Column(column)
+                columns.setdefault(column.table_name, []).append(column)
+            old_triggers = self.get_triggers()
+            old_indexes = self.get_indexes()
         else:
-            log.warning(f"Schema {self._schema} doesn't exist, creating schema")
-            self._accessor.create_schema(self._schema)
+            changes.append(SchemaChange("create_schema", None, self._schema, None))
+            existing = set()
+            columns = {}
+            old_triggers = []
+            old_indexes = []
+
+        # Drop changed and undeclared indexes first, so they don't block column changes
+        indexes = {}
+        for table in tables:
+            for index in tables[table].get("indexes", ()):
+                name, index_columns, unique = _index_spec(table, index)
+                indexes[name] = (table, index_columns, unique)
+        current_indexes = set()
+        for index in old_indexes:
+            spec = indexes.get(index.name)
+            if spec == (index.table_name, index.columns, index.unique):
+                current_indexes.add(index.name)
+            elif spec is not None or "indexes" in tables.get(index.table_name, ()):
+                changes.append(SchemaChange("drop_index", index.table_name, index.name, None))
 
         # Verify tables match expected
         for table in tables:
-            if self.has_table(table):
-                log.info(f"Found table {table}")
-
-                from collections import defaultdict
-                columndat = defaultdict(lambda: [0, ""])
-                columns = self.get_columns(table)
-                for item in columns:
-                    columndat[item.name][0] += 1
-                    columndat[item.name][1] = item.type
-                for item in tables[table]["columns"]:
-                    name, col_type = item["name"], item["type"]
-                    if col_type == "serial":
-                        col_type = "integer"
-                    elif self._schemadef["sql_flavor"] != "mysql" and col_type.startswith("varchar"):
-                        col_type = "character varying"
-                    columndat[name][0] += 2
-                    columndat[name][1] = columndat[name][1] == col_type
-
-                for name in columndat:
-                    exists, type_match = columndat[name]
-                    if exists == 1:
-                        log.warning(f"  Found column {name} that shouldn't exist, removing")
-                        out["columns_remove"] += 1
-                        self._accessor.drop_column(table, name)
-                    elif exists == 2:
-                        log.warning(f"  Could not find column {name}, creating column")
-                        out["columns_add"] += 1
-                        column_spec = next(filter(lambda x: x["name"] == name, tables[table]["columns"]))
-                        column_index = tables[table]["columns"].index(column_spec)
-                        if column_index == 0:
-                            after = None
-                        else:
-                            after = tables[table]["columns"][column_index-1]["name"]
-                        self._accessor.add_column(table, column_spec, after=after)
-                    elif exists == 3 and type_match is not True:
-                        log.warning(f"  Column {name} didn't match expected type, attempting to fix.")
-                        column_spec = next(filter(lambda x: x["name"] == name, tables[table]["columns"]))
-                        self._accessor.alter_column(table, column_spec)
-                    else:
-                        log.info(f"  Found column {name}")
-            else:
-                log.info(f"Could not find table {table}, creating table")
-                out["tables"] += 1
-                self._accessor.create_table(
-                    table,
-                    tables[table]["columns"],
-                    tables[table].get("primary"),
-                    tables[table].get("foreign")
-                )
+            spec = tables[table]
+            if table not in existing:
+                changes.append(SchemaChange("create_table", table, table, spec))
+                continue
+
+            columndat = collections.defaultdict(lambda: [0, ""])
+            for item in columns.get(table, ()):
+                columndat[item.name][0] += 1
+                columndat[item.name][1] = item.type
+            for item in spec["columns"]:
+                name, col_type = item["name"], item["type"]
+                if col_type == "serial":
+                    col_type = "integer"
+                elif self._schemadef["sql_flavor"] not in ("mysql", "sqlite") and col_type.startswith("varchar"):
+                    col_type = "character varying"
+                columndat[name][0] += 2
+                columndat[name][1] = columndat[name][1] == col_type
 
-        # Fill tables with default values
+            names = [x["name"] for x in spec["columns"]]
+            for name in columndat:
+                exists, type_match = columndat[name]
+                if exists == 1:
+                    changes.append(SchemaChange("drop_column", table, name, None))
+                elif exists == 2:
+                    column_index = names.index(name)
+                    after = names[column_index - 1] if column_index > 0 else None
+                    changes.append(SchemaChange("add_column", table, name, (spec["columns"][column_index], after)))
+                elif exists == 3 and type_match is not True:
+                    changes.append(SchemaChange("alter_column", table, name, spec["columns"][names.index(name)]))
+
+        for name, (table, index_columns, unique) in indexes.items():
+            if name not in current_indexes:
+                changes.append(SchemaChange("create_index", table, name, (index_columns, unique)))
+
+        # Fill tables with default values that aren't already there
         for table in tables:
-            if tables[table].get("defaults") is not None:
-                names = list(map(lambda x: x["name"], tables[table]["columns"]))
-                for values in tables[table]["defaults"]:
-                    self._accessor.insert(table, names=names, values=values, update=True)
+            defaults = tables[table].get("defaults")
+            if not defaults:
+                continue
+            names = [x["name"] for x in tables[table]["columns"]]
+            serial = {x["name"] for x in tables[table]["columns"] if x["type"] == "serial"}
+            primary = tables[table].get("primary") or ()
+            for values in defaults:
+                if table in existing and self._has_default(table, names, values, primary, serial):
+                    continue
+                changes.append(SchemaChange("insert_default", table, None, (names, values)))
 
-        # Drop existing triggers
-        old_triggers = self.get_triggers()
+        # Replace triggers that are missing or changed, drop ones that shouldn't exist
+        found = set()
+        dropped = set()
         for trigger in old_triggers:
-            self._accessor.drop_trigger(trigger.name)
-
-        # Add all triggers
+            spec = triggers.get(trigger.name)
+            if spec is not None and spec["table"] == trigger.event_object_table and \
+                    spec["text"] in (trigger.action_statement or ""):
+                found.add(trigger.name)
+            elif trigger.name not in dropped:
+                dropped.add(trigger.name)
+                changes.append(SchemaChange("drop_trigger", trigger.event_object_table, trigger.name, None))
         for name in triggers:
-            cause = triggers[name]["cause"]
-            table = triggers[name]["table"]
-            for_each = triggers[name]["for_each"]
-            text = triggers[name]["text"]
-            self._accessor.create_trigger(name, cause, table, for_each, text)
+            if name not in found:
+                changes.append(SchemaChange("create_trigger", triggers[name]["table"], name, triggers[name]))
+
+        return changes
+
+    def _has_default(self, table, names, values, primary, serial):
+        """
+            Check whether a default row is already stored, looking it up by primary key where the default has one,
+            or by its other values otherwise. Auto increment columns left empty in the default are ignored
+        :param table: Table the default belongs to
+        :param names: Names of the table's columns
+        :param values: Values of the default row
+        :param primary: Primary key column names
+        :param serial: Names of auto increment columns
+        :return: Whether a matching row exists
+        """
+        row = {x: y for x, y in zip(names, values) if not (x in serial and y is None)}
+        if primary and all(row.get(x) is not None for x in primary):
+            where = {x: row[x] for x in primary}
+        else:
+            where = row
+        found = self._accessor.select(table, where=and_from_dict(where), params=where, limit=1)
+        if not found:
+            return False
+        stored = dict(zip(names, found[0]))
+        return all(_normalize_value(stored.get(x)) == _normalize_value(y) for x, y in row.items())
+
+    def _apply_change(self, change):
+        """
+            Apply a single planned SchemaChange to the database
+        :param change: Change to apply
+        """
+        action, table, name, detail = change
+        if action == "create_schema":
+            log.warning(f"Schema {name} doesn't exist, creating schema")
+            self._accessor.create_schema(name)
+        elif action == "create_table":
+            log.info(f"Could not find table {table}, creating table")
+            self._accessor.create_table(table, detail["columns"], detail.get("primary"), detail.get("foreign"))
+        elif action == "drop_column":
+            log.warning(f"  Found column {name} that shouldn't exist, removing")
+            self._accessor.drop_column(table, name)
+        elif action == "add_column":
+            log.warning(f"  Could not find column {name}, creating column")
+            self._accessor.add_column(table, detail[0], after=detail[1])
+        elif action == "alter_column":
+            log.warning(f"  Column {name} didn't match expected type, attempting to fix.")
+            self._accessor.alter_column(table, detail)
+        elif action == "drop_index":
+            log.warning(f"  Found index {name} that shouldn't exist or changed, removing")
+            self._accessor.drop_index(table, name)
+        elif action == "create_index":
+            log.info(f"  Could not find index {name}, creating index")
+            self._accessor.create_index(name, table, detail[0], unique=detail[1])
+        elif action == "insert_default":
+            self._accessor.insert(table, names=detail[0], values=detail[1], update=True)
+        elif action == "drop_trigger":
+            self._accessor.drop_trigger(name)
+        elif action == "create_trigger":
+            self._accessor.create_trigger(name, detail["cause"], table, detail["for_each"], detail["text"])
+        else:
+            raise ValueError(f"Unrecognized schema change {action}")
+
+    def verify_schema(self):
+        """
+            Verifies the schema of the connected Database. If the expected schema doesn't exist, or it doesn't match the
+            expected table forms, it will be updated to match. This requires basically root on the database.
+            Changes are planned with plan_schema, then applied in one transaction where the flavor supports
+            transactional DDL
+        :return: Dict of counts of tables created, columns added, and columns removed
+        """
+        changes = self.plan_schema()
+        if changes is None:
+            return None
 
+        out = {"tables": 0, "columns_add": 0, "columns_remove": 0}
+        if self._accessor.TRANSACTIONAL_DDL:
+            context = self._accessor.transaction()
+        else:
+            context = self._accessor.checkout()
+
+        try:
+            with context:
+                for change in changes:
+                    self._apply_change(change)
+                    if change.action == "create_table":
+                        out["tables"] += 1
+                    elif change.action == "add_column":
+                        out["columns_add"] += 1
+                    elif change.action == "drop_column":
+                        out["columns_remove"] += 1
+        finally:
+            # Table structure and contents may have changed, so statements and results from before can't be reused
+            self._accessor.invalidate_statements()
+            if self._router is not None:
+                self._router.invalidate_statements()
+            self.cache.clear()
+
+        log.info(f"Schema verified, {len(changes)} changes applied")
         return out
 
     def commit(self):
@@ -218,10 +997,205 @@ class GenericDatabase:
         """
         log.debug("Committing data")
         if self._accessor.is_connected():
-            self._accessor._connection.commit()
+            self._accessor.commit()
             return True
         return False
 
+    def flush(self, table=None):
+        """
+            Write queued upserts in write-behind mode, in one transaction. If writing fails, the rows are queued
+            again unless they have been saved since
+        :param table: Only flush rows of this table, or None for all tables
+        :return: Number of rows written
+        """
+        buffer = self.buffer
+        if buffer is None:
+            return 0
+        with buffer._flush_lock:
+            tables = buffer.take(table)
+            if not tables:
+                return 0
+            start = time.perf_counter()
+            try:
+                with self.transaction():
+                    self._write_tables(tables, self.chunk_size)
+            except BaseException:
+                buffer.restore(tables)
+                raise
+            rows = sum(len(x[2]) for x in tables.values())
+            buffer.record_flush(rows, time.perf_counter() - start)
+            return rows
+
+    def close(self):
+        """
+            Flush any queued writes, stop background flushing, and close the connection pool
+        """
+        if self.buffer is not None:
+            self.buffer._stop.set()
+            if self._accessor.is_connected():
+                self.flush()
+        self._accessor.close()
+        if self._router is not None:
+            self._router.close()
+
+    def _pending_item(self, type, table_name, kwargs):
+        """
+            Look up a queued write for a get_item filtering on exactly the primary key
+        :param type: GenericDatabase compatible type to build
+        :param table_name: Name of the table
+        :param kwargs: Parameters get_item was called with
+        :return: Instance of type built from the queued row, or None if there isn't one
+        """
+        table = self._schemadef["tables"][table_name]
+        primary = table.get("primary")
+        if not primary or len(kwargs) != len(primary) or any(x not in kwargs for x in primary):
+            return None
+        pending = self.buffer.get(table_name, tuple(kwargs[x] for x in primary))
+        if pending is None or len(pending[0]) != len(table["columns"]):
+            return None
+        return type(pending[1])
+
+    def _flush_pending(self, table):
+        """
+            Make sure queued writes to a table are in the database before it is read or deleted from. Inside a
+            transaction the queued rows are written on the transaction's connection, and are queued again if it
+            rolls back
+        :param table: Table about to be read
+        """
+        buffer = self.buffer
+        if buffer is None or not buffer.pending(table):
+            return
+        if not self.in_transaction():
+            self.flush(table)
+            return
+        # Not under the flush lock, a flush on another thread may be waiting on this transaction's locks
+        tables = buffer.take(table)
+        if not tables:
+            return
+        flushed = self._local.flushed
+        flushed.append(tables)
+        start = time.perf_counter()
+        try:
+            self._write_tables(tables, self.chunk_size)
+        except BaseException:
+            flushed.remove(tables)
+            buffer.restore(tables)
+            raise
+        buffer.record_flush(sum(len(x[2]) for x in tables.values()), time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+            Group every write made on this thread inside the block into one transaction with a single commit. Cache
+            invalidation is deferred until the commit succeeds, and if the block raises, the transaction is rolled
+            back and the cache is left as it was. Nested transactions join the outer one. Reads in the block see its
+            uncommitted writes, except iter_items, which streams on its own connection
+        :return: Context manager yielding this database
+        """
+        local = self._local
+        if getattr(local, "pending", None) is not None:
+            yield self
+            return
+
+        pending = local.pending = set()
+        flushed = local.flushed = []
+        try:
+            with self._accessor.transaction():
+                yield self
+        except BaseException:
+            for tables in flushed:
+                self.buffer.restore(tables)
+            raise
+        finally:
+            local.pending = None
+            local.flushed = None
+        for table in pending:
+            self.cache.invalidate(table)
+            self.counts.stale(table)
+
+    def in_transaction(self):
+        """
+            Check whether the current thread is inside a GenericDatabase transaction
+        :return: Whether a transaction is open
+        """
+        return getattr(self._local, "pending", None) is not None
+
+    def add_listener(self, listener):
+        """
+            Attach a query listener, called with a QueryEvent after every statement run and every cached read.
+            See accessors.QueryStats for a listener that aggregates timings and logs slow queries
+        :param listener: Callable taking a QueryEvent
+        """
+        self._accessor.add_listener(listener)
+        if self._router is not None:
+            self._router.add_listener(listener)
+
+    def remove_listener(self, listener):
+        """
+            Detach a query listener
+        :param listener: Listener previously passed to add_listener
+        """
+        self._accessor.remove_listener(listener)
+        if self._router is not None:
+            self._router.remove_listener(listener)
+
+    def _cache_event(self, kind, table, start, rows, hit):
+        """
+            Emit a QueryEvent for a read that went through the result cache
+        :param kind: Name of the read method
+        :param table: Table read from
+        :param start: perf_counter time the read started
+        :param rows: Number of rows in the result
+        :param hit: Whether the result came from the cache
+        """
+        self._accessor._emit(accessors.QueryEvent(
+            f"CACHED {kind} {table}", "SELECT", table, time.perf_counter() - start, rows, hit, None
+        ))
+
+    def _invalidate(self, table, counted=False):
+        """
+            Invalidate cached results for a table, or defer it until commit if a transaction is open
+        :param table: Name of the table written to
+        :param counted: Whether the write already adjusted the table's tracked counts
+        """
+        if self._router is not None:
+            self._router.wrote(table)
+        if not counted:
+            self.counts.stale(table)
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            self.cache.invalidate(table)
+        else:
+            pending.add(table)
+
+    def _cache_key(self, table, *parts):
+        """
+            Build the cache key for a read. Tables written in the open transaction aren't cached, so uncommitted
+            rows never reach the shared cache, and neither are tables recently written while replicas may lag
+        :param table: Table the query reads
+        :param parts: Anything else that distinguishes the query
+        :return: Key tuple, or None if the result shouldn't be cached
+        """
+        pending = getattr(self._local, "pending", None)
+        if pending is not None and table in pending:
+            return None
+        if self._router is not None and self._router.recent(table):
+            return None
+        return self.cache.key(table, *parts)
+
+    def _read(self, method, *args, **kwargs):
+        """
+            Run a read on a replica if there are any, or on the primary. Reads inside a transaction, or soon after
+            a write from the same thread or task, go to the primary so they see that write
+        :param method: Name of the accessor read method
+        :param args: Positional arguments to the method
+        :param kwargs: Keyword arguments to the method
+        :return: Result of the method
+        """
+        if self._router is None or self.in_transaction():
+            return getattr(self._accessor, method)(*args, **kwargs)
+        return self._router.read(method, *args, **kwargs)
+
     def is_connected(self):
         """
             Checks whether we are currently connected to a database
@@ -236,6 +1210,11 @@ class GenericDatabase:
         """
 
         if self._accessor.is_connected():
+            if self.buffer is not None:
+                try:
+                    self.flush()
+                except Exception as e:
+                    log.warning(f"Failed to flush write buffer before reconnecting: {e}")
             self._accessor.close()
 
         try:
@@ -253,14 +1232,20 @@ class GenericDatabase:
             log.warning(e)
             log.warning("Database connection dropped, no data will be saved this session.")
 
+        if self._router is not None:
+            self._router.connect(
+                self._replicas, user=self._username, password=self._password, schema=self._schema, autocommit=True
+            )
+
     def raw_exec(self, statement, *args):
         """
             Executes a SQL statement raw and returns the result. Should only be used in dev operations.
         :param statement: SQL statement to execute.
         :return: The result of a cursor fetchall after the statement executes.
         """
-        self._accessor.execute(statement, args)
-        return self._accessor._cursor.fetchall()
+        with self._accessor.checkout() as cursor:
+            self._accessor.execute(statement, args)
+            return cursor.fetchall()
 
     def execute(self, statement, args=None):
         """
@@ -331,83 +1316,474 @@ class GenericDatabase:
         """
         return [data.Trigger(x) for x in self._accessor.get_triggers()]
 
+    def get_indexes(self):
+        """
+            Gets the secondary indexes for the current schema, see DatabaseAccessor.get_indexes
+        :return: List of Index objects
+        """
+        return [data.Index(x) for x in self._accessor.get_indexes()]
+
+    def index_advice(self):
+        """
+            Report filters recorded by the index advisor that no index covers, against the connected database's
+            indexes, or the schemadef's if not connected. Primary keys and unique columns count as indexes
+        :return: List of IndexAdvice, most used first, or None if the advisor isn't enabled
+        """
+        if self.advisor is None:
+            return None
+        indexes = collections.defaultdict(list)
+        tables = self._schemadef.get("tables", {})
+        for table, spec in tables.items():
+            if spec.get("primary"):
+                indexes[table].append((tuple(spec["primary"]), True))
+            for column in spec["columns"]:
+                if column.get("is_unique"):
+                    indexes[table].append(((column["name"],), True))
+        if self.is_connected():
+            for index in self.get_indexes():
+                indexes[index.table_name].append((index.columns, index.unique))
+        else:
+            for table, spec in tables.items():
+                for index in spec.get("indexes", ()):
+                    name, index_columns, unique = _index_spec(table, index)
+                    indexes[table].append((index_columns, unique))
+        return self.advisor.report(indexes)
+
     # Generic methods
 
-    @clstools.invalidating_cache(method=True)
-    def get_item(self, type, *, order=None, default=None, **kwargs):
+    def get_item(self, type, *, order=None, default=None, cache=True, **kwargs):
         """
             Get the first GenericDatabase compatible object from the database, based on a type.
             Result can be ordered and filtered.
         :param type: GenericDatabase compatible type. Subclasses Row or duck types it
         :param order: Parameter to pass into the ORDER BY clause
         :param default: What to return if nothing is found. Defaults to None
+        :param cache: Whether to use the result cache for this call
         :param kwargs: Parameters to filter by. Are all ANDed together
         :return: An instance of type, or default
         """
+        table_name = type.table_name()
+        if self.advisor is not None:
+            self.advisor.record(table_name, kwargs)
+        if self.buffer is not None:
+            pending = self._pending_item(type, table_name, kwargs)
+            if pending is not None:
+                return pending
+            self._flush_pending(table_name)
+        key = self._cache_key(table_name, "item", type, tuple(kwargs.items()), order) if cache else None
+        start = time.perf_counter() if key is not None and self._accessor.listening else None
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not _Missing:
+                if start is not None:
+                    self._cache_event("get_item", table_name, start, int(result is not None), True)
+                return default if result is None else result
+
         conditions = and_from_dict(kwargs)
-        result = self._accessor.select(
-            type.table_name(), where=conditions, params=kwargs, order=order, limit=1
-        )
-        if len(result) == 0:
-            return default
-        return type(result[0])
+        result = self._read("select", table_name, where=conditions, params=kwargs, order=order, limit=1)
+        result = type(result[0]) if len(result) > 0 else None
+        if key is not None:
+            self.cache.put(key, result)
+            if start is not None:
+                self._cache_event("get_item", table_name, start, int(result is not None), False)
+        return default if result is None else result
 
-    @clstools.invalidating_cache(method=True)
-    def get_items(self, type, *, limit=None, order=None, **kwargs):
+    def get_items(self, type, *, limit=None, order=None, cache=True, **kwargs):
         """
             Get a list of GenericDatabase compatible objects from the database, based on a type.
             Result can be ordered, limited, and filtered.
         :param type: GenericDatabase compatible type. Subclasses Row or duck types it
         :param limit: Maximum number of items to get. If this would be one, consider get_item
         :param order: Parameter to pass to the ORDER BY clause
+        :param cache: Whether to use the result cache for this call
         :param kwargs: Parameters to filter by. Are all ANDed together
         :return: A list of type, may be empty if nothing found
         """
+        table_name = type.table_name()
+        if self.advisor is not None:
+            self.advisor.record(table_name, kwargs)
+        self._flush_pending(table_name)
+        key = self._cache_key(table_name, "items", type, tuple(kwargs.items()), order, limit) if cache else None
+        start = time.perf_counter() if key is not None and self._accessor.listening else None
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not _Missing:
+                if start is not None:
+                    self._cache_event("get_items", table_name, start, len(result), True)
+                return list(result)
+
         conditions = and_from_dict(kwargs)
         if isinstance(limit, tuple):
-            limit = f"{limit[0]},{limit[1]}"
-        return [type(x) for x in self._accessor.select(type.table_name(), where=conditions, params=kwargs, order=order, limit=limit)]
+            # LIMIT count OFFSET offset works on every flavor, unlike MySQL's LIMIT offset,count
+            limit = f"{limit[1]} OFFSET {limit[0]}"
+        result = _make_rows(type, self._read(
+            "select", table_name, where=conditions, params=kwargs, order=order, limit=limit
+        ))
+        if key is not None:
+            # Cached as a tuple and copied out, so callers can't change what later calls get
+            self.cache.put(key, tuple(result))
+            if start is not None:
+                self._cache_event("get_items", table_name, start, len(result), False)
+        return result
+
+    def get_page(self, type, *, order, size, after=None, descending=False, cache=True, **kwargs):
+        """
+            Get one page of GenericDatabase compatible objects using keyset pagination. Instead of an offset, pages
+            continue from the ordering key of the previous page's last row, so with an index on the ordering every
+            page costs the same as the first. The table's primary key is added to the ordering to keep it unique
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param order: Column name or tuple of column names to order by. Should not contain nulls
+        :param size: Number of items per page
+        :param after: Cursor from the previous Page, or None for the first page
+        :param descending: Whether to order from largest to smallest
+        :param cache: Whether to use the result cache for this call
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Page of items and a cursor for the next page, which is None on the last page
+        """
+        table_name = type.table_name()
+        if self.advisor is not None:
+            self.advisor.record(table_name, kwargs)
+        self._flush_pending(table_name)
+        keys = (order,) if isinstance(order, str) else tuple(order)
+        table = self._schemadef["tables"][table_name]
+        keys += tuple(x for x in table.get("primary", ()) if x not in keys)
+
+        key = self._cache_key(
+            table_name, "page", type, tuple(kwargs.items()), keys, size, after, descending
+        ) if cache else None
+        start = time.perf_counter() if key is not None and self._accessor.listening else None
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not _Missing:
+                if start is not None:
+                    self._cache_event("get_page", table_name, start, len(result.items), True)
+                return Page(list(result.items), result.cursor)
+
+        params = dict(kwargs)
+        conditions = and_from_dict(kwargs)
+        if after is not None:
+            for index, value in enumerate(_decode_cursor(after, len(keys))):
+                params[f"_after_{index}"] = value
+            seek = _seek_from_keys(keys, descending)
+            conditions = f"{conditions} AND ({seek})" if conditions else seek
+
+        direction = " DESC" if descending else ""
+        order_by = ", ".join(x + direction for x in keys)
+        rows = self._read("select", table_name, where=conditions, params=params, order=order_by, limit=size + 1)
+
+        cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            columns = [x["name"] for x in table["columns"]]
+            last = rows[-1]
+            cursor = _encode_cursor([last[columns.index(x)] for x in keys])
+
+        result = Page(_make_rows(type, rows), cursor)
+        if key is not None:
+            self.cache.put(key, Page(tuple(result.items), result.cursor))
+            if start is not None:
+                self._cache_event("get_page", table_name, start, len(result.items), False)
+        return result
+
+    def iter_batches(self, type, *, batch_size=1000, limit=None, order=None, **kwargs):
+        """
+            Stream GenericDatabase compatible objects from the database in batches, without loading the whole
+            result at once. Results aren't cached. Rows are only constructed for one batch at a time
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param batch_size: Number of rows to fetch from the server at a time
+        :param limit: Maximum number of items to get
+        :param order: Parameter to pass to the ORDER BY clause
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Generator of lists of type
+        """
+        if self.advisor is not None:
+            self.advisor.record(type.table_name(), kwargs)
+        self._flush_pending(type.table_name())
+        conditions = and_from_dict(kwargs)
+        if self._router is None or self.in_transaction():
+            batches = self._accessor.select_iter(
+                type.table_name(), where=conditions, params=kwargs, order=order, limit=limit, batch_size=batch_size
+            )
+        else:
+            batches = self._router.stream(
+                "select_iter", type.table_name(), where=conditions, params=kwargs, order=order, limit=limit,
+                batch_size=batch_size
+            )
+        for batch in batches:
+            yield _make_rows(type, batch)
 
-    @clstools.invalidating_cache(method=True)
-    def get_count(self, type, **kwargs):
+    def iter_items(self, type, *, batch_size=1000, limit=None, order=None, **kwargs):
         """
-            Get the number of given GenericDatabase objects that are in the database, matching the kwargs filter
+            Stream GenericDatabase compatible objects from the database one at a time, fetching them in batches,
+            so memory use stays constant regardless of table size. Results aren't cached
         :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param batch_size: Number of rows to fetch from the server at a time
+        :param limit: Maximum number of items to get
+        :param order: Parameter to pass to the ORDER BY clause
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Generator of type
+        """
+        for batch in self.iter_batches(type, batch_size=batch_size, limit=limit, order=order, **kwargs):
+            yield from batch
+
+    def get_count(self, type, *, cache=True, approximate=False, **kwargs):
+        """
+            Get the number of given GenericDatabase objects that are in the database, matching the kwargs filter.
+            Counts registered with track_count are answered without a query
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param cache: Whether to use the result cache for this call
+        :param approximate: Whether an unfiltered count may come from the database's table statistics instead of
+                            a scan. Falls back to an exact count if there are no statistics
         :param kwargs: Parameters to filter by. Are all ANDed together
         :return: Number of type in the database
         """
+        table_name = type.table_name()
+        if self.advisor is not None:
+            self.advisor.record(table_name, kwargs)
+        self._flush_pending(table_name)
+
+        counts = self.counts
+        pending = getattr(self._local, "pending", None)
+        if counts.tracking(table_name) and (pending is None or table_name not in pending):
+            tracked = tuple(sorted(kwargs.items()))
+            if counts.tracking(table_name, tracked):
+                result = counts.get(table_name, tracked)
+                if result is None:
+                    version = counts.version(table_name)
+                    result = self._accessor.count(table_name, where=and_from_dict(kwargs), params=kwargs)
+                    counts.set(table_name, tracked, result, version)
+                return result
+
+        if approximate and not kwargs:
+            result = self._read("estimate_count", table_name)
+            if result is not None:
+                return result
+
+        key = self._cache_key(table_name, "count", tuple(kwargs.items())) if cache else None
+        start = time.perf_counter() if key is not None and self._accessor.listening else None
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not _Missing:
+                if start is not None:
+                    self._cache_event("get_count", table_name, start, 1, True)
+                return result
+
         conditions = and_from_dict(kwargs)
-        return self._accessor.count(type.table_name(), where=conditions, params=kwargs)
+        result = self._read("count", table_name, where=conditions, params=kwargs)
+        if key is not None:
+            self.cache.put(key, result)
+            if start is not None:
+                self._cache_event("get_count", table_name, start, 1, False)
+        return result
 
-    @clstools.cache_invalidator(func=(get_item, get_items, get_count), method=True, args=0, generic=True)
-    def save_item(self, item):
+    def track_count(self, type, *, refresh=None, **kwargs):
         """
-            Save any GenericDatabase compatible object to the database, inserting or updating that row.
-        :param item: Item to save. May be a Row, a MultiRow, or any duck type of those two.
+            Keep a count of the objects matching a filter in memory, so get_count with the same filter doesn't query.
+            save_item and remove_item adjust it, at the cost of reading the old row first, and other writes to the
+            table make it recount on next use. Writes from other processes aren't seen, unless refresh is set
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param refresh: Seconds after which the count is taken again regardless
+        :param kwargs: Parameters to filter by, as they will be passed to get_count
+        :return: Current count
+        """
+        self.counts.track(type.table_name(), tuple(sorted(kwargs.items())), refresh)
+        return self.get_count(type, **kwargs)
+
+    def untrack_count(self, type, **kwargs):
+        """
+            Stop keeping a count registered with track_count
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param kwargs: Parameters the count was tracked with
+        """
+        self.counts.untrack(type.table_name(), tuple(sorted(kwargs.items())))
+
+    def _counted_write(self, table_name, where, params, write, new):
+        """
+            Run a write of at most one row while adjusting the table's tracked counts. The row is read, written and
+            counted under the table's write lock so concurrent writes can't double count, and recounts taken during
+            the write aren't stored
+        :param table_name: Name of the table
+        :param where: Condition selecting the row as it was before the write
+        :param params: Parameters to the condition
+        :param write: Callable doing the write
+        :param new: Dict of column name to value of the row after the write, or None if it's deleted
+        """
+        columns = [x["name"] for x in self._schemadef["tables"][table_name]["columns"]]
+        counts = self.counts
+        with counts.write_lock(table_name):
+            old = self._accessor.select(table_name, where=where, params=params, limit=1)
+            old = dict(zip(columns, old[0])) if old else None
+            counts.begin(table_name)
+            try:
+                write()
+            except BaseException:
+                counts.adjust(table_name, None, None)
+                raise
+            counts.adjust(table_name, old, new)
+
+    def _row_data(self, item):
+        """
+            Get the table name, column names and values to save for a Row like object, leaving out serial columns.
+            Raises AttributeError if the item isn't Row like
+        :param item: Row like object
+        :return: Tuple of table name, list of column names, list of values
+        """
+        table_name = item.table_name()
+        if not isinstance(table_name, str):
+            raise ValueError(f"Row table_name must be an instance of string, not {type(table_name).__name__}")
+        row = item.to_row()
+        names = []
+        values = []
+        # TODO: encapsulate this in accessor
+        for column, value in zip(self._schemadef["tables"][table_name]["columns"], row):
+            if column["type"] != "serial":
+                names.append(column["name"])
+                values.append(value)
+        return table_name, names, values
+
+    def _key_indices(self, table_name, names):
+        """
+            Get the positions of a table's primary key columns among the columns being written
+        :param table_name: Name of the table
+        :param names: Names of the columns being written
+        :return: List of indices, or None if the table has no primary key or not all of it is written
+        """
+        primary = self._schemadef["tables"][table_name].get("primary")
+        if not primary:
+            return None
+        indices = [names.index(x) for x in primary if x in names]
+        if len(indices) != len(primary):
+            return None
+        return indices
+
+    def _collect_rows(self, item, tables, removed):
+        """
+            Recursively gather the rows to save from an item into per-table batches, keyed by primary key so the last
+            write to a row wins. Removed items of MultiRows are gathered into a separate list
+        :param item: Row, MultiRow, or iterable of those
+        :param tables: Dict of table name to [names, primary key indices, dict of key to values]
+        :param removed: List to add removed items to
         """
         try:
-            table_name = item.table_name()
-            if not isinstance(table_name, str):
-                raise ValueError(f"Row table_name must be an instance of string, not {type(table_name).__name__}")
-            row = item.to_row()
-            columns = []
-            for index, column in enumerate(self._schemadef["tables"][table_name]["columns"]):  # TODO: encapsulate this in accessor
-                if column["type"] == "serial":
-                    del row[index]
-                else:
-                    columns.append(column["name"])
-            self._accessor.insert(table_name, values=row, names=columns, update=True)
+            table_name, names, values = self._row_data(item)
         except AttributeError:
             for row in item:
-                self.save_item(row)
+                self._collect_rows(row, tables, removed)
             try:
-                removed_items = item.removed_items()
-                for removed in removed_items:
-                    self.remove_item(removed)
+                removed.extend(item.removed_items())
             except AttributeError:  # So iterables not having this property are just ignored
                 pass
+            return
+
+        batch = tables.get(table_name)
+        if batch is None:
+            batch = tables[table_name] = [names, self._key_indices(table_name, names), {}]
+
+        rows = batch[2]
+        if batch[1]:
+            key = tuple(values[x] for x in batch[1])
+        else:
+            key = len(rows)
+        rows.pop(key, None)
+        rows[key] = values
+
+    def _write_tables(self, tables, chunk_size):
+        """
+            Upsert batches of rows gathered by _collect_rows, and invalidate the cache for their tables
+        :param tables: Dict of table name to [names, primary key indices, dict of key to values]
+        :param chunk_size: Max number of rows per statement
+        """
+        with self.transaction():
+            for table_name, (names, _, rows) in tables.items():
+                self._accessor.insert_many(
+                    table_name, rows=list(rows.values()), names=names, update=True, chunk_size=chunk_size
+                )
+                self._invalidate(table_name)
+
+    def save_items(self, items, *, chunk_size=None):
+        """
+            Save many GenericDatabase compatible objects in batches. Rows are grouped by table and upserted with as
+            few statements as possible, and removed items of MultiRows are deleted by primary key in batches. All
+            statements run in one transaction
+        :param items: Iterable of Rows, MultiRows, or iterables of those
+        :param chunk_size: Max number of rows per statement, defaults to the database's chunk_size
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        tables = {}
+        removed = []
+        self._collect_rows(items, tables, removed)
+
+        if self.buffer is not None:
+            for table_name, (_, indices, rows) in tables.items():
+                if indices:
+                    self.buffer.discard(table_name, rows)
+
+        with self.transaction():
+            self._write_tables(tables, chunk_size)
+
+            deletes = {}
+            for item in removed:
+                try:
+                    table_name = item.table_name()
+                    table = self._schemadef["tables"][table_name]
+                    primary = table.get("primary")
+                    columns = [x["name"] for x in table["columns"]]
+                    row = item.to_row()
+                    key = tuple(row[columns.index(x)] for x in primary) if primary else None
+                except AttributeError:
+                    key = None
+                if key is None or None in key:
+                    self.remove_item(item)
+                else:
+                    deletes.setdefault(table_name, (primary, {}))[1][key] = None
+
+            for table_name, (primary, keys) in deletes.items():
+                if self.buffer is not None:
+                    self.buffer.discard(table_name, keys)
+                self._accessor.delete_many(table_name, names=primary, keys=list(keys), chunk_size=chunk_size)
+
+            for table_name in tables.keys() | deletes.keys():
+                self._invalidate(table_name)
+
+    def save_item(self, item):
+        """
+            Save any GenericDatabase compatible object to the database, inserting or updating that row.
+        :param item: Item to save. May be a Row, a MultiRow, or any duck type of those two. MultiRows and iterables
+                     are saved in batches with save_items
+        """
+        try:
+            table_name, names, values = self._row_data(item)
+        except AttributeError:
+            self.save_items(item)
+            return
+
+        buffer = self.buffer
+        if buffer is not None:
+            indices = self._key_indices(table_name, names)
+            if indices is not None:
+                if not self.in_transaction():
+                    if buffer.add(table_name, names, indices, values):
+                        self.flush()
+                    return
+                buffer.discard(table_name, (tuple(values[x] for x in indices),))
+
+        if self.counts.tracking(table_name) and not self.in_transaction():
+            primary = self._schemadef["tables"][table_name].get("primary")
+            if primary and all(x in names for x in primary):
+                key = {x: values[names.index(x)] for x in primary}
+                self._counted_write(
+                    table_name, and_from_dict(key), key,
+                    lambda: self._accessor.insert(table_name, values=values, names=names, update=True),
+                    dict(zip(names, values))
+                )
+                self._invalidate(table_name, counted=True)
+                return
+
+        self._accessor.insert(table_name, values=values, names=names, update=True)
+        self._invalidate(table_name)
 
-    @clstools.cache_invalidator(func=(get_item, get_items, get_count), method=True, args=0, generic=True)
     def remove_item(self, item, general=False):
         """
             Remove any GenericDatabase compatible object from the database.
@@ -427,12 +1803,22 @@ class GenericDatabase:
             else:
                 params = {i: v for i, v in zip(columns, row) if v is not None}
                 delete_str = and_from_dict(params)
-            self._accessor.delete(table_name, where=delete_str, params=params)
         except AttributeError:
             for row in item:
                 self.remove_item(row, general)
+            return
+        self._flush_pending(table_name)
+        if not general and self.counts.tracking(table_name) and not self.in_transaction() and \
+                self._schemadef["tables"][table_name].get("primary"):
+            self._counted_write(
+                table_name, delete_str, params,
+                lambda: self._accessor.delete(table_name, where=delete_str, params=params), None
+            )
+            self._invalidate(table_name, counted=True)
+            return
+        self._accessor.delete(table_name, where=delete_str, params=params)
+        self._invalidate(table_name)
 
-    @clstools.cache_invalidator(func=(get_item, get_items, get_count), method=True, args=0)
     def remove_items(self, type, *, limit=None, order=None, **kwargs):
         """
             Remove any GenericDatabase objects from the database of a specific type, that match the given parameters
@@ -442,7 +1828,239 @@ class GenericDatabase:
         :param order: Parameter to pass into the ORDER BY clause
         :param kwargs: Parameters to filter by. Are all ANDed together
         """
+        if self.advisor is not None:
+            self.advisor.record(type.table_name(), kwargs)
         conditions = and_from_dict(kwargs)
         if isinstance(limit, tuple):
             limit = f"{limit[0]},{limit[1]}"
+        self._flush_pending(type.table_name())
         self._accessor.delete(type.table_name(), where=conditions, order=order, limit=limit, params=kwargs)
+        self._invalidate(type.table_name())
+
+
+class AsyncGenericDatabase:
+    """
+        Asyncio twin of GenericDatabase. Wraps a GenericDatabase, which may be a subclass with its own query methods,
+        and runs its blocking calls on a thread pool sized to the connection pool, so coroutines await queries
+        instead of stalling the event loop. Any other method of the wrapped database can be awaited through this
+        object as well
+    """
+
+    __slots__ = ("_database", "_executor")
+
+    def __init__(self, database, *, executor=None):
+        """
+            Initializes an AsyncGenericDatabase around an existing GenericDatabase
+        :param database: GenericDatabase to run queries with
+        :param executor: Executor to run blocking calls on. Defaults to a thread pool with one thread per pooled
+                         connection
+        """
+        self._database = database
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=database._accessor._pool_args["max_size"], thread_name_prefix="spidertools-db"
+            )
+        self._executor = executor
+
+    def __getattr__(self, item):
+        """
+            Get an awaitable version of a method on the wrapped database
+        :param item: Name of the attribute
+        :return: Coroutine function running the method on the executor, or the plain attribute if not callable
+        """
+        value = getattr(self._database, item)
+        if not callable(value):
+            return value
+
+        async def run(*args, **kwargs):
+            return await self.run(value, *args, **kwargs)
+
+        functools.update_wrapper(run, value)
+        return run
+
+    @property
+    def database(self):
+        """
+            The wrapped synchronous GenericDatabase
+        """
+        return self._database
+
+    async def run(self, func, *args, **kwargs):
+        """
+            Run a blocking callable on this database's executor, in a copy of the calling task's context so a
+            write's read-your-writes window follows the task rather than the executor thread
+        :param func: Callable to run
+        :param args: Positional arguments to the callable
+        :param kwargs: Keyword arguments to the callable
+        :return: Result of the callable
+        """
+        loop = asyncio.get_running_loop()
+        if self._database._router is not None:
+            accessors.routing.context_writes()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+    def is_connected(self):
+        """
+            Checks whether we are currently connected to a database
+        :return: Whether the connection pool exists
+        """
+        return self._database.is_connected()
+
+    def add_listener(self, listener):
+        """
+            Attach a query listener. See GenericDatabase.add_listener
+        :param listener: Callable taking a QueryEvent. Called on the executor threads
+        """
+        self._database.add_listener(listener)
+
+    def remove_listener(self, listener):
+        """
+            Detach a query listener
+        :param listener: Listener previously passed to add_listener
+        """
+        self._database.remove_listener(listener)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """
+            Open a transaction, see GenericDatabase.transaction. Transactions belong to a thread, so this yields an
+            AsyncGenericDatabase that runs every call on one dedicated thread. Only calls made through that object
+            are part of the transaction
+        :return: Async context manager yielding an AsyncGenericDatabase bound to the transaction
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="spidertools-db-tx")
+        bound = AsyncGenericDatabase(self._database, executor=executor)
+        manager = self._database.transaction()
+        try:
+            await bound.run(manager.__enter__)
+            try:
+                yield bound
+            except BaseException as e:
+                if not await bound.run(manager.__exit__, e.__class__, e, e.__traceback__):
+                    raise
+            else:
+                await bound.run(manager.__exit__, None, None, None)
+        finally:
+            executor.shutdown(wait=False)
+
+    async def reset_connection(self):
+        """
+            Reset the database connection pool. See GenericDatabase.reset_connection
+        """
+        await self.run(self._database.reset_connection)
+
+    async def verify_schema(self):
+        """
+            Verify the schema of the connected database. See GenericDatabase.verify_schema
+        :return: Dict of change counts
+        """
+        return await self.run(self._database.verify_schema)
+
+    async def get_item(self, type, *, order=None, default=None, **kwargs):
+        """
+            Get the first GenericDatabase compatible object from the database. See GenericDatabase.get_item
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param order: Parameter to pass into the ORDER BY clause
+        :param default: What to return if nothing is found. Defaults to None
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: An instance of type, or default
+        """
+        return await self.run(self._database.get_item, type, order=order, default=default, **kwargs)
+
+    async def get_items(self, type, *, limit=None, order=None, **kwargs):
+        """
+            Get a list of GenericDatabase compatible objects from the database. See GenericDatabase.get_items
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param limit: Maximum number of items to get
+        :param order: Parameter to pass to the ORDER BY clause
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: A list of type, may be empty if nothing found
+        """
+        return await self.run(self._database.get_items, type, limit=limit, order=order, **kwargs)
+
+    async def get_page(self, type, *, order, size, after=None, descending=False, **kwargs):
+        """
+            Get one page of GenericDatabase compatible objects using keyset pagination. See GenericDatabase.get_page
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param order: Column name or tuple of column names to order by
+        :param size: Number of items per page
+        :param after: Cursor from the previous Page, or None for the first page
+        :param descending: Whether to order from largest to smallest
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Page of items and a cursor for the next page
+        """
+        return await self.run(
+            self._database.get_page, type, order=order, size=size, after=after, descending=descending, **kwargs
+        )
+
+    async def iter_items(self, type, *, batch_size=1000, limit=None, order=None, **kwargs):
+        """
+            Stream GenericDatabase compatible objects from the database. See GenericDatabase.iter_items. Each batch
+            is fetched on the executor
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param batch_size: Number of rows to fetch from the server at a time
+        :param limit: Maximum number of items to get
+        :param order: Parameter to pass to the ORDER BY clause
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Async generator of type
+        """
+        batches = self._database.iter_batches(type, batch_size=batch_size, limit=limit, order=order, **kwargs)
+        try:
+            while True:
+                batch = await self.run(next, batches, None)
+                if batch is None:
+                    break
+                for item in batch:
+                    yield item
+        finally:
+            await self.run(batches.close)
+
+    async def get_count(self, type, **kwargs):
+        """
+            Get the number of given GenericDatabase objects in the database. See GenericDatabase.get_count
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        :return: Number of type in the database
+        """
+        return await self.run(self._database.get_count, type, **kwargs)
+
+    async def save_item(self, item):
+        """
+            Save any GenericDatabase compatible object to the database. See GenericDatabase.save_item
+        :param item: Item to save. May be a Row, a MultiRow, or any duck type of those two.
+        """
+        await self.run(self._database.save_item, item)
+
+    async def save_items(self, items, *, chunk_size=None):
+        """
+            Save many GenericDatabase compatible objects in batches. See GenericDatabase.save_items
+        :param items: Iterable of Rows, MultiRows, or iterables of those
+        :param chunk_size: Max number of rows per statement
+        """
+        await self.run(self._database.save_items, items, chunk_size=chunk_size)
+
+    async def remove_item(self, item, general=False):
+        """
+            Remove any GenericDatabase compatible object from the database. See GenericDatabase.remove_item
+        :param item: Item to remove. May be a Row, a MultiRow, or any duck type of those two.
+        :param general: Whether to delete all similar items
+        """
+        await self.run(self._database.remove_item, item, general)
+
+    async def remove_items(self, type, *, limit=None, order=None, **kwargs):
+        """
+            Remove GenericDatabase objects of a type matching the given parameters. See GenericDatabase.remove_items
+        :param type: GenericDatabase compatible type. Subclasses Row or duck types it
+        :param limit: Maximum number of items to delete
+        :param order: Parameter to pass into the ORDER BY clause
+        :param kwargs: Parameters to filter by. Are all ANDed together
+        """
+        await self.run(self._database.remove_items, type, limit=limit, order=order, **kwargs)
+
+    async def close(self):
+        """
+            Flush queued writes, close the database connection pool and shut down the executor
+        """
+        await self.run(self._database.close)
+        self._executor.shutdown(wait=False)
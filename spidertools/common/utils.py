@@ -4,6 +4,9 @@
     author: CraftSpider
 """
 
+import codecs
+import concurrent.futures
+import itertools
 import os
 import logging
 import traceback
@@ -452,26 +455,116 @@ def zero_pad(text, length):
     return out
 
 
-gen = parsers.TreeGen()
+parser_pool = parsers.ParserPool()
 
 
-def to_dom(html):
+def to_dom(html, keep=None):
     """
         Convert an HTML string into a new Document object
     :param html: HTML to parse
+    :param keep: Optional CSS selector or predicate. If given, only matching elements with their subtrees and
+                 ancestors are built, see parsers.TreeGen
     :return: new Document object from HTML
     """
-    gen.reset()
-    gen.feed(html)
-    return el.Document(gen.close()[0])
+    if keep is not None:
+        return el.Document(to_nodes(html, keep, ancestors=True)[0])
+    return el.Document(parser_pool.parse(html)[0])
 
 
-def to_nodes(html):
+def to_nodes(html, keep=None, *, ancestors=False):
     """
         Convert an HTML string into a list of head nodes
     :param html: HTML to parse
+    :param keep: Optional CSS selector or predicate. If given, only matching subtrees are built, see parsers.TreeGen
+    :param ancestors: Whether kept subtrees are attached to their ancestors instead of each being a head
     :return: list of head nodes in HTML
     """
-    gen.reset()
-    gen.feed(html)
-    return gen.close()
+    if keep is not None:
+        filtered = parsers.TreeGen(keep, ancestors=ancestors)
+        filtered.feed(html)
+        return filtered.close()
+    return parser_pool.parse(html)
+
+
+def _parse_flat(html, keep=None):
+    """
+        Parse an HTML string into the flattened head of its Document, in a parse_many worker process
+    :param html: HTML to parse
+    :param keep: Optional CSS selector or predicate, as for to_dom
+    :return: List from element.flatten, or None if nothing was parsed
+    """
+    heads = to_nodes(html, keep, ancestors=True)
+    return el.flatten(heads[0]) if heads else None
+
+
+def parse_many(htmls, workers=None, *, keep=None):
+    """
+        Convert many HTML strings into Documents, spreading the parsing over a pool of processes. Trees come back
+        from the workers in element.flatten's compact form and are rebuilt here
+    :param htmls: Iterable of HTML strings
+    :param workers: Number of worker processes, None for one per CPU. With one, parsing happens in this process
+    :param keep: Optional CSS selector or picklable predicate, as for to_dom
+    :return: List of Documents, None for inputs with nothing to parse, in input order
+    """
+    htmls = list(htmls)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(htmls) < 2:
+        out = []
+        for html in htmls:
+            heads = to_nodes(html, keep, ancestors=True)
+            out.append(el.Document(heads[0]) if heads else None)
+        return out
+
+    chunksize = max(1, len(htmls) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        flat = list(executor.map(_parse_flat, htmls, itertools.repeat(keep), chunksize=chunksize))
+    return [None if x is None else el.Document(el.unflatten(x)) for x in flat]
+
+
+async def to_dom_stream(chunks, *, encoding="utf-8", until=None, keep=None):
+    """
+        Parse HTML into a new Document as it arrives, decoding chunks incrementally so parsing overlaps the download.
+        Each stream has a parser of its own, so concurrent streams don't interfere
+    :param chunks: Async iterable of bytes, such as an aiohttp response's content.iter_any()
+    :param encoding: Charset of the bytes. Unknown charsets fall back to UTF-8, undecodable bytes are replaced
+    :param until: Optional callable taking the partial Document and the TreeGen, checked after each chunk. Once it
+                  returns True no more chunks are read. Elements the TreeGen reports as open may be incomplete
+    :param keep: Optional CSS selector or predicate. If given, only matching elements with their subtrees and
+                 ancestors are built, see parsers.TreeGen
+    :return: Tuple of the Document, or None if nothing was parsed, and whether the input was read to the end
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    if keep is None:
+        with parser_pool.parser() as stream_gen:
+            return await _feed_stream(stream_gen, chunks, decoder, until)
+    return await _feed_stream(parsers.TreeGen(keep, ancestors=True), chunks, decoder, until)
+
+
+async def _feed_stream(stream_gen, chunks, decoder, until):
+    """
+        Feed decoded chunks into a parser for to_dom_stream
+    :param stream_gen: TreeGen to feed, used by this stream alone
+    :param chunks: Async iterable of bytes
+    :param decoder: Incremental decoder for the chunks
+    :param until: Optional callable taking the partial Document and the TreeGen
+    :return: Tuple of the Document, or None if nothing was parsed, and whether the input was read to the end
+    """
+    doc = None
+    async for chunk in chunks:
+        stream_gen.feed(decoder.decode(chunk))
+        if until is None or not stream_gen.heads:
+            continue
+        if doc is None:
+            doc = el.Document(stream_gen.heads[0])
+        if until(doc, stream_gen):
+            return doc, False
+    stream_gen.feed(decoder.decode(b"", True))
+    heads = stream_gen.close()
+    if doc is None and heads:
+        doc = el.Document(heads[0])
+    return doc, True
+
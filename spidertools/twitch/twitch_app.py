@@ -3,6 +3,7 @@ import aiohttp
 import json
 import multidict
 
+from spidertools.common import clstools
 from . import types, constants as const
 
 
@@ -187,6 +188,7 @@ class TwitchApp:
         for item in data:
             self._oauths[item["login"]] = oauth
 
+    @clstools.invalidating_cache(method=True, maxsize=0)
     async def get_user(self, id=None, login=None):
         """
             Get the Twitch User associated with a given name
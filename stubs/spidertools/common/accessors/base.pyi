@@ -1,14 +1,21 @@
 
 import abc
+import collections
+import threading
 
-from typing import Tuple, Any, Iterable, List, Optional, Union, Dict
+from typing import Tuple, Any, Iterable, List, Optional, Union, Dict, Callable, ContextManager, Sequence, Hashable, TypeVar, Iterator
+from spidertools.common.accessors.pool import ConnectionPool
+from spidertools.common.accessors.stats import QueryEvent
 
 
 _Sql = Union[str, int, bool]
+_T = TypeVar("_T")
 
 
 ConnectionLost: object = ...
 
+def _group_indexes(rows: Iterable[Tuple[str, str, Any, str]]) -> List[Tuple[str, str, Tuple[str, ...], bool]]: ...
+
 
 class EmptyCursor:
 
@@ -43,14 +50,74 @@ class EmptyCursor:
 
     def fetchall(self) -> type(DEFAULT_ALL): ...
 
+class StatementCache:
+
+    __slots__ = ("maxsize", "_statements", "_lock")
+
+    maxsize: int
+    _statements: collections.OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = ...) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def get(self, key: Hashable, build: Callable[[], _T]) -> _T: ...
+
+    def clear(self) -> None: ...
+
 class DatabaseAccessor(abc.ABC):
 
-    __slots__ = ("_connection", "_cursor")
+    __slots__ = ("_pool", "_local", "_pool_args", "_schema_name", "_statements", "_listeners")
 
-    _connection: Any
-    _cursor: Any
+    _pool: Optional[ConnectionPool]
+    _local: threading.local
+    _pool_args: Dict[str, float]
+    _schema_name: Optional[str]
+    _statements: StatementCache
+    _listeners: Tuple[Callable[[QueryEvent], Any], ...]
 
-    def __init__(self) -> None: ...
+    TRANSACTIONAL_DDL: bool = ...
+
+    def __init__(self, *, min_size: int = ..., max_size: int = ..., idle_timeout: float = ...) -> None: ...
+
+    @property
+    def schema(self) -> str: ...
+
+    def invalidate_statements(self) -> None: ...
+
+    def _statement(self, verb: str, table: str, where: Optional[str] = ..., order: Optional[str] = ..., limit: Optional[Union[int, str]] = ...) -> str: ...
+
+    @property
+    def listening(self) -> bool: ...
+
+    def add_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def remove_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def _emit(self, event: QueryEvent) -> None: ...
+
+    def _run(self, cursor: Any, query: str, params: Any = ..., execute: Optional[Callable[[str, Any], Any]] = ...) -> Any: ...
+
+    @property
+    def _connection(self) -> Any: ...
+
+    @property
+    def _cursor(self) -> Any: ...
+
+    def _start_pool(self, factory: Callable[[], Any], first: Any = ...) -> None: ...
+
+    def checkout(self) -> ContextManager[Any]: ...
+
+    def dedicated_connection(self, discard_incomplete: bool = ...) -> ContextManager[Any]: ...
+
+    def transaction(self) -> ContextManager[Any]: ...
+
+    def in_transaction(self) -> bool: ...
+
+    def _mark_lost(self) -> None: ...
+
+    def check_connection(self, cnx: Any) -> bool: ...
 
     @abc.abstractmethod
     def create_connection(self, *, user: str, password: str, host: str, port: int, schema: str, autocommit: bool) -> None: ...
@@ -88,6 +155,8 @@ class DatabaseAccessor(abc.ABC):
     @abc.abstractmethod
     def get_columns(self, table: str) -> List[Tuple[_Sql, ...]]: ...
 
+    def get_all_columns(self) -> List[Tuple[_Sql, ...]]: ...
+
     @abc.abstractmethod
     def has_column(self, table: str, column: str) -> bool: ...
 
@@ -100,12 +169,20 @@ class DatabaseAccessor(abc.ABC):
     @abc.abstractmethod
     def insert(self, table: str, *, values: List[_Sql], names: Optional[List[str]] = ..., update: bool = ...) -> None: ...
 
+    def insert_many(self, table: str, *, rows: Sequence[Sequence[_Sql]], names: Optional[List[str]] = ..., update: bool = ..., chunk_size: int = ...) -> None: ...
+
+    def delete_many(self, table: str, *, names: Sequence[str], keys: Sequence[Sequence[_Sql]], chunk_size: int = ...) -> None: ...
+
     @abc.abstractmethod
     def count(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., limit: Optional[str] = ...) -> int: ...
 
+    def estimate_count(self, table: str) -> Optional[int]: ...
+
     @abc.abstractmethod
     def select(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ...) -> List[Tuple[_Sql, ...]]: ...
 
+    def select_iter(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ..., batch_size: int = ...) -> Iterator[List[Tuple[_Sql, ...]]]: ...
+
     @abc.abstractmethod
     def delete(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ...) -> None: ...
 
@@ -118,6 +195,17 @@ class DatabaseAccessor(abc.ABC):
     @abc.abstractmethod
     def drop_trigger(self, trigger: str) -> None: ...
 
+    @abc.abstractmethod
+    def create_index(self, name: str, table: str, columns: Sequence[str], *, unique: bool = ...) -> None: ...
+
+    @abc.abstractmethod
+    def get_indexes(self) -> List[Tuple[str, str, Tuple[str, ...], bool]]: ...
+
+    @abc.abstractmethod
+    def drop_index(self, table: str, name: str) -> None: ...
+
     def is_connected(self) -> bool: ...
 
+    def commit(self) -> None: ...
+
     def close(self) -> None: ...
@@ -1,7 +1,7 @@
 
 import spidertools.common.accessors.base as base
 
-from typing import Tuple, List, Optional, Union, Dict
+from typing import Tuple, List, Optional, Union, Dict, Any, Sequence, Iterator
 
 _Sql = Union[str, int, bool]
 _Sentinel: object = ...
@@ -16,6 +16,8 @@ class MysqlAccessor(base.DatabaseAccessor):
 
     def create_connection(self, *, user: str, password: str, host: str, port: int, schema: str, autocommit: bool) -> None: ...
 
+    def check_connection(self, cnx: Any) -> bool: ...
+
     def execute(self, query: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., multi: bool = ...) -> None: ...
 
     def get_schemata(self) -> List[Tuple[_Sql, ...]]: ...
@@ -44,14 +46,28 @@ class MysqlAccessor(base.DatabaseAccessor):
 
     def drop_column(self, table: str, column: str) -> None: ...
 
+    def _insert_parts(self, table: str, width: int, names: Optional[List[str]], update: bool) -> Tuple[str, str, str]: ...
+
     def insert(self, table: str, *, values: List[_Sql], names: Optional[List[str]] = ..., update: bool = ...) -> None: ...
 
+    def insert_many(self, table: str, *, rows: Sequence[Sequence[_Sql]], names: Optional[List[str]] = ..., update: bool = ..., chunk_size: int = ...) -> None: ...
+
     def count(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., limit: Optional[str] = ...) -> int: ...
 
+    def estimate_count(self, table: str) -> Optional[int]: ...
+
     def select(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ...) -> List[Tuple[_Sql, ...]]: ...
 
+    def select_iter(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ..., batch_size: int = ...) -> Iterator[List[Tuple[_Sql, ...]]]: ...
+
     def delete(self, table: str, *, where: str, params: Optional[Union[List[_Sql], Dict[str, _Sql]]] = ..., order: Optional[str] = ..., limit: Optional[str] = ...) -> None: ...
 
     def get_triggers(self) -> List[Tuple[_Sql, ...]]: ...
 
     def drop_trigger(self, trigger: str) -> None: ...
+
+    def create_index(self, name: str, table: str, columns: Sequence[str], *, unique: bool = ...) -> None: ...
+
+    def get_indexes(self) -> List[Tuple[str, str, Tuple[str, ...], bool]]: ...
+
+    def drop_index(self, table: str, name: str) -> None: ...
@@ -0,0 +1,48 @@
+import threading
+
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class ConnectionPool:
+
+    __slots__ = ("_factory", "_check", "min_size", "max_size", "idle_timeout", "check_after", "_idle", "_size",
+                 "_cond", "_closed", "_last_reap")
+
+    _factory: Callable[[], Any]
+    _check: Optional[Callable[[Any], bool]]
+    min_size: int
+    max_size: int
+    idle_timeout: float
+    check_after: float
+    _idle: List[Tuple[Any, float]]
+    _size: int
+    _cond: threading.Condition
+    _closed: bool
+    _last_reap: float
+
+    def __init__(self, factory: Callable[[], Any], *, min_size: int = ..., max_size: int = ..., idle_timeout: float = ..., check: Optional[Callable[[Any], bool]] = ..., check_after: float = ...) -> None: ...
+
+    @property
+    def size(self) -> int: ...
+
+    @property
+    def idle(self) -> int: ...
+
+    @property
+    def closed(self) -> bool: ...
+
+    def fill(self, first: Any = ...) -> None: ...
+
+    def acquire(self, timeout: Optional[float] = ...) -> Any: ...
+
+    def release(self, cnx: Any, *, discard: bool = ...) -> None: ...
+
+    def reap(self) -> int: ...
+
+    def close(self) -> None: ...
+
+    def _healthy(self, cnx: Any) -> bool: ...
+
+    def _discard(self, cnx: Any) -> None: ...
+
+def _close(cnx: Any) -> None: ...
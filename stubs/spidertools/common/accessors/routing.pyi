@@ -0,0 +1,61 @@
+import contextvars
+import itertools
+import logging
+import threading
+import spidertools.common.accessors.base as base
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from spidertools.common.accessors.stats import QueryEvent
+
+
+log: logging.Logger = ...
+_last_write: contextvars.ContextVar[Optional[Dict[int, float]]] = ...
+
+def context_writes() -> Dict[int, float]: ...
+
+def _in_use(accessor: base.DatabaseAccessor) -> int: ...
+
+class ReadRouter:
+
+    __slots__ = ("primary", "replicas", "strategy", "sticky_window", "retry_after", "_down", "_counter", "_tables",
+                 "_lock")
+
+    STRATEGIES: Tuple[str, ...] = ...
+
+    primary: base.DatabaseAccessor
+    replicas: List[base.DatabaseAccessor]
+    strategy: str
+    sticky_window: float
+    retry_after: float
+    _down: Dict[base.DatabaseAccessor, float]
+    _counter: itertools.count
+    _tables: Dict[str, float]
+    _lock: threading.Lock
+
+    def __init__(self, primary: base.DatabaseAccessor, replicas: Iterable[base.DatabaseAccessor], *, strategy: str = ..., sticky_window: float = ..., retry_after: float = ...) -> None: ...
+
+    def wrote(self, table: Optional[str] = ...) -> None: ...
+
+    def recent(self, table: str) -> bool: ...
+
+    def sticky(self) -> bool: ...
+
+    def available(self) -> List[base.DatabaseAccessor]: ...
+
+    def choose(self) -> base.DatabaseAccessor: ...
+
+    def mark_down(self, replica: base.DatabaseAccessor, error: BaseException) -> None: ...
+
+    def read(self, method: str, *args: Any, **kwargs: Any) -> Any: ...
+
+    def stream(self, method: str, *args: Any, **kwargs: Any) -> Iterator[Any]: ...
+
+    def connect(self, addresses: Iterable[Tuple[str, int]], **kwargs: Any) -> None: ...
+
+    def add_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def remove_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def invalidate_statements(self) -> None: ...
+
+    def close(self) -> None: ...
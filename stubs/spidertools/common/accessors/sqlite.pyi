@@ -0,0 +1,100 @@
+import re
+import sqlite3
+import spidertools.common.accessors.base as base
+
+from typing import Tuple, List, Optional, Union, Dict, Any, Sequence, Iterator
+
+_Sql = Union[str, int, bool]
+
+_Sentinel: object = ...
+_param: re.Pattern = ...
+
+def _transform_type(t: str) -> str: ...
+
+def _convert_params(query: str) -> str: ...
+
+def _pad(values: Sequence[Any], length: int) -> Tuple[Any, ...]: ...
+
+class _Connection(sqlite3.Connection):
+
+    @property
+    def autocommit(self) -> bool: ...
+    @autocommit.setter
+    def autocommit(self, value: bool) -> None: ...
+
+class SqliteAccessor(base.DatabaseAccessor):
+
+    __slots__ = ("_schema",)
+
+    _schema: str
+
+    TRANSACTIONAL_DDL: bool = ...
+    CACHE_SIZE: int = ...
+    MMAP_SIZE: int = ...
+    BUSY_TIMEOUT: float = ...
+
+    def create_connection(self, *, user: str, password: str, host: str, port: int, schema: str, autocommit: bool) -> bool: ...
+
+    def check_connection(self, cnx: _Connection) -> bool: ...
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = ..., multi: bool = ...) -> Any: ...
+
+    def get_schemata(self) -> List[Tuple[_Sql, ...]]: ...
+
+    def current_schema(self) -> str: ...
+
+    def create_schema(self, schema: str) -> None: ...
+
+    def has_schema(self, schema: str) -> bool: ...
+
+    def create_table(self, name: str, columns: List[Dict[str, _Sql]], primary_keys: Optional[List[str]] = ..., foreign_keys: Optional[List[Dict[str, str]]] = ...) -> None: ...
+
+    def get_tables(self) -> List[Tuple[_Sql, ...]]: ...
+
+    def has_table(self, name: str) -> bool: ...
+
+    def drop_table(self, name: str) -> None: ...
+
+    def add_column(self, table: str, column: Dict[str, _Sql], *, after: Optional[str] = ...) -> None: ...
+
+    def _column_info(self, table: str, row: Tuple[_Sql, ...]) -> Tuple[_Sql, ...]: ...
+
+    def get_columns(self, table: str) -> List[Tuple[_Sql, ...]]: ...
+
+    def get_all_columns(self) -> List[Tuple[_Sql, ...]]: ...
+
+    def has_column(self, table: str, column: str) -> bool: ...
+
+    def alter_column(self, table: str, column: Dict[str, _Sql]) -> None: ...
+
+    def drop_column(self, table: str, column: str) -> None: ...
+
+    def get_primary_keys(self, table: str) -> Tuple[str, ...]: ...
+
+    def _insert_parts(self, table: str, width: int, names: Optional[List[str]], update: bool) -> Tuple[str, str, str]: ...
+
+    def insert(self, table: str, *, values: Sequence[_Sql], names: Optional[Sequence[str]] = ..., update: bool = ...) -> Any: ...
+
+    def insert_many(self, table: str, *, rows: Sequence[Sequence[_Sql]], names: Optional[Sequence[str]] = ..., update: bool = ..., chunk_size: int = ...) -> None: ...
+
+    def count(self, table: str, *, where: str, params: Optional[Dict[str, _Sql]] = ..., limit: Optional[int] = ...) -> int: ...
+
+    def estimate_count(self, table: str) -> Optional[int]: ...
+
+    def select(self, table: str, *, where: str, params: Optional[Dict[str, _Sql]] = ..., order: Optional[str] = ..., limit: Optional[int] = ...) -> List[Tuple[_Sql, ...]]: ...
+
+    def select_iter(self, table: str, *, where: str, params: Optional[Dict[str, _Sql]] = ..., order: Optional[str] = ..., limit: Optional[int] = ..., batch_size: int = ...) -> Iterator[List[Tuple[_Sql, ...]]]: ...
+
+    def delete(self, table: str, *, where: str, params: Optional[Dict[str, _Sql]] = ..., order: Optional[str] = ..., limit: Optional[int] = ...) -> None: ...
+
+    def create_trigger(self, name: str, cause: str, table: str, for_each: str, text: str) -> None: ...
+
+    def get_triggers(self) -> List[Tuple[_Sql, ...]]: ...
+
+    def drop_trigger(self, trigger: str) -> None: ...
+
+    def create_index(self, name: str, table: str, columns: Sequence[str], *, unique: bool = ...) -> None: ...
+
+    def get_indexes(self) -> List[Tuple[str, str, Tuple[str, ...], bool]]: ...
+
+    def drop_index(self, table: str, name: str) -> None: ...
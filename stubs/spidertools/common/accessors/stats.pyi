@@ -0,0 +1,75 @@
+import logging
+import re
+import threading
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+log: logging.Logger = ...
+
+BUCKETS: Tuple[float, ...] = ...
+
+class QueryEvent(NamedTuple):
+    statement: str
+    operation: Optional[str]
+    table: Optional[str]
+    duration: float
+    rows: Optional[int]
+    cached: Optional[bool]
+    error: Optional[BaseException]
+
+_placeholder_list: re.Pattern = ...
+_repeated_group: re.Pattern = ...
+_number: re.Pattern = ...
+_space: re.Pattern = ...
+_table: re.Pattern = ...
+
+def describe(statement: str) -> Tuple[str, str, Optional[str]]: ...
+
+class StatementStats:
+
+    __slots__ = ("statement", "operation", "table", "count", "errors", "total", "max", "rows", "hits", "misses",
+                 "buckets")
+
+    statement: str
+    operation: str
+    table: Optional[str]
+    count: int
+    errors: int
+    total: float
+    max: float
+    rows: int
+    hits: int
+    misses: int
+    buckets: List[int]
+
+    def __init__(self, statement: str, operation: str, table: Optional[str]) -> None: ...
+
+    @property
+    def mean(self) -> float: ...
+
+    def add(self, event: QueryEvent) -> None: ...
+
+    def percentile(self, fraction: float) -> float: ...
+
+    def to_dict(self) -> Dict[str, Any]: ...
+
+class QueryStats:
+
+    __slots__ = ("slow_threshold", "_stats", "_lock")
+
+    slow_threshold: Optional[float]
+    _stats: Dict[str, StatementStats]
+    _lock: threading.Lock
+
+    def __init__(self, slow_threshold: Optional[float] = ...) -> None: ...
+
+    def __call__(self, event: QueryEvent) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def get(self, statement: str) -> Optional[StatementStats]: ...
+
+    def dump(self) -> List[Dict[str, Any]]: ...
+
+    def reset(self) -> None: ...
@@ -1,9 +1,14 @@
 
-from typing import Tuple, Dict, List, Union, Sequence, Any
+from typing import Tuple, Dict, List, Union, Sequence, Any, Optional, Callable
 from spidertools.common.element import Document, Element
+from spidertools.common.parsers import TreeGen
 import aiohttp
 import io
 
+def _smbc_list_loaded(doc: Document, parser: TreeGen) -> bool: ...
+
+def _smbc_loaded(doc: Document, parser: TreeGen) -> bool: ...
+
 class TalosHTTPClient:
 
     __slots__ = ("nano_tries", "last_guild_count", "__tokens", "client", "_args", "_kwargs")
@@ -29,7 +34,9 @@ class TalosHTTPClient:
 
     async def close(self) -> None: ...
 
-    async def get_site(self, url: str, **kwargs: Any) -> Document: ...
+    async def _stream_dom(self, response: aiohttp.ClientResponse, until: Optional[Callable[[Document, TreeGen], bool]] = ..., keep: Union[str, Callable[[Element], bool], None] = ...) -> Optional[Document]: ...
+
+    async def get_site(self, url: str, *, until: Optional[Callable[[Document, TreeGen], bool]] = ..., **kwargs: Any) -> Optional[Document]: ...
 
     async def server_post_commands(self, commands: Dict[str, Any]) -> None: ...
 
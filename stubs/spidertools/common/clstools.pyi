@@ -1,5 +1,10 @@
 
-from typing import Callable, Any, TypeVar, Optional, Tuple, Dict, FrozenSet, Union, Iterable, List, Set
+import asyncio
+import collections
+import threading
+import weakref
+
+from typing import Awaitable, Callable, Any, TypeVar, Optional, Tuple, Dict, Union, Iterable, List, Set, Hashable, NamedTuple, Sequence
 
 
 _T = TypeVar("_T")
@@ -24,14 +29,90 @@ def decorator(func: Callable[[_T], _V]) -> Callable[[_T], _V]: ...
 
 def noarg_decorator(func: Callable[[_T], _V]) -> Callable[[_T], _V]: ...
 
-_caches: Dict[Callable[[Any], Any], Any] = ...
+_caches: Dict[Callable[..., Any], CacheGroup] = ...
+_Missing: object = ...
+_kwd_mark: object = ...
+_fast_types: Set[type] = ...
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    currsize: int
 
 def _make_unique(key: Union[int, str], val: Any) -> Tuple[Union[int, str], Any]: ...
 
-def _make_key(args: Any, kwargs: Any) -> FrozenSet[Tuple[Union[int, str], Any]]: ...
+def _make_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Hashable: ...
+
+def _split_key(key: Hashable) -> Tuple[Tuple[Any, ...], Dict[str, Any]]: ...
+
+class CallCache:
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "version", "flights", "_entries", "_values", "_types", "_lock")
+
+    maxsize: Optional[int]
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    version: int
+    flights: Dict[Hashable, asyncio.Task]
+    _entries: collections.OrderedDict
+    _values: Dict[Tuple[Union[int, str], Any], Set[Hashable]]
+    _types: Dict[Tuple[Union[int, str], type], Set[Hashable]]
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: Optional[int] = ..., ttl: Optional[float] = ...) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def get(self, key: Hashable, default: _T = ...) -> Union[Any, _T]: ...
+
+    def put(self, key: Hashable, value: Any) -> None: ...
+
+    def _index(self, key: Hashable, add: bool) -> None: ...
+
+    def pop(self, key: Hashable) -> None: ...
+
+    def matching(self, position: Union[int, str], value: Any, generic: bool = ...) -> Set[Hashable]: ...
+
+    def invalidate(self, keys: Optional[Iterable[Hashable]] = ...) -> None: ...
+
+    def keys(self) -> List[Hashable]: ...
+
+    def clear(self) -> None: ...
+
+def _drop_instance(instances: Dict[int, Tuple[weakref.ref, CallCache]], key: int, ref: weakref.ref) -> None: ...
+
+class CacheGroup:
+
+    __slots__ = ("maxsize", "ttl", "method", "shared", "_instances")
+
+    maxsize: Optional[int]
+    ttl: Optional[float]
+    method: bool
+    shared: CallCache
+    _instances: Optional[Dict[int, Tuple[weakref.ref, CallCache]]]
+
+    def __init__(self, maxsize: Optional[int] = ..., ttl: Optional[float] = ..., method: bool = ...) -> None: ...
+
+    def _get(self, instance: Any) -> Optional[CallCache]: ...
+
+    def cache(self, instance: Any) -> Optional[CallCache]: ...
+
+    def caches(self, instance: Any = ...) -> List[CallCache]: ...
+
+    def info(self) -> CacheInfo: ...
+
+    def clear(self) -> None: ...
+
+def _retrieve(task: asyncio.Task) -> None: ...
+
+async def _fill(cache: CallCache, key: Hashable, coro: Awaitable[_T], version: int) -> _T: ...
+
+async def _single_flight(cache: CallCache, key: Hashable, call: Callable[[], Awaitable[_T]]) -> _T: ...
 
-def invalidating_cache(*, method: bool = ...) -> Callable[[Any], Any]: ...
+def invalidating_cache(*, method: bool = ..., maxsize: Optional[int] = ..., ttl: Optional[float] = ...) -> Callable[[Any], Any]: ...
 
-def _check_cache(to_check: Iterable[Union[int, str]], args: Union[List[Any], Dict[str, Any]], cache: Dict[FrozenSet[Any], Any], generic: bool) -> Set[FrozenSet[Any]]: ...
+def _check_cache(to_check: Iterable[Union[int, str]], args: Union[Sequence[Any], Dict[str, Any]], cache: CallCache, generic: bool, offset: int = ...) -> Set[Hashable]: ...
 
-def cache_invalidator(*, func: Optional[Callable[[Any], Any]] = ..., method: bool = ..., args: Optional[Tuple[int, ...]] = ..., kwargs: Optional[Tuple[str, ...]] = ...) -> Callable[[Any], Any]: ...
+def cache_invalidator(*, func: Optional[Callable[[Any], Any]] = ..., method: bool = ..., args: Optional[Tuple[int, ...]] = ..., kwargs: Optional[Tuple[str, ...]] = ..., generic: bool = ...) -> Callable[[Any], Any]: ...
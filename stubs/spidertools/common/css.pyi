@@ -0,0 +1,69 @@
+
+from typing import List, Optional, Tuple, Callable, Iterator, Pattern
+from spidertools.common import element as el
+
+_token: Pattern = ...
+_nth: Pattern = ...
+
+_Test = Callable[[el.Element], bool]
+_Steps = List[Tuple['Compound', Optional[str]]]
+
+class SelectorError(ValueError): ...
+
+def _attr_value(element: el.Element, name: str) -> Optional[str]: ...
+
+def _classes(element: el.Element) -> List[str]: ...
+
+def _position(element: el.Element, last: bool = ...) -> int: ...
+
+def _previous(element: el.Element) -> Iterator[el.Element]: ...
+
+def _parse_nth(arg: str) -> Tuple[int, int]: ...
+
+def _nth_test(a: int, b: int, last: bool) -> _Test: ...
+
+def _attr_test(name: str, op: Optional[str], value: Optional[str], ignore_case: bool) -> _Test: ...
+
+_pseudos: dict = ...
+
+class Compound:
+
+    __slots__ = ("tag", "ids", "classes", "tests", "positional")
+
+    tag: Optional[str]
+    ids: List[str]
+    classes: List[str]
+    tests: List[_Test]
+    positional: bool
+
+    def __init__(self) -> None: ...
+
+    def __bool__(self) -> bool: ...
+
+    def __call__(self, element: el.Element) -> bool: ...
+
+class Selector:
+
+    __slots__ = ("text", "groups")
+
+    text: str
+    groups: List[_Steps]
+
+    def __init__(self, text: str, groups: List[_Steps]) -> None: ...
+
+    def __repr__(self) -> str: ...
+
+    @staticmethod
+    def _match(element: el.Element, steps: _Steps, i: int) -> bool: ...
+
+    def matches(self, element: el.Node) -> bool: ...
+
+    def positional(self) -> bool: ...
+
+    def candidates(self, index: el.DocumentIndex) -> Optional[List[el.Element]]: ...
+
+    def iter(self, root: el.Node, inclusive: bool = ...) -> Iterator[el.Element]: ...
+
+def _parse(text: str) -> List[_Steps]: ...
+
+def compile_selector(text: str) -> Selector: ...
@@ -1,5 +1,5 @@
 
-from typing import Dict, List, Any, Sequence, Union, Iterable, Optional, Iterator
+from typing import Dict, List, Any, Sequence, Union, Iterable, Optional, Iterator, Callable, Type, TypeVar, Tuple
 import abc
 import datetime as dt
 import discord.ext.commands as commands
@@ -11,13 +11,27 @@ class _EmptyVal:
     def __eq__(self, other: Any) -> bool: ...
 
 _Empty: _EmptyVal = ...
+_R = TypeVar("_R", bound='Row')
+
+def _compile_row(cls: type) -> Dict[str, Callable[..., Any]]: ...
+
+def _sql_safe(value: Any) -> Union[str, int]: ...
 
 class Row(metaclass=abc.ABCMeta):
 
     __slots__ = ()
 
+    _fill: Callable[['Row', SqlRow], None]
+    _fill_bool: Callable[['Row', SqlRow], None]
+    _from_rows: Optional[Callable[[type, Iterable[SqlRow]], List['Row']]]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None: ...
+
     def __init__(self, row: SqlRow, conv_bool: bool = ...) -> None: ...
 
+    @classmethod
+    def from_rows(cls: Type[_R], rows: Iterable[SqlRow], conv_bool: bool = ...) -> List[_R]: ...
+
     def __str__(self) -> str: ...
 
     def __repr__(self) -> str: ...
@@ -100,3 +114,12 @@ class Trigger(Row):
                  "action_timing", "action_reference_old_table", "action_reference_new_table",
                  "action_reference_old_row", "action_reference_new_row", "created", "sql_mode", "definer",
                  "character_set_client", "collation_connection", "database_collation")
+
+class Index(Row):
+
+    __slots__ = ("table_name", "name", "columns", "unique")
+
+    table_name: str
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool
@@ -1,7 +1,20 @@
 
-from typing import List, Dict, Optional, Any, Iterator, NoReturn, Container, Union
+from typing import List, Dict, Optional, Any, Iterator, NoReturn, Container, Union, Callable, TypeVar, Tuple, Set, Sequence
 import abc
 
+_T = TypeVar("_T")
+
+
+def _cached(func: Callable[['Node'], _T]) -> Callable[['Node'], _T]: ...
+
+def flatten(node: 'Node') -> List[Union[Tuple[str, Dict[str, Any], int], str]]: ...
+
+def unflatten(data: Sequence[Union[Tuple[str, Dict[str, Any], int], str]]) -> 'Node': ...
+
+def _walk(node: 'Node') -> Iterator['Element']: ...
+
+def _path(node: 'Node') -> List[int]: ...
+
 
 class Document:
 
@@ -15,6 +28,8 @@ class Document:
 
     def _depth_iterator(self, start: 'Node' = ...) -> Iterator['Node']: ...
 
+    def _indexed(self, start: Optional['Node'] = ...) -> Optional['DocumentIndex']: ...
+
     def get_by_tag(self, tag: str, start: Optional['Element'] = ...) -> List['Element']: ...
 
     def get_by_id(self, nid: str) -> Optional['Element']: ...
@@ -25,23 +40,59 @@ class Document:
 
     def get_first_by_class(self, classname: str, start: 'Node' = ...) -> Optional['Element']: ...
 
+    def select(self, selector: str) -> List['Element']: ...
+
+    def select_one(self, selector: str) -> Optional['Element']: ...
+
     def compare_ignoring(self, doc: 'Document', *, tags: Container[str] = ..., attrs: Container[str] = ..., content: bool = ...) -> bool: ...
 
     def _compare_ignoring(self, el1: 'Node', el2: 'Node', *, tags: Container[str], attrs: Container[str], content: bool) -> bool: ...
 
+class DocumentIndex:
+
+    __slots__ = ("head", "maps", "_unordered")
+
+    KINDS: Tuple[str, ...] = ...
+
+    head: 'Element'
+    maps: Dict[str, Dict[str, List['Element']]]
+    _unordered: Set[Tuple[str, str]]
+
+    def __init__(self, head: 'Element') -> None: ...
+
+    @staticmethod
+    def _entries(element: 'Element') -> List[Tuple[str, str]]: ...
+
+    def add(self, node: 'Node', ordered: bool = ...) -> None: ...
+
+    def remove(self, node: 'Node') -> None: ...
+
+    def _items(self, kind: str, key: str) -> Sequence['Element']: ...
+
+    def get(self, kind: str, key: str) -> List['Element']: ...
+
+    def first(self, kind: str, key: str) -> Optional['Element']: ...
+
 class Node(abc.ABC):
 
-    __slots__ = ("parent", "child_nodes", "_pos_map")
+    __slots__ = ("parent", "child_nodes", "_pos_map", "_depth", "_cache", "_index")
 
     parent: Optional['Node']
     child_nodes: List['Node']
     _pos_map: Dict['Node', int]
+    _depth: Optional[int]
+    _cache: Optional[Dict[str, str]]
+    _index: Optional[DocumentIndex]
 
     def __init__(self) -> None: ...
 
     @property
     def depth(self) -> int: return
 
+    def _changed(self) -> None: ...
+
+    def _moved(self) -> None: ...
+
     @property
     def first_child(self) -> Optional['Node']: return
 
@@ -90,12 +141,18 @@ class Node(abc.ABC):
 
 class Content(Node):
 
-    __slots__ = ("value",)
+    __slots__ = ("_value",)
 
-    value: str
+    _value: str
 
     def __init__(self, data: str) -> None: ...
 
+    @property
+    def value(self) -> str: ...
+
+    @value.setter
+    def value(self, value: str) -> None: ...
+
     def __str__(self) -> str: ...
 
     def __repr__(self) -> str: ...
@@ -170,6 +227,10 @@ class Element(Node):
      @outerhtml.setter
      def outerhtml(self, value) -> None: ...
 
+     def select(self, selector: str) -> List['Element']: ...
+
+     def select_one(self, selector: str) -> Optional['Element']: ...
+
      def get_attribute(self, attr: str, default: Any = ...) -> Optional[str]: ...
 
      def has_class(self, classname: str) -> bool: ...
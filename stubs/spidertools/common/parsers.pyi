@@ -1,21 +1,36 @@
 
-from typing import Tuple, Dict, List, Iterable, Union, Optional, Sequence, overload, TypeVar
+from typing import Tuple, Dict, List, Iterable, Union, Optional, Sequence, overload, TypeVar, Callable
 from spidertools.common.element import Node, Element
+import contextlib
 import html.parser as parser
+import threading
 
 def attrs_to_dict(attrs: Iterable[Tuple[str, str]]) -> Dict[str, Union[str, List[str]]]: ...
 
 class TreeGen(parser.HTMLParser):
 
+    keep: Optional[Callable[[Element], bool]]
+    ancestors: bool
     heads: List[Element]
     cur: Optional[Node]
+    _text: List[str]
+    _open: List[List[Union[Element, bool]]]
+    _inside: int
 
-    def __init__(self) -> None: ...
+    def __init__(self, keep: Union[str, Callable[[Element], bool], None] = ..., *, ancestors: bool = ...) -> None: ...
 
     def reset(self) -> None: ...
 
     def close(self) -> List[Element]: ...
 
+    def _flush(self) -> None: ...
+
+    def is_open(self, node: Node) -> bool: ...
+
+    def _attach(self) -> Element: ...
+
+    def _filtered_start(self, tag: str, attrs: Sequence[Tuple[str, str]]) -> None: ...
+
     def error(self, message: str) -> None: ...
 
     def handle_starttag(self, tag: str, attrs: Tuple[Tuple[str, str]]) -> None: ...
@@ -24,6 +39,29 @@ class TreeGen(parser.HTMLParser):
 
     def handle_data(self, data: str) -> None: ...
 
+    def handle_comment(self, data: str) -> None: ...
+
+class ParserPool:
+
+    __slots__ = ("max_idle", "_idle", "_lock")
+
+    max_idle: int
+    _idle: List[TreeGen]
+    _lock: threading.Lock
+
+    def __init__(self, max_idle: int = ...) -> None: ...
+
+    @property
+    def idle(self) -> int: ...
+
+    def acquire(self) -> TreeGen: ...
+
+    def release(self, gen: TreeGen) -> None: ...
+
+    def parser(self) -> contextlib.AbstractContextManager[TreeGen]: ...
+
+    def parse(self, html: str) -> List[Node]: ...
+
 _KT = TypeVar("_KT")
 
 class _Sentinel:
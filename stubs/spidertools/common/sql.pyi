@@ -1,26 +1,205 @@
 
-from typing import Tuple, Dict, List, Union, Optional, Any, Iterable, TypeVar, Type, FrozenSet, Callable, Sequence
+import collections
+import concurrent.futures
+import threading
+
+from typing import AsyncContextManager, ContextManager, AsyncIterator, Iterator, Awaitable, NamedTuple, Hashable, Tuple, Dict, List, Union, Optional, Any, Iterable, TypeVar, Type, FrozenSet, Callable, Sequence, Set
 from spidertools.common.data import *
-from spidertools.common.accessors import base
+from spidertools.common.accessors import base, routing
+from spidertools.common.accessors.stats import QueryEvent
 import mysql.connector.cursor_cext as cursor_cext
 import mysql.connector.abstracts as mysql_abstracts
 
 _T = TypeVar("_T")
 _Row = TypeVar("_Row", bound=Row)
 
+def _and_from_shape(shape: Tuple[Tuple[str, bool], ...]) -> str: ...
+
 def and_from_dict(kwargs: Dict[str, Any]) -> str: ...
 
 def key_from_dict(kwargs: Dict[str, Any]) -> FrozenSet[str]: ...
 
+_Missing: object = ...
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+class Page(NamedTuple):
+    items: List[Any]
+    cursor: Optional[str]
+
+def _make_rows(type: Type[_Row], rows: Sequence[Sequence[Any]]) -> List[_Row]: ...
+
+class SchemaChange(NamedTuple):
+    action: str
+    table: Optional[str]
+    name: Optional[str]
+    detail: Any
+
+class IndexAdvice(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]
+    count: int
+
+class BufferInfo(NamedTuple):
+    depth: int
+    writes: int
+    coalesced: int
+    flushes: int
+    rows_flushed: int
+    last_flush: float
+    max_flush: float
+    total_flush: float
+
+def _normalize_value(value: Any) -> Any: ...
+
+def _encode_cursor(values: List[Any]) -> str: ...
+
+def _decode_cursor(cursor: str, length: int) -> List[Any]: ...
+
+def _seek_from_keys(keys: Tuple[str, ...], descending: bool) -> str: ...
+
+def _index_spec(table: str, index: Union[str, Sequence[str], Dict[str, Any]]) -> Tuple[str, Tuple[str, ...], bool]: ...
+
 _caches: Dict[Callable, Dict[type, Dict[FrozenSet[str], Any]]] = ...
 
 def cached(func: Callable[[Any, Type[Row], Any, Any], Any]) -> Callable[[Any, Type[Row], Any, Any], Any]: ...
 
 def invalidate(func: Callable[[Any, _Row, Any, Any], _Row]) -> Callable[[Any, _Row, Any, Any], _Row]: ...
 
+class QueryCache:
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "evictions", "_entries", "_generations", "_lock")
+
+    maxsize: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    evictions: int
+    _entries: collections.OrderedDict
+    _generations: Dict[str, int]
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = ..., ttl: Optional[float] = ...) -> None: ...
+
+    def key(self, table: str, *parts: Hashable) -> Optional[Tuple[Hashable, ...]]: ...
+
+    def get(self, key: Tuple[Hashable, ...], default: _T = ...) -> Union[Any, _T]: ...
+
+    def put(self, key: Tuple[Hashable, ...], value: Any) -> None: ...
+
+    def invalidate(self, table: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def info(self) -> CacheInfo: ...
+
+    def reset_stats(self) -> None: ...
+
+class IndexAdvisor:
+
+    __slots__ = ("_seen", "_lock")
+
+    _seen: collections.Counter
+    _lock: threading.Lock
+
+    def __init__(self) -> None: ...
+
+    def record(self, table: str, columns: Iterable[str]) -> None: ...
+
+    def seen(self) -> Dict[Tuple[str, Tuple[str, ...]], int]: ...
+
+    def report(self, indexes: Dict[str, List[Tuple[Tuple[str, ...], bool]]]) -> List[IndexAdvice]: ...
+
+    def reset(self) -> None: ...
+
+_Filter = Tuple[Tuple[str, Any], ...]
+
+class CountTracker:
+
+    __slots__ = ("_tables", "_versions", "_lock", "_write_locks", "_writing")
+
+    _tables: Dict[str, Dict[_Filter, List[Any]]]
+    _versions: Dict[str, int]
+    _lock: threading.Lock
+    _write_locks: Dict[str, threading.Lock]
+    _writing: Dict[str, int]
+
+    def __init__(self) -> None: ...
+
+    def write_lock(self, table: str) -> threading.Lock: ...
+
+    def track(self, table: str, filter: _Filter, refresh: Optional[float] = ...) -> None: ...
+
+    def untrack(self, table: str, filter: _Filter) -> None: ...
+
+    def tracking(self, table: str, filter: Optional[_Filter] = ...) -> bool: ...
+
+    def version(self, table: str) -> int: ...
+
+    def get(self, table: str, filter: _Filter) -> Optional[int]: ...
+
+    def begin(self, table: str) -> None: ...
+
+    def set(self, table: str, filter: _Filter, value: int, version: int) -> None: ...
+
+    def adjust(self, table: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None: ...
+
+    def stale(self, table: str) -> None: ...
+
+class WriteBuffer:
+
+    __slots__ = ("max_size", "interval", "writes", "coalesced", "flushes", "rows_flushed", "last_flush", "max_flush",
+                 "total_flush", "_tables", "_depth", "_lock", "_flush_lock", "_stop")
+
+    max_size: int
+    interval: Optional[float]
+    writes: int
+    coalesced: int
+    flushes: int
+    rows_flushed: int
+    last_flush: float
+    max_flush: float
+    total_flush: float
+    _tables: Dict[str, List[Any]]
+    _depth: int
+    _lock: threading.Lock
+    _flush_lock: threading.Lock
+    _stop: threading.Event
+
+    def __init__(self, max_size: int = ..., interval: Optional[float] = ...) -> None: ...
+
+    @property
+    def depth(self) -> int: ...
+
+    def add(self, table: str, names: List[str], indices: List[int], values: List[Any]) -> bool: ...
+
+    def get(self, table: str, key: Tuple[Any, ...]) -> Optional[Tuple[List[str], List[Any]]]: ...
+
+    def discard(self, table: str, keys: Iterable[Tuple[Any, ...]]) -> None: ...
+
+    def pending(self, table: Optional[str] = ...) -> bool: ...
+
+    def take(self, table: Optional[str] = ...) -> Dict[str, List[Any]]: ...
+
+    def restore(self, tables: Dict[str, List[Any]]) -> None: ...
+
+    def record_flush(self, rows: int, duration: float) -> None: ...
+
+    def info(self) -> BufferInfo: ...
+
+def _flush_loop(ref: Callable[[], Optional[GenericDatabase]], buffer: WriteBuffer) -> None: ...
+
+def _flush_at_exit(ref: Callable[[], Optional[GenericDatabase]]) -> None: ...
+
 class GenericDatabase:
 
-    __slots__ = ("_accessor", "_username", "_password", "_schema", "_host", "_port", "_schemadef")
+    __slots__ = ("_accessor", "_username", "_password", "_schema", "_host", "_port", "_schemadef", "chunk_size",
+                 "cache", "buffer", "advisor", "counts", "_replicas", "_router", "_local", "__weakref__")
 
     _accessor: base.DatabaseAccessor
     _username: str
@@ -29,13 +208,52 @@ class GenericDatabase:
     _host: str
     _port: int
     _schemadef: Dict[str, Dict[str, Any]]
+    chunk_size: int
+    cache: QueryCache
+    buffer: Optional[WriteBuffer]
+    advisor: Optional[IndexAdvisor]
+    counts: CountTracker
+    _replicas: List[Tuple[str, int]]
+    _router: Optional[routing.ReadRouter]
+    _local: threading.local
+
+    def __init__(self, address: str, port: int, username: str, password: str, schema: str, schemadef: Dict[str, Dict[str, Any]], *, connect: bool = ..., min_connections: int = ..., max_connections: int = ..., idle_timeout: float = ..., chunk_size: int = ..., cache_size: int = ..., cache_ttl: Optional[float] = ..., write_behind: bool = ..., flush_size: int = ..., flush_interval: Optional[float] = ..., replicas: Optional[Iterable[Tuple[str, int]]] = ..., read_strategy: str = ..., sticky_window: float = ..., replica_retry: float = ..., index_advisor: bool = ...) -> None: ...
+
+    def plan_schema(self) -> Optional[List[SchemaChange]]: ...
+
+    def _has_default(self, table: str, names: List[str], values: Sequence[Any], primary: Sequence[str],
+                     serial: Set[str]) -> bool: ...
 
-    def __init__(self, address: str, port: int, username: str, password: str, schema: str, schemadef: Dict[str, Dict[str, Any]], *, connect: bool = ...) -> None: ...
+    def _apply_change(self, change: SchemaChange) -> None: ...
 
-    def verify_schema(self) -> Dict[str, int]: ...
+    def verify_schema(self) -> Optional[Dict[str, int]]: ...
 
     def commit(self) -> bool: ...
 
+    def flush(self, table: Optional[str] = ...) -> int: ...
+
+    def close(self) -> None: ...
+
+    def _pending_item(self, type: Type[_Row], table_name: str, kwargs: Dict[str, Any]) -> Optional[_Row]: ...
+
+    def _flush_pending(self, table: str) -> None: ...
+
+    def transaction(self) -> ContextManager[GenericDatabase]: ...
+
+    def in_transaction(self) -> bool: ...
+
+    def add_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def remove_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def _cache_event(self, kind: str, table: str, start: float, rows: int, hit: bool) -> None: ...
+
+    def _invalidate(self, table: str, counted: bool = ...) -> None: ...
+
+    def _cache_key(self, table: str, *parts: Hashable) -> Optional[Tuple[Hashable, ...]]: ...
+
+    def _read(self, method: str, *args: Any, **kwargs: Any) -> Any: ...
+
     def is_connected(self) -> bool: ...
 
     def reset_connection(self) -> None: ...
@@ -60,16 +278,90 @@ class GenericDatabase:
 
     def get_triggers(self) -> List[Trigger]: ...
 
+    def get_indexes(self) -> List[Index]: ...
+
+    def index_advice(self) -> Optional[List[IndexAdvice]]: ...
+
     # Generic methods
 
-    def get_item(self, type: Type[_Row], *, order: str = ..., default: _T = ..., **kwargs: Any) -> Union[_Row, _T]: ...
+    def get_item(self, type: Type[_Row], *, order: str = ..., default: _T = ..., cache: bool = ..., **kwargs: Any) -> Union[_Row, _T]: ...
+
+    def get_items(self, type: Type[_Row], *, limit: Union[int, Tuple[int, int]] = ..., order: str = ..., cache: bool = ..., **kwargs: Any) -> List[_Row]: ...
+
+    def get_page(self, type: Type[_Row], *, order: Union[str, Sequence[str]], size: int, after: Optional[str] = ..., descending: bool = ..., cache: bool = ..., **kwargs: Any) -> Page: ...
+
+    def iter_batches(self, type: Type[_Row], *, batch_size: int = ..., limit: Optional[int] = ..., order: str = ..., **kwargs: Any) -> Iterator[List[_Row]]: ...
+
+    def iter_items(self, type: Type[_Row], *, batch_size: int = ..., limit: Optional[int] = ..., order: str = ..., **kwargs: Any) -> Iterator[_Row]: ...
+
+    def get_count(self, type: Type[_Row], *, cache: bool = ..., approximate: bool = ..., **kwargs: Any) -> int: ...
+
+    def track_count(self, type: Type[_Row], *, refresh: Optional[float] = ..., **kwargs: Any) -> int: ...
+
+    def untrack_count(self, type: Type[_Row], **kwargs: Any) -> None: ...
 
-    def get_items(self, type: Type[_Row], *, limit: Union[int, Tuple[int, int]] = ..., order: str = ..., **kwargs: Any) -> List[_Row]: ...
+    def _counted_write(self, table_name: str, where: str, params: Dict[str, Any], write: Callable[[], Any], new: Optional[Dict[str, Any]]) -> None: ...
 
-    def get_count(self, type: Type[_Row], **kwargs: Any) -> int: ...
+    def _row_data(self, item: Row) -> Tuple[str, List[str], List[Any]]: ...
+
+    def _key_indices(self, table_name: str, names: List[str]) -> Optional[List[int]]: ...
+
+    def _collect_rows(self, item: Union[Row, MultiRow, Iterable[Any]], tables: Dict[str, List[Any]], removed: List[Row]) -> None: ...
+
+    def _write_tables(self, tables: Dict[str, List[Any]], chunk_size: int) -> None: ...
+
+    def save_items(self, items: Iterable[Union[Row, MultiRow, Iterable[Any]]], *, chunk_size: Optional[int] = ...) -> None: ...
 
     def save_item(self, item: Union[type(Row), type(MultiRow)]) -> None: ...
 
     def remove_item(self, item: Union[type(Row), type(MultiRow)], general: bool = ...) -> None: ...
 
     def remove_items(self, type: Type[_Row], *, limit: Union[int, Tuple[int, int]] = ..., order: str = ..., **kwargs: Any) -> None: ...
+
+class AsyncGenericDatabase:
+
+    __slots__ = ("_database", "_executor")
+
+    _database: GenericDatabase
+    _executor: concurrent.futures.Executor
+
+    def __init__(self, database: GenericDatabase, *, executor: Optional[concurrent.futures.Executor] = ...) -> None: ...
+
+    def __getattr__(self, item: str) -> Any: ...
+
+    @property
+    def database(self) -> GenericDatabase: ...
+
+    async def run(self, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T: ...
+
+    def is_connected(self) -> bool: ...
+
+    def add_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def remove_listener(self, listener: Callable[[QueryEvent], Any]) -> None: ...
+
+    def transaction(self) -> AsyncContextManager[AsyncGenericDatabase]: ...
+
+    async def reset_connection(self) -> None: ...
+
+    async def verify_schema(self) -> Dict[str, int]: ...
+
+    async def get_item(self, type: Type[_Row], *, order: str = ..., default: _T = ..., **kwargs: Any) -> Union[_Row, _T]: ...
+
+    async def get_items(self, type: Type[_Row], *, limit: Union[int, Tuple[int, int]] = ..., order: str = ..., **kwargs: Any) -> List[_Row]: ...
+
+    async def get_page(self, type: Type[_Row], *, order: Union[str, Sequence[str]], size: int, after: Optional[str] = ..., descending: bool = ..., **kwargs: Any) -> Page: ...
+
+    async def iter_items(self, type: Type[_Row], *, batch_size: int = ..., limit: Optional[int] = ..., order: str = ..., **kwargs: Any) -> AsyncIterator[_Row]: ...
+
+    async def get_count(self, type: Type[_Row], **kwargs: Any) -> int: ...
+
+    async def save_item(self, item: Union[type(Row), type(MultiRow)]) -> None: ...
+
+    async def save_items(self, items: Iterable[Union[Row, MultiRow, Iterable[Any]]], *, chunk_size: Optional[int] = ...) -> None: ...
+
+    async def remove_item(self, item: Union[type(Row), type(MultiRow)], general: bool = ...) -> None: ...
+
+    async def remove_items(self, type: Type[_Row], *, limit: Union[int, Tuple[int, int]] = ..., order: str = ..., **kwargs: Any) -> None: ...
+
+    async def close(self) -> None: ...
@@ -2,11 +2,13 @@
     Talos utils stub file
 """
 
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, AsyncIterable, Callable, Union, Iterable, Sequence
+import codecs
 import logging
 import pathlib
 import discord.ext.commands as dcommands
 import spidertools.common.element as el
+from spidertools.common.parsers import TreeGen, ParserPool
 
 
 error_client: Optional[Any] = ...
@@ -59,6 +61,16 @@ def add_spaces(text: str) -> str: ...
 
 def zero_pad(text: str, length: int) -> str: ...
 
-def to_dom(html: str) -> el.Document: ...
+parser_pool: ParserPool
 
-def to_nodes(html: str) -> List[el.Node]: ...
+def to_dom(html: str, keep: Union[str, Callable[[el.Element], bool], None] = ...) -> el.Document: ...
+
+def to_nodes(html: str, keep: Union[str, Callable[[el.Element], bool], None] = ..., *, ancestors: bool = ...) -> List[el.Node]: ...
+
+def _parse_flat(html: str, keep: Union[str, Callable[[el.Element], bool], None] = ...) -> Optional[List[Union[Tuple[str, Dict[str, Any], int], str]]]: ...
+
+def parse_many(htmls: Iterable[str], workers: Optional[int] = ..., *, keep: Union[str, Callable[[el.Element], bool], None] = ...) -> List[Optional[el.Document]]: ...
+
+async def to_dom_stream(chunks: AsyncIterable[bytes], *, encoding: str = ..., until: Optional[Callable[[el.Document, TreeGen], bool]] = ..., keep: Union[str, Callable[[el.Element], bool], None] = ...) -> Tuple[Optional[el.Document], bool]: ...
+
+async def _feed_stream(stream_gen: TreeGen, chunks: AsyncIterable[bytes], decoder: codecs.IncrementalDecoder, until: Optional[Callable[[el.Document, TreeGen], bool]]) -> Tuple[Optional[el.Document], bool]: ...
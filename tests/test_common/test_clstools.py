@@ -0,0 +1,175 @@
+
+import asyncio
+import time
+
+import pytest
+
+import spidertools.common.clstools as clstools
+
+
+def test_make_key():
+    assert clstools._make_key((1,), {}) == 1
+    assert clstools._make_key((1, 2), {}) != clstools._make_key((2, 1), {}), "Argument order was ignored"
+    assert clstools._make_key((1,), {"b": 2}) != clstools._make_key((1, "b", 2), {}), "Keyword and positional collided"
+    assert clstools._make_key(([1, 2],), {}) == clstools._make_key(([1, 2],), {}), "Unhashable keys didn't match"
+    assert clstools._split_key(clstools._make_key((1, [2]), {"c": 3})) == ((1, "[2]"), {"c": 3})
+
+
+def test_invalidating_cache():
+    calls = []
+
+    @clstools.invalidating_cache(maxsize=2)
+    def add(a, b=0):
+        calls.append((a, b))
+        return a + b
+
+    assert add(1) == add(1) == 1
+    assert add(1, 2) == add(1, b=2) == 3
+    add(5)
+    add(1)
+    assert len(calls) == 5, "Evicted or uncached result was reused"
+    assert add.cache_info() == clstools.CacheInfo(1, 5, 2, 2)
+
+    add.cache_clear()
+    assert add.cache_info() == clstools.CacheInfo(0, 0, 2, 0)
+
+    @clstools.invalidating_cache(ttl=0.05)
+    def listed(value):
+        calls.append(value)
+        return [value]
+
+    listed([1])
+    listed([1])
+    time.sleep(0.05)
+    listed([1])
+    assert len(calls) == 7, "Expired result was reused"
+
+
+def test_method_cache():
+
+    class Holder:
+
+        def __init__(self, value):
+            self.value = value
+
+        @clstools.invalidating_cache(method=True)
+        def get(self, key):
+            return self.value, key
+
+        @clstools.cache_invalidator(func=get, method=True, args=0, generic=False)
+        def set(self, key):
+            return key
+
+    first, second = Holder(1), Holder(2)
+    assert first.get("a") == (1, "a")
+    assert second.get("a") == (2, "a"), "Instances shared a cache"
+    first.value = 3
+    assert first.get("a") == (1, "a")
+
+    assert first.set("a") == "a"
+    assert first.get("a") == (3, "a"), "Invalidated result was reused"
+    assert Holder.get.cache_info().currsize == 2
+
+    del second
+    assert Holder.get.cache_info().currsize == 1, "Cache outlived its instance"
+
+
+def test_method_cache_identity():
+
+    class Equal:
+
+        def __init__(self, value):
+            self.value = value
+
+        def __eq__(self, other):
+            return True
+
+        def __hash__(self):
+            return 0
+
+        @clstools.invalidating_cache(method=True)
+        def get(self):
+            return self.value
+
+    first, second = Equal(1), Equal(2)
+    assert first.get() == 1
+    assert second.get() == 2, "Equal instances shared a cache"
+    assert Equal.get.cache_info().currsize == 2
+
+    class Unhashable(Equal):
+        __hash__ = None
+
+    third = Unhashable(3)
+    assert third.get() == 3
+    del third
+    assert Equal.get.cache_info().currsize == 2, "Unhashable instance wasn't given its own cache"
+
+
+def test_cache_invalidator():
+
+    @clstools.invalidating_cache(maxsize=3)
+    def get(a, b=None):
+        return a, b
+
+    @clstools.cache_invalidator(func=get, args=0, generic=False)
+    def set_a(a):
+        pass
+
+    @clstools.cache_invalidator(func=get, kwargs="b")
+    def set_b(b):
+        pass
+
+    cache = clstools._caches[clstools.unwrap(get)].shared
+    get(1)
+    get(2)
+    get(1, b="x")
+    set_a(1)
+    assert cache.keys() == [2], "Wrong entries invalidated by value"
+
+    get(3, b="y")
+    get(4, b=5)
+    set_b(b="z")
+    assert [clstools._split_key(x) for x in cache.keys()] == [((2,), {}), ((4,), {"b": 5})], \
+        "Wrong entries invalidated by type"
+
+    get(5)
+    get(6)
+    assert cache.matching(0, 2) == set(), "Evicted entry left in the index"
+    assert cache.matching(0, 6) == {6}
+
+
+def test_async_cache():
+    calls = []
+
+    @clstools.invalidating_cache(maxsize=2)
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        if key == "bad":
+            raise ValueError(key)
+        return [key]
+
+    @clstools.cache_invalidator(func=fetch, args=0, generic=False)
+    def changed(key):
+        pass
+
+    async def run():
+        first, second = await asyncio.gather(fetch("a"), fetch("a"))
+        assert first is second and calls == ["a"], "Concurrent calls weren't coalesced"
+        assert await fetch("a") is first
+
+        results = await asyncio.gather(fetch("bad"), fetch("bad"), return_exceptions=True)
+        assert all(isinstance(x, ValueError) for x in results) and calls.count("bad") == 1
+        with pytest.raises(ValueError):
+            await fetch("bad")
+        assert calls.count("bad") == 2, "Exception was cached"
+
+        pending = asyncio.ensure_future(fetch("b"))
+        await asyncio.sleep(0)
+        changed("b")
+        await pending
+        await fetch("b")
+        assert calls.count("b") == 2, "Result from before an invalidation was cached"
+
+    asyncio.run(run())
+    assert fetch.cache_info().currsize == 2
@@ -0,0 +1,53 @@
+import pytest
+
+import spidertools.common.css as css
+import spidertools.common.utils as utils
+
+
+PAGE = """
+<html>
+  <body>
+    <div id="main" class="post big">
+      <p>One</p>
+      <p class="note">Two</p>
+      <span>Three</span>
+      <p lang="en-US">Four</p>
+    </div>
+    <ul><li>a</li><li>b</li><li>c</li><li>d</li></ul>
+    <select name="comic"><option value="1">First</option><option value="2">Second</option></select>
+  </body>
+</html>"""
+
+
+def texts(elements):
+    return [x.innertext for x in elements]
+
+
+def test_select():
+    doc = utils.to_dom(PAGE)
+    assert texts(doc.select("p")) == ["One", "Two", "Four"]
+    assert texts(doc.select("div.post > p.note")) == ["Two"]
+    assert texts(doc.select("#main span")) == ["Three"]
+    assert texts(doc.select("p + span, p.note ~ p")) == ["Three", "Four"]
+    assert texts(doc.select("li:nth-child(odd)")) == ["a", "c"]
+    assert texts(doc.select("li:nth-child(2n+2)")) == ["b", "d"]
+    assert texts(doc.select("li:nth-last-child(-n+2)")) == ["c", "d"]
+    assert texts(doc.select("[lang|=en]")) == ["Four"]
+    assert texts(doc.select("select[name='comic'] option[value^=2]")) == ["Second"]
+    assert doc.select_one("body > *").id == "main"
+    assert doc.select_one("table") is None
+
+
+def test_element_select():
+    doc = utils.to_dom(PAGE)
+    div = doc.get_by_id("main")
+    assert texts(div.select("*:first-child")) == ["One"]
+    assert div.select("div") == [], "Element matched itself"
+    assert div.select_one("p:last-child").innertext == "Four"
+
+
+def test_compile():
+    assert css.compile_selector("div p") is css.compile_selector("div p"), "Compiled selector wasn't cached"
+    for bad in ("", "> p", "p >", "p:hover", "div[", "p..x"):
+        with pytest.raises(css.SelectorError):
+            css.compile_selector(bad)
@@ -9,6 +9,47 @@ def test_row():
         row = data.Row([])
 
 
+class Example(data.Row):
+
+    __slots__ = ("first", "second")
+
+
+class CustomInit(Example):
+
+    def __init__(self, row):
+        super().__init__(row)
+        self.second = "custom"
+
+
+def test_row_construct():
+    row = Example([1, "a"])
+    assert row.first == 1 and row.second == "a"
+    assert row.to_row() == [1, "a"]
+
+    row = Example([0, 2], conv_bool=True)
+    assert row.first is False and row.second == 2
+
+    rows = Example.from_rows([(1, "a"), (2, "b")])
+    assert rows == [Example([1, "a"]), Example([2, "b"])]
+
+    rows = CustomInit.from_rows([(1, "a")])
+    assert rows[0].second == "custom", "Bulk construction skipped a custom __init__"
+
+
+class Keywords(data.Row):
+
+    __slots__ = ("id", "from", "__private")
+
+
+def test_row_keyword_slots():
+    row = Keywords([1, 0, "a"], conv_bool=True)
+    assert row.id is True and getattr(row, "from") is False and row._Keywords__private == "a"
+    assert row.to_row() == [True, False, "a"]
+
+    rows = Keywords.from_rows([(2, "b", None)])
+    assert rows[0].to_row() == [2, "b", None]
+
+
 def test_multirow():
 
     with pytest.raises(TypeError):
@@ -1,4 +1,5 @@
 import spidertools.common.element as element
+import spidertools.common.utils as utils
 import pytest
 
 
@@ -80,3 +81,58 @@ def test_element_children():
     node1.add_child(node2)
     assert node2 in node1.child_nodes
     assert node2.parent == node1
+
+
+def test_element_cache():
+    node1 = element.Element("div", {})
+    node2 = element.Element("p", {})
+    node1.add_child(node2)
+    assert node1.outerhtml == "<div>\n  <p>\n  </p>\n</div>"
+
+    content = element.Content("Text")
+    node2.add_child(content)
+    assert node1.outerhtml == "<div>\n  <p>\n    Text\n  </p>\n</div>", "Stale HTML after adding a child"
+    content.value = "Changed"
+    assert node1.innertext == "Changed", "Stale text after changing content"
+
+    node3 = element.Element("span", {})
+    node2.add_child(node3, 0)
+    assert node3.parent is node2 and content.parent is node2
+    node2.remove_child(node3)
+    assert node3.parent is None and content.parent is node2
+    assert node1.innerhtml == "<p>\n  Changed\n</p>", "Stale HTML after removing a child"
+
+    assert node3.depth == 0
+    node2.add_child(node3)
+    assert node3.depth == 2, "Stale depth after moving a node"
+
+
+def test_document_index():
+    doc = utils.to_dom(
+        "<html><body><div id=\"a\" class=\"x y\"><p class=\"x\">One</p></div><p name=\"n\">Two</p></body></html>"
+    )
+    scan = [x for x in doc._depth_iterator() if isinstance(x, element.Element) and x.tag == "p"]
+    assert doc.get_by_tag("p") == scan
+    assert doc.get_by_id("a").tag == "div"
+    assert doc.get_by_name("n") is scan[1]
+    assert doc.get_by_class("x") == [doc.get_by_id("a"), scan[0]]
+
+    body = doc.get_by_tag("body")[0]
+    new = element.Element("p", {"class": "x"})
+    body.add_child(new, 0)
+    assert doc.get_by_tag("p") == [new] + scan, "Added element out of document order"
+    assert doc.get_first_by_class("x") is new
+
+    body.remove_child(new)
+    doc.get_by_id("a").innerhtml = "<span id=\"b\"></span>"
+    assert doc.get_by_tag("p") == [scan[1]], "Removed elements still indexed"
+    assert doc.get_by_id("b").tag == "span"
+
+
+def test_flatten():
+    doc = utils.to_dom("<div id=\"a\"><p class=\"x\">One<br>Two</p><ul><li>A</li><li>B</li></ul><span></span></div>")
+    flat = element.flatten(doc._head)
+    assert flat[:2] == [("div", {"id": "a"}, 3), ("p", {"class": "x"}, 3)]
+    rebuilt = element.unflatten(flat)
+    assert element.Document(rebuilt) == doc, "Tree changed by a flatten round trip"
+    assert rebuilt.child_nodes[1].child_nodes[1].parent is rebuilt.child_nodes[1]
@@ -1,4 +1,6 @@
 
+import pytest
+
 import spidertools.common.parsers as parsers
 
 
@@ -37,3 +39,44 @@ def test_site_parse():
     p = div.first_child
     assert p.tag == "p"
     assert p.innertext == "This is a test paragraph"
+
+
+def test_filtered_parse():
+    site = "<html><body><div><p>Skip</p><select name=\"comic\"><option>A</option><option>B</option></select></div>" \
+           "<name>One</name><p>Skip <name>Two</name></p></body></html>"
+
+    gen = parsers.TreeGen("select[name=comic]")
+    gen.feed(site)
+    result = gen.close()
+    assert len(result) == 1 and result[0].tag == "select" and result[0].parent is None
+    assert [x.innertext for x in result[0].child_nodes] == ["A", "B"]
+
+    gen = parsers.TreeGen(lambda x: x.tag == "name", ancestors=True)
+    gen.feed(site)
+    root = gen.close()[0]
+    body = root.first_child
+    assert root.tag == "html" and len(root.child_nodes) == 1
+    assert [x.tag for x in body.child_nodes] == ["name", "p"], "Ancestors built with unrelated children"
+    assert body.child_nodes[1].innertext == "Two", "Text outside kept subtrees was built"
+
+    gen = parsers.TreeGen("body > name")
+    gen.feed(site)
+    assert [x.innertext for x in gen.close()] == ["One"]
+
+    with pytest.raises(ValueError):
+        parsers.TreeGen("option:first-child")
+
+
+def test_parser_pool():
+    pool = parsers.ParserPool(max_idle=2)
+    with pool.parser() as first, pool.parser() as second:
+        assert first is not second, "Concurrent parses shared a parser"
+        first.feed("<div><p>One")
+        second.feed("<span>Two</span>")
+        assert second.close()[0].innertext == "Two"
+        first.feed("</p></div>")
+        assert first.close()[0].innertext == "One", "Parses interfered with each other"
+    assert pool.idle == 2
+
+    heads = pool.parse("<p>Three</p>")
+    assert heads[0].innertext == "Three" and pool.idle == 2
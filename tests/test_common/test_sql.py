@@ -1,9 +1,15 @@
 
 import pytest
 
+import asyncio
 import os
+import time
 import spidertools.common as tutils
+import spidertools.common.sql as sql
 import spidertools.common.accessors.base as base
+import spidertools.common.accessors.pool as pool
+import spidertools.common.accessors.postgres as postgres
+import spidertools.common.accessors.stats as stats
 
 
 SCHEMA = {
@@ -20,7 +26,8 @@ SCHEMA = {
                     "type": "text"
                 }
             ],
-            "primary": ["col1"]
+            "primary": ["col1"],
+            "indexes": [["col2", "col1"]]
         }
     }
 }
@@ -36,7 +43,7 @@ class Test1(tutils.Row):
 
 
 @pytest.fixture()
-def database(request):
+def database(request, tmp_path):
     schemadef = SCHEMA.copy()
 
     schemadef["sql_flavor"] = request.param
@@ -45,6 +52,8 @@ def database(request):
         database = tutils.GenericDatabase("127.0.0.1", 5432, "postgres", "", "test_schema", schemadef)
     elif request.param == "mysql":
         database = tutils.GenericDatabase("127.0.0.1", 3306, "root", "", "test_schema", schemadef)
+    elif request.param == "sqlite":
+        database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
 
     if not database.is_connected():
         if os.getenv("CI") == "true":
@@ -53,6 +62,7 @@ def database(request):
             pytest.skip("Failed to connect to MySql database")
 
     database.verify_schema()
+    assert database.plan_schema() == [], "Schema still had changes after verification"
 
     yield database
 
@@ -77,6 +87,378 @@ def test_empty_cursor():
     assert cursor.lastrowid is None, "lastrowid not None"
 
 
+class FakeConnection:
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool():
+    made = []
+
+    def factory():
+        made.append(FakeConnection())
+        return made[-1]
+
+    cnx_pool = pool.ConnectionPool(factory, min_size=1, max_size=2, check=lambda x: x.alive, check_after=0)
+    cnx_pool.fill()
+    assert cnx_pool.size == 1 and cnx_pool.idle == 1
+
+    first = cnx_pool.acquire()
+    second = cnx_pool.acquire()
+    assert first is not second
+    assert cnx_pool.size == 2
+    with pytest.raises(TimeoutError):
+        cnx_pool.acquire(timeout=0.01)
+
+    cnx_pool.release(first)
+    assert cnx_pool.acquire() is first, "Idle connection wasn't reused"
+
+    first.alive = False
+    cnx_pool.release(first)
+    third = cnx_pool.acquire()
+    assert third is not first and first.closed, "Dead connection wasn't discarded"
+
+    cnx_pool.release(second)
+    cnx_pool.release(third)
+    cnx_pool.idle_timeout = 0
+    assert cnx_pool.reap() == 1, "Reap didn't stop at min_size"
+    assert cnx_pool.size == 1
+
+    cnx_pool.close()
+    assert cnx_pool.idle == 0
+    with pytest.raises(RuntimeError):
+        cnx_pool.acquire()
+
+
+def test_statement_cache():
+    cache = base.StatementCache(maxsize=2)
+    built = []
+
+    def build(text):
+        def inner():
+            built.append(text)
+            return text
+        return inner
+
+    assert cache.get("a", build("A")) == "A"
+    assert cache.get("a", build("other")) == "A", "Cached statement was rebuilt"
+    cache.get("b", build("B"))
+    cache.get("a", build("A"))
+    cache.get("c", build("C"))
+    assert len(cache) == 2
+    assert cache.get("b", build("B2")) == "B2", "Least recently used statement wasn't evicted"
+    assert built == ["A", "B", "C", "B2"]
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_query_stats():
+    shape, operation, table = stats.describe("SELECT * FROM s.test1 WHERE col1 IN (%s, %s, %s) LIMIT 10 OFFSET 20")
+    assert shape == "SELECT * FROM s.test1 WHERE col1 IN (%s, ...) LIMIT ? OFFSET ?"
+    assert (operation, table) == ("SELECT", "test1")
+    assert stats.describe("INSERT INTO test1 (a, b) VALUES (%s, %s), (%s, %s)")[0] == \
+        stats.describe("INSERT INTO test1 (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)")[0], "Batch size changed shape"
+
+    query_stats = stats.QueryStats()
+    for duration in (0.002, 0.004, 0.2):
+        query_stats(stats.QueryEvent("SELECT * FROM test1 LIMIT 5", "SELECT", "test1", duration, 5, None, None))
+    query_stats(stats.QueryEvent("SELECT * FROM test1 LIMIT 50", "SELECT", "test1", 0.001, None, None, ValueError()))
+    query_stats(stats.QueryEvent("CACHED get_items test1", "SELECT", "test1", 0.0, 5, True, None))
+
+    assert len(query_stats) == 2
+    summary = query_stats.get("SELECT * FROM test1 LIMIT 1")
+    assert (summary.count, summary.errors, summary.rows) == (4, 1, 15)
+    assert summary.max == 0.2
+    assert summary.percentile(0.5) == 0.0025
+    assert query_stats.dump()[0]["statement"] == "SELECT * FROM test1 LIMIT ?", "Dump not sorted by total time"
+    assert query_stats.get("CACHED get_items test1").hits == 1
+
+    query_stats.reset()
+    assert len(query_stats) == 0
+
+
+def test_write_buffer():
+    buffer = sql.WriteBuffer(max_size=3, interval=None)
+
+    assert buffer.add("test1", ["col1", "col2"], [0], [1, "a"]) is False
+    assert buffer.add("test1", ["col1", "col2"], [0], [1, "b"]) is False, "Coalesced write counted twice"
+    assert buffer.add("test1", ["col1", "col2"], [0], [2, "c"]) is False
+    assert buffer.get("test1", (1,)) == (["col1", "col2"], [1, "b"]), "Last write didn't win"
+    assert buffer.add("test1", ["col1", "col2"], [0], [3, "d"]) is True, "Full buffer didn't ask for a flush"
+
+    buffer.discard("test1", [(3,)])
+    assert buffer.depth == 2
+    assert buffer.pending("test1") and not buffer.pending("other")
+
+    tables = buffer.take()
+    assert buffer.depth == 0 and not buffer.pending()
+    buffer.add("test1", ["col1", "col2"], [0], [1, "newer"])
+    buffer.restore(tables)
+    assert buffer.depth == 2
+    assert buffer.get("test1", (1,))[1] == [1, "newer"], "Failed flush overwrote a newer write"
+
+    buffer.record_flush(2, 0.5)
+    info = buffer.info()
+    assert (info.depth, info.writes, info.coalesced, info.flushes, info.rows_flushed) == (2, 5, 1, 1, 2)
+    assert info.last_flush == info.max_flush == 0.5
+
+
+def test_copy_value():
+    assert postgres._copy_value(None) == "\\N"
+    assert postgres._copy_value("a\tb\\c\n") == "a\\tb\\\\c\\n"
+    assert postgres._copy_value(b"\x00\xff") == "\\\\x00ff"
+    assert postgres._copy_value(True) == "t"
+    assert postgres._copy_value({"a": [1, None]}) == '{"a": [1, null]}'
+    assert postgres._copy_value(float("inf")) == "Infinity"
+    assert postgres._copy_value(["a,b", None, '"'], array=True) == '{"a,b",NULL,"\\\\""}'
+
+
+def test_schema_defaults(tmp_path):
+    schemadef = {
+        "sql_flavor": "sqlite",
+        "tables": {
+            "keyed": {
+                "columns": [{"name": "key", "type": "integer"}, {"name": "flag", "type": "integer"}],
+                "primary": ["key"],
+                "defaults": [[1, True], [2, False]]
+            },
+            "serial": {
+                "columns": [{"name": "id", "type": "serial"}, {"name": "name", "type": "text"}],
+                "primary": ["id"],
+                "defaults": [[None, "first"]]
+            }
+        }
+    }
+    database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
+    database.verify_schema()
+    assert database.plan_schema() == [], "Stored defaults were planned to be inserted again"
+
+    database._accessor.insert("keyed", names=["key", "flag"], values=[2, 1], update=True)
+    changes = database.plan_schema()
+    assert [x.detail[1] for x in changes] == [[2, False]], "Changed default wasn't restored"
+    database.close()
+
+
+def test_write_behind(tmp_path):
+    schemadef = SCHEMA.copy()
+    schemadef["sql_flavor"] = "sqlite"
+    database = tutils.GenericDatabase(
+        str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef, write_behind=True, flush_size=10,
+        flush_interval=None
+    )
+    database.verify_schema()
+
+    for x in range(5):
+        database.save_item(Test1([1, str(x)]))
+    assert database.buffer.depth == 1, "Saves of one row weren't coalesced"
+    assert database.get_item(Test1, col1=1).col2 == "4", "Pending write not visible to get_item"
+
+    assert database.get_count(Test1) == 1, "Pending write not flushed before read"
+    assert database.buffer.depth == 0
+
+    for x in range(10, 20):
+        database.save_item(Test1([x, None]))
+    assert database.buffer.depth == 0, "Full buffer wasn't flushed"
+
+    database.save_item(Test1([30, "Saved on close"]))
+    database.close()
+
+    database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
+    assert database.get_count(Test1) == 12
+    assert database.get_item(Test1, col1=30).col2 == "Saved on close"
+    database.close()
+
+
+def test_write_behind_transaction(tmp_path):
+    schemadef = SCHEMA.copy()
+    schemadef["sql_flavor"] = "sqlite"
+    database = tutils.GenericDatabase(
+        str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef, write_behind=True, flush_size=10,
+        flush_interval=None
+    )
+    database.verify_schema()
+
+    database.save_item(Test1([1, "Queued"]))
+    with database.transaction():
+        database.save_item(Test1([2, "Direct"]))
+        items = database.get_items(Test1, order="col1")
+        assert [x.col2 for x in items] == ["Queued", "Direct"], "Queued write not visible inside a transaction"
+    assert database.buffer.depth == 0
+
+    database.save_item(Test1([3, "Rolled back"]))
+    with pytest.raises(RuntimeError):
+        with database.transaction():
+            database.save_item(Test1([4, "Direct"]))
+            assert database.get_count(Test1) == 4
+            raise RuntimeError
+    assert database.buffer.depth == 1, "Queued write lost when its transaction rolled back"
+    database.close()
+
+    database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
+    assert [x.col1 for x in database.get_items(Test1, order="col1")] == [1, 2, 3]
+    database.close()
+
+
+def test_replicas(tmp_path):
+    schemadef = SCHEMA.copy()
+    schemadef["sql_flavor"] = "sqlite"
+    replica = tutils.GenericDatabase(str(tmp_path / "replica.db"), 0, "", "", "test_schema", schemadef)
+    replica.verify_schema()
+    replica.save_item(Test1([1, "Replica"]))
+
+    database = tutils.GenericDatabase(
+        str(tmp_path / "primary.db"), 0, "", "", "test_schema", schemadef, replicas=[(str(tmp_path / "replica.db"), 0)],
+        sticky_window=0.2, replica_retry=60
+    )
+    database.verify_schema()
+    assert database.get_item(Test1, col1=1).col2 == "Replica", "Read didn't go to the replica"
+
+    database.save_item(Test1([1, "Primary"]))
+    assert database.get_item(Test1, col1=1).col2 == "Primary", "Read right after a write didn't go to the primary"
+    time.sleep(0.2)
+    assert database.get_item(Test1, col1=1).col2 == "Replica", "Reads stayed on the primary after the window"
+
+    replica.execute("DROP TABLE test1")
+    assert database.get_item(Test1, cache=False, col1=1).col2 == "Primary", \
+        "Failed replica read didn't fall back to primary"
+    assert database.get_count(Test1, cache=False) == 1, "Failed replica was kept in rotation"
+
+    with pytest.raises(ValueError):
+        tutils.GenericDatabase("", 0, "", "", "test_schema", schemadef, connect=False, replicas=[("", 0)],
+                               read_strategy="random")
+
+    database.close()
+    replica.close()
+
+
+def test_counts(tmp_path):
+    schemadef = SCHEMA.copy()
+    schemadef["sql_flavor"] = "sqlite"
+    database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
+    database.verify_schema()
+    database.save_items([Test1([x, "even" if x % 2 == 0 else None]) for x in range(20)])
+
+    assert database.get_count(Test1, approximate=True) == 20, "Count without statistics wasn't exact"
+    database.raw_exec("ANALYZE")
+    database.save_item(Test1([20, None]))
+    assert database.get_count(Test1, approximate=True, cache=False) == 20, "Estimate didn't use statistics"
+
+    assert database.track_count(Test1, col2="even") == 10
+    listener = stats.QueryStats()
+    database.add_listener(listener)
+    with database.counts.write_lock("test2"):
+        # Counted writes only lock their own table
+        database.save_item(Test1([21, "even"]))
+    database.save_item(Test1([21, "even"]))
+    database.save_item(Test1([0, "odd"]))
+    database.remove_item(Test1([2, "even"]))
+    database.remove_item(Test1([2, "even"]))
+    assert database.get_count(Test1, col2="even") == 9, "Tracked count wasn't adjusted"
+    assert not any(x["statement"].startswith("SELECT COUNT") for x in listener.dump()), "Tracked count was queried"
+
+    def write():
+        database._accessor.insert("test1", names=["col1", "col2"], values=[40, "even"])
+        assert database.get_count(Test1, col2="even", cache=False) == 10, "Recount during a write was wrong"
+
+    database.counts.stale("test1")
+    key = {"col1": 40}
+    database._counted_write("test1", sql.and_from_dict(key), key, write, {"col1": 40, "col2": "even"})
+    assert database.get_count(Test1, col2="even") == 10, "Recount during a write was counted twice"
+
+    database.remove_items(Test1, col2="even")
+    assert database.get_count(Test1, col2="even") == 0, "Tracked count wasn't recounted after a bulk delete"
+    database.untrack_count(Test1, col2="even")
+    assert not database.counts.tracking("test1")
+    database.close()
+
+
+def test_index_advisor():
+    assert sql._index_spec("test1", "col2") == ("ix_test1_col2", ("col2",), False)
+    assert sql._index_spec("test1", {"columns": ["a", "b"], "name": "ab", "unique": True}) == ("ab", ("a", "b"), True)
+
+    advisor = sql.IndexAdvisor()
+    advisor.record("test1", {"col1": 1})
+    advisor.record("test1", {"col2": 1, "col3": 2})
+    advisor.record("test1", {"col3": 1, "col2": 2})
+    advisor.record("test1", {"col3": 1})
+    advisor.record("test1", {})
+
+    indexes = {"test1": [(("col1",), True), (("col2", "col3", "col4"), False)]}
+    assert advisor.report(indexes) == [sql.IndexAdvice("test1", ("col3",), 1)]
+    assert len(advisor.report({})) == 3, "Filters were covered without indexes"
+
+    advisor.reset()
+    assert advisor.seen() == {}
+
+
+def test_and_from_dict():
+    assert sql.and_from_dict({"a": 1, "b": None}) == "a = %(a)s AND b is %(b)s"
+    assert sql.and_from_dict({"a": None, "b": 2}) == "a is %(a)s AND b = %(b)s"
+    assert sql.and_from_dict({}) == ""
+
+
+def test_query_cache():
+    cache = sql.QueryCache(maxsize=2)
+
+    key1 = cache.key("test1", "count", ())
+    assert cache.get(key1) is sql._Missing
+    cache.put(key1, 5)
+    assert cache.get(key1) == 5
+
+    cache.invalidate("test1")
+    assert cache.get(cache.key("test1", "count", ())) is sql._Missing, "Invalidated result was returned"
+
+    key2 = cache.key("test2", "count", ())
+    key3 = cache.key("test3", "count", ())
+    cache.put(key2, 1)
+    cache.put(key3, 2)
+    assert cache.get(key2) == 1, "Invalidating one table affected another"
+
+    info = cache.info()
+    assert info.hits == 2 and info.misses == 2
+    assert info.evictions == 1 and info.size == 2
+
+    assert cache.key("test1", [1, 2]) is None, "Unhashable query was given a key"
+    assert sql.QueryCache(maxsize=0).key("test1") is None, "Disabled cache gave a key"
+
+
+def test_cached_results_copied(tmp_path):
+    schemadef = SCHEMA.copy()
+    schemadef["sql_flavor"] = "sqlite"
+    database = tutils.GenericDatabase(str(tmp_path / "test.db"), 0, "", "", "test_schema", schemadef)
+    database.verify_schema()
+    database.save_items([Test1([x, None]) for x in range(3)])
+
+    database.get_items(Test1).clear()
+    items = database.get_items(Test1)
+    assert len(items) == 3, "Changing a result changed the cache"
+    items.append(None)
+    assert len(database.get_items(Test1)) == 3, "Changing a cached result changed the cache"
+
+    database.get_page(Test1, order="col1", size=2).items.clear()
+    assert len(database.get_page(Test1, order="col1", size=2).items) == 2, "Changing a page changed the cache"
+    database.close()
+
+
+def test_page_cursor():
+    cursor = sql._encode_cursor([10, "name"])
+    assert sql._decode_cursor(cursor, 2) == [10, "name"]
+
+    with pytest.raises(ValueError):
+        sql._decode_cursor(cursor, 3)
+    with pytest.raises(ValueError):
+        sql._decode_cursor("not a cursor", 2)
+
+    assert sql._seek_from_keys(("a", "b"), False) == "(a > %(_after_0)s) OR (a = %(_after_0)s AND b > %(_after_1)s)"
+    assert sql._seek_from_keys(("a",), True) == "(a < %(_after_0)s)"
+
+
 def test_empty_database():
     database = tutils.GenericDatabase("", -1, "notauser", "", "talos_data", {"sql_flavor": "mysql"}, connect=False)
 
@@ -87,7 +469,22 @@ def test_empty_database():
         "Database execution returned unexpected result"
 
 
-@pytest.mark.parametrize("database", ["mysql", "postgres"], indirect=True)
+def test_async_database():
+    database = tutils.AsyncGenericDatabase(
+        tutils.GenericDatabase("", -1, "notauser", "", "talos_data", {"sql_flavor": "mysql"}, connect=False)
+    )
+
+    async def run():
+        assert database.is_connected() is False, "Empty database considered connected"
+        assert await database.raw_exec("SELECT * FROM admins") == list(), "raw_exec didn't return empty fetchall"
+        assert await database.commit() is False, "Database committed despite not existing?"
+
+        await database.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("database", ["mysql", "postgres", "sqlite"], indirect=True)
 def test_database(database: tutils.GenericDatabase):
 
     item1 = Test1([4, "Hello World"])
@@ -117,3 +514,34 @@ def test_database(database: tutils.GenericDatabase):
     database.save_item(item2)
 
     assert database.get_item(Test1, col1=-4).col2 == "Test string"
+
+    database.save_items([Test1([x, str(x)]) for x in range(10, 20)] + [Test1([10, "Replaced"])], chunk_size=3)
+
+    assert database.get_count(Test1) == 11
+    assert database.get_item(Test1, col1=10).col2 == "Replaced"
+    assert database.get_item(Test1, col1=19).col2 == "19"
+
+    assert [x.col1 for x in database.iter_items(Test1, batch_size=4, order="col1")] == [-4] + list(range(10, 20))
+
+    page = database.get_page(Test1, order="col1", size=6)
+    assert [x.col1 for x in page.items] == [-4, 10, 11, 12, 13, 14]
+    page = database.get_page(Test1, order="col1", size=6, after=page.cursor)
+    assert [x.col1 for x in page.items] == [15, 16, 17, 18, 19]
+    assert page.cursor is None
+
+    with pytest.raises(ValueError):
+        with database.transaction():
+            database.save_item(Test1([30, "Rolled back"]))
+            assert database.get_count(Test1) == 12
+            raise ValueError
+
+    assert database.get_count(Test1) == 11
+
+    with database.transaction():
+        database.save_item(Test1([30, "Committed"]))
+        database.remove_item(item2)
+
+    assert database.get_count(Test1) == 11
+    assert database.get_item(Test1, col1=30).col2 == "Committed"
+
+    assert [(x.name, x.columns) for x in database.get_indexes()] == [("ix_test1_col2_col1", ("col2", "col1"))]
@@ -5,6 +5,7 @@
     Author: CraftSpider
 """
 
+import asyncio
 import pytest
 import string
 import spidertools.common.utils as utils
@@ -137,3 +138,37 @@ def test_zero_pad():
     with pytest.raises(ValueError):
         utils.zero_pad("", -1)
         pytest.fail("Negative length failed to raise error")
+
+
+def test_dom_stream():
+    html = "<html><body><p id=\"a\">Café</p><p id=\"b\">Two</p><div>Rest</div></body></html>".encode("utf-8")
+    read = []
+
+    async def chunks():
+        for i in range(0, len(html), 5):
+            read.append(i)
+            yield html[i:i + 5]
+
+    doc, complete = asyncio.run(utils.to_dom_stream(chunks()))
+    assert complete and doc == utils.to_dom(html.decode("utf-8")), "Streamed parse differs from to_dom"
+    assert doc.get_by_id("a").innertext == "Café", "Character split across chunks was mangled"
+
+    def found(partial, parser):
+        node = partial.get_by_id("b")
+        return node is not None and not parser.is_open(node)
+
+    read.clear()
+    doc, complete = asyncio.run(utils.to_dom_stream(chunks(), until=found))
+    assert not complete and len(read) < len(html) // 5, "Stream wasn't stopped early"
+    assert doc.get_by_id("b").innertext == "Two"
+
+
+def test_parse_many():
+    pages = [f"<html><body><p id=\"p\">Page {x}</p><div>Other</div></body></html>" for x in range(6)] + [""]
+    docs = utils.parse_many(pages, workers=2)
+    assert docs[-1] is None
+    assert docs[:-1] == [utils.to_dom(x) for x in pages[:-1]], "Documents changed by crossing processes"
+    assert docs[3].get_by_id("p").innertext == "Page 3"
+
+    docs = utils.parse_many(pages[:2], workers=1, keep="p")
+    assert docs[1].select_one("body > *").innertext == "Page 1" and docs[1].get_by_tag("div") == []